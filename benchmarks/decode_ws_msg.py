@@ -0,0 +1,95 @@
+"""Throughput of Upstream.decode_ws_msg on multi-message streaming frames.
+
+Compares the offset based memoryview decoder against the previous decoder that
+re-sliced the remaining frame for every header field.
+
+Usage:
+    uv run python benchmarks/decode_ws_msg.py [--messages 1 10 50 200] [--seconds 1.0] [--payload-format 0|1]
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from typing import Any, Callable, Dict, Generator
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from streaming.upstream import Upstream  # noqa: E402
+
+
+def legacy_decode_ws_msg(raw: bytes) -> Generator[Dict[str, Any], None, None]:
+    """The slicing decoder Upstream used before the memoryview rewrite."""
+    while raw:
+        (msgIdentifier,), raw = struct.unpack_from("Q", raw[:8]), raw[8 + 2:]
+        (Srefid,), raw = struct.unpack_from("B", raw[:1]), raw[1:]
+        (refid_bytes,), raw = struct.unpack_from(f"{Srefid}s", raw[:Srefid]), raw[Srefid:]
+        (payloadFmt,), raw = struct.unpack_from("B", raw[:1]), raw[1:]
+        (payloadSize,), raw = struct.unpack_from("i", raw[:4]), raw[4:]
+        (payload,) = struct.unpack_from(f"{payloadSize}s", raw[:payloadSize])
+
+        refid = refid_bytes.decode("utf-8")
+        msg: Dict[str, Any] = {"refid": refid, "msgId": msgIdentifier}
+        if payloadFmt == 0:
+            msg["msg"] = json.loads(payload.decode("utf-8"))
+        else:
+            try:
+                msg["msg"] = payload.decode("utf-8")
+            except Exception:
+                msg["msg"] = payload.hex()
+        raw = raw[payloadSize:]
+        yield msg
+
+
+def build_frame(messages: int, payload_format: int = 0) -> bytes:
+    """Builds a frame of quote deltas shaped like Saxo infoprice updates."""
+    parts = []
+    for i in range(messages):
+        ref = f"TF{1000 + i}_FxSpot".encode("utf-8")
+        body = json.dumps(
+            [{"Uic": 1000 + i, "Quote": {"Bid": 1.08 + i / 1e4, "Ask": 1.0801 + i / 1e4, "Mid": 1.08005 + i / 1e4}}]
+        ).encode("utf-8")
+        parts.append(
+            struct.pack("<Q", i) + b"\x00\x00" + struct.pack("<B", len(ref)) + ref
+            + struct.pack("<B", payload_format) + struct.pack("<i", len(body)) + body
+        )
+    return b"".join(parts)
+
+
+def measure(decoder: Callable[[bytes], Generator[Dict[str, Any], None, None]], frame: bytes, seconds: float) -> float:
+    """Returns decoded frames per second."""
+    frames = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in decoder(frame):
+            pass
+        frames += 1
+    return frames / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument(
+        "--payload-format",
+        type=int,
+        choices=[0, 1],
+        default=0,
+        help="0 for JSON payloads, 1 for undecoded payloads (isolates the framing cost).",
+    )
+    args = parser.parse_args()
+
+    print(f"{'msgs/frame':>10} {'frame bytes':>12} {'legacy frames/s':>16} {'memoryview frames/s':>20} {'speedup':>8}")
+    for count in args.messages:
+        frame = build_frame(count, args.payload_format)
+        assert list(legacy_decode_ws_msg(frame)) == list(Upstream.decode_ws_msg(frame))
+        legacy = measure(legacy_decode_ws_msg, frame, args.seconds)
+        current = measure(Upstream.decode_ws_msg, frame, args.seconds)
+        print(f"{count:>10} {len(frame):>12} {legacy:>16.0f} {current:>20.0f} {current / legacy:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Delivery throughput and subscriber churn of SocketDistributor on the shared Upstream engine.
+
+Dispatches frames of quote deltas through a FrameDispatcher into a SocketDistributor and waits until every row
+reached its callback. "shared" hands the callbacks the messages the dispatcher already decoded, "redecode" makes
+the distributor decode every frame again, as it did with its own parser. The churn run adds and removes callbacks
+from several threads while the loop lingers and releases the same UICs.
+
+Usage:
+    uv run python benchmarks/socket_distributor.py [--uics 1 10 50 200] [--seconds 1.0] [--threads 4]
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from socket_distributor import SocketDistributor  # noqa: E402
+from streaming.upstream import FrameDispatcher  # noqa: E402
+
+
+class _Response:
+    status_code = 201
+    text = ""
+
+
+class _Session:
+    """Answers the subscription calls without a network."""
+    headers: Dict[str, str] = {}
+
+    def post(self, url: str, json: Any = None) -> _Response:
+        return _Response()
+
+    def delete(self, url: str) -> _Response:
+        return _Response()
+
+
+class _Upstream:
+    context_id = "bench"
+
+
+class _Redecode:
+    """Drops the decoded messages so the distributor decodes every frame itself."""
+    def __init__(self, distributor: SocketDistributor) -> None:
+        self.distributor = distributor
+
+    def push_all(self, payload: Any, messages: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.distributor.push_all(payload)
+
+    def push_ref(self, ref_id: str, payload: Any, messages: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.distributor.push_ref(ref_id, payload)
+
+
+def build_frame(uics: int) -> bytes:
+    """Builds a frame with one quote delta for each UIC, each under its own ref id."""
+    parts = []
+    for i in range(uics):
+        ref = f"uic_{1000 + i}".encode("utf-8")
+        body = json.dumps([{"Uic": 1000 + i, "Quote": {"Bid": 1.08 + i / 1e4, "Ask": 1.0801 + i / 1e4}}]).encode("utf-8")
+        parts.append(
+            struct.pack("<Q", i) + b"\x00\x00" + struct.pack("<B", len(ref)) + ref
+            + struct.pack("<B", 0) + struct.pack("<i", len(body)) + body
+        )
+    return b"".join(parts)
+
+
+def _wait(condition, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("SocketDistributor did not catch up")
+        time.sleep(0.001)
+
+
+def subscribed(uics: int) -> tuple:
+    """Returns a distributor with a counting callback on every UIC, once all of them are subscribed."""
+    # One ref id per UIC, so every message of the frame goes through its own push_ref
+    distributor = SocketDistributor(
+        _Session(), "https://bench/subscriptions", "wss://bench/connect", upstream=_Upstream(), batch_window=0.0, max_batch=1
+    )
+    received = [0]
+
+    def callback(message: Dict[str, Any]) -> None:
+        received[0] += 1
+
+    for i in range(uics):
+        distributor.add_subscriber(1000 + i, "FxSpot", callback)
+    _wait(lambda: len(distributor.ref_to_uics) == uics)
+    return distributor, received
+
+
+def measure_delivery(uics: int, seconds: float, shared: bool) -> float:
+    """Returns frames per second dispatched and delivered to every callback."""
+    distributor, received = subscribed(uics)
+    dispatcher = FrameDispatcher(distributor if shared else _Redecode(distributor))
+    frame = build_frame(uics)
+    frames = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        dispatcher.dispatch(frame)
+        frames += 1
+    _wait(lambda: received[0] == frames * uics)
+    elapsed = time.perf_counter() - start
+    distributor.loop.call_soon_threadsafe(distributor.loop.stop)
+    return frames / elapsed
+
+
+def measure_churn(threads: int, seconds: float) -> float:
+    """Returns add/remove pairs per second with every thread churning the same UICs."""
+    distributor = SocketDistributor(
+        _Session(), "https://bench/subscriptions", "wss://bench/connect", upstream=_Upstream(), batch_window=0.0, linger=0.0
+    )
+    errors: List[Any] = []
+    distributor.loop.set_exception_handler(lambda loop, context: errors.append(context))
+    counts = [0] * threads
+
+    def churn(index: int) -> None:
+        def callback(message: Dict[str, Any]) -> None:
+            pass
+
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            uic = 1000 + counts[index] % 8
+            distributor.add_subscriber(uic, "FxSpot", callback)
+            distributor.remove_subscriber(uic, callback)
+            counts[index] += 1
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=churn, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # The pairs count once the loop has applied them
+    done = threading.Event()
+    distributor.loop.call_soon_threadsafe(done.set)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    distributor.loop.call_soon_threadsafe(distributor.loop.stop)
+    assert not errors, errors
+    return sum(counts) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uics", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'uics/frame':>10} {'redecode frames/s':>18} {'shared frames/s':>16} {'speedup':>8}")
+    for count in args.uics:
+        redecode = measure_delivery(count, args.seconds, shared=False)
+        shared = measure_delivery(count, args.seconds, shared=True)
+        print(f"{count:>10} {redecode:>18.0f} {shared:>16.0f} {shared / redecode:>7.2f}x")
+
+    churn = measure_churn(args.threads, args.seconds)
+    print(f"\n{args.threads} threads churning subscribers: {churn:.0f} add/remove pairs/s, no loop errors")
+
+
+if __name__ == "__main__":
+    main()
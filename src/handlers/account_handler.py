@@ -39,7 +39,7 @@ class AccountHandler(HandlerBase):
         Returns:
             bool: True if the user has multiple accounts, False otherwise.
         """
-        accounts = self.session.get(f"{self.base_url}/port/v1/accounts")
+        accounts = self._get(f"{self.base_url}/port/v1/accounts")
         return len(accounts.json()['Data']) > 1
 
     def get_account_info(self) -> dict:
@@ -53,7 +53,7 @@ class AccountHandler(HandlerBase):
             dict: The account information.
         """
         url = f"{self.base_url}/port/v1/accounts/{self._account_key}"
-        response = self.session.get(url)
+        response = self._get(url)
         response.raise_for_status()
         logger.debug("Account info response: %s", response.text)
         return response.json()
@@ -66,7 +66,7 @@ class AccountHandler(HandlerBase):
             dict: The account balance.
         """
         url = f"{self.base_url}/port/v1/balances?AccountKey={self._account_key}&ClientKey={self._client_key}"
-        response = self.session.get(url)
+        response = self._get(url)
         response.raise_for_status()
         logger.debug("Account balance response: %s", response.text)
         return BalanceInformation(response.json()).cash_balance
@@ -79,7 +79,7 @@ class AccountHandler(HandlerBase):
             BalanceInformation: The account balance information.
         """
         url = f"{self.base_url}/port/v1/balances?AccountKey={self._account_key}&ClientKey={self._client_key}"
-        response = self.session.get(url)
+        response = self._get(url)
         response.raise_for_status()
         logger.debug("Account balance information response: %s", response.text)
         return BalanceInformation(response.json())
@@ -94,7 +94,7 @@ class AccountHandler(HandlerBase):
         Returns:
             dict: The response JSON.
         """
-        response = self.session.get(url)
+        response = self._get(url)
         response.raise_for_status()
         logger.debug("Account positions next page response: %s", response.text)
         data: list = response.json()["Data"]
@@ -114,7 +114,7 @@ class AccountHandler(HandlerBase):
         """
         url = f"{self.base_url}/port/v1/positions?AccountKey={self._account_key}&ClientKey={self._client_key}"
         
-        response = self.session.get(url)
+        response = self._get(url)
         response.raise_for_status()
         logger.debug("Account positions response: %s", response.text)
         json = response.json()
@@ -136,7 +136,7 @@ class AccountHandler(HandlerBase):
             list: The historical positions.
         """
         url = f"{self.base_url}/port/v1/closedpositions?AccountKey={self._account_key}&ClientKey={self._client_key}&StandardPeriod=Year"
-        response = self.session.get(url)
+        response = self._get(url)
         response.raise_for_status()
         logger.debug("Response: %s", response.text)
         json = response.json()
@@ -154,6 +154,7 @@ class AccountHandler(HandlerBase):
             raise Exception("Resetting account balance is only allowed in development environment")
         url = f"{self.base_url}/port/v1/accounts/{self._account_key}/reset"
         response = self.session.put(url, json={"NewBalance": 100000})
+        self._forget_portfolio_gets()
         response.raise_for_status()
         logger.debug("Account balance reset response: %s", response.text)
         if response.status_code != 204:
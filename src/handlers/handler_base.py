@@ -1,4 +1,17 @@
-from requests import Session
+from requests import Response, Session
+from urllib.parse import urlparse
+from utils.single_flight import single_flight
+import os
+
+
+def coalesced_paths() -> list:
+    """Returns the API path fragments whose concurrent identical GETs share one request, from env ``COALESCE_GET_PATHS``.
+
+    Reference data and the portfolio by default. Portfolio GETs in flight are forgotten after every order
+    write, see ``HandlerBase._forget_portfolio_gets``, so a GET sent after an order never gets the answer of one
+    sent before it.
+    """
+    return [path.strip() for path in os.getenv("COALESCE_GET_PATHS", "/ref/,/port/").split(",") if path.strip()]
 
 
 class HandlerBase:
@@ -14,3 +27,25 @@ class HandlerBase:
 
         self.base_url = base_url
         self.session = session
+        self.coalesced_paths = coalesced_paths()
+
+    def _get(self, url: str) -> Response:
+        """
+        Sends a GET request. While a GET for the same URL of a coalesced path is in flight, waits for it
+        and shares its response instead of sending another.
+
+        Args:
+            url (str): The URL to get
+
+        Returns:
+            Response: The response
+        """
+        path = urlparse(url).path
+        if not any(fragment in path for fragment in self.coalesced_paths):
+            return self.session.get(url)
+        return single_flight.do(url, lambda: self.session.get(url))
+
+    @staticmethod
+    def _forget_portfolio_gets() -> None:
+        """Makes the next portfolio GETs start afresh instead of joining one sent before a write, e.g. an order."""
+        single_flight.forget(lambda url: "/port/" in urlparse(url).path)
@@ -0,0 +1,553 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from requests import Session
+from redis import Redis
+from handlers.handler_base import HandlerBase
+from data_models.trading.asset_type import AssetType
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import eventlet
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fields of an instrument kept in the index
+INSTRUMENT_FIELDS = ("Identifier", "Symbol", "AssetType", "Description", "ExchangeId", "CurrencyCode")
+
+
+def _instrument_key(instrument: dict) -> Tuple[int, str]:
+    return int(instrument["Identifier"]), str(instrument["AssetType"])
+
+
+def _symbol_names(instrument: dict) -> List[str]:
+    """Returns the lower-cased names an instrument is found by: its symbol and, for ``AAPL:xnas``, the bare ticker."""
+    symbol = str(instrument.get("Symbol", "")).lower()
+    names = [symbol]
+    ticker = symbol.split(":", 1)[0]
+    if ticker and ticker != symbol:
+        names.append(ticker)
+    return names
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _description(instrument: dict) -> str:
+    return str(instrument.get("Description", "")).lower()
+
+
+class InstrumentIndex:
+    """
+    In-memory index of the instrument universe.
+
+    Instruments are found by symbol, by (symbol, asset type), by UIC, by symbol prefix and, through a trigram
+    index, by any part of their description. A UIC is only unique within its asset type, so the index is keyed
+    by (UIC, asset type).
+    """
+
+    def __init__(self, instruments: Iterable[dict] = ()) -> None:
+        self.instruments: Dict[Tuple[int, str], dict] = {}
+        self.by_symbol: Dict[str, List[dict]] = {}
+        self.by_symbol_type: Dict[Tuple[str, str], List[dict]] = {}
+        self.by_uic: Dict[int, List[dict]] = {}
+        # Sorted (name, uic, asset type) for prefix searches
+        self._names: List[Tuple[str, int, str]] = []
+        # Sorted (description, uic, asset type) for description prefix searches
+        self._descriptions: List[Tuple[str, int, str]] = []
+        # Lower-cased description per instrument, the text substring searches match against
+        self._lowered: Dict[Tuple[int, str], str] = {}
+        # Keys of the instruments whose description contains a trigram, and the same keys shortest description
+        # first, kept sorted on every change so no search has to sort
+        self._trigrams: Dict[str, Set[Tuple[int, str]]] = {}
+        self._ordered: Dict[str, List[Tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+        for instrument in instruments:
+            self._add(instrument)
+        self._names.sort()
+        self._descriptions.sort()
+        self._ordered = {trigram: sorted(keys, key=self._rank) for trigram, keys in self._trigrams.items()}
+
+    def __len__(self) -> int:
+        return len(self.instruments)
+
+    @property
+    def asset_types(self) -> Set[str]:
+        return {key[1] for key in self.instruments}
+
+    def get(self, symbol: str, asset_type: AssetType) -> Optional[dict]:
+        """
+        Returns the instrument of a symbol, matching the full symbol before the bare ticker.
+
+        Args:
+            symbol (str): The symbol, e.g. ``AAPL:xnas`` or ``AAPL``
+            asset_type (AssetType): The type of asset
+
+        Returns:
+            Optional[dict]: The instrument, or None if it is not indexed or the ticker is ambiguous
+        """
+        candidates = self.by_symbol_type.get((symbol.lower(), asset_type.value), [])
+        exact = [item for item in candidates if str(item.get("Symbol", "")).lower() == symbol.lower()]
+        matches = exact or candidates
+        return matches[0] if len(matches) == 1 else None
+
+    def get_by_uic(self, uic: int, asset_type: Optional[AssetType] = None) -> List[dict]:
+        """Returns the instruments with a UIC, of one asset type or of all."""
+        items = self.by_uic.get(int(uic), [])
+        if asset_type is None:
+            return list(items)
+        return [item for item in items if item["AssetType"] == asset_type.value]
+
+    def search_prefix(self, prefix: str, asset_type: Optional[AssetType] = None, limit: int = 20) -> List[dict]:
+        """
+        Returns the instruments whose symbol or ticker starts with a prefix, in symbol order.
+
+        Args:
+            prefix (str): The start of the symbol, case-insensitive
+            asset_type (Optional[AssetType]): Only returns instruments of this type
+            limit (int): The maximum number of instruments returned
+        """
+        prefix = prefix.lower()
+        results: List[dict] = []
+        seen: Set[Tuple[int, str]] = set()
+        names = self._names
+        i = bisect_left(names, (prefix,))
+        while i < len(names) and names[i][0].startswith(prefix) and len(results) < limit:
+            key = (names[i][1], names[i][2])
+            i += 1
+            if key in seen or (asset_type is not None and key[1] != asset_type.value):
+                continue
+            seen.add(key)
+            instrument = self.instruments.get(key)
+            if instrument is not None:
+                results.append(instrument)
+        return results
+
+    def search(self, query: str, asset_type: Optional[AssetType] = None, limit: int = 20) -> List[dict]:
+        """
+        Searches the instruments by free text. Exact symbol matches rank first, then symbol prefix matches,
+        then description matches, those starting with the query before those containing it.
+
+        Args:
+            query (str): The text to search for, case-insensitive
+            asset_type (Optional[AssetType]): Only returns instruments of this type
+            limit (int): The maximum number of instruments returned
+
+        Returns:
+            List[dict]: The matching instruments, best match first
+        """
+        query = query.strip().lower()
+        if not query or limit <= 0:
+            return []
+        results: List[dict] = []
+        seen: Set[Tuple[int, str]] = set()
+
+        def add(instruments: Iterable[dict]) -> None:
+            for instrument in instruments:
+                key = _instrument_key(instrument)
+                if len(results) >= limit or key in seen:
+                    continue
+                if asset_type is not None and key[1] != asset_type.value:
+                    continue
+                seen.add(key)
+                results.append(instrument)
+
+        add(self.by_symbol.get(query, []))
+        add(self.search_prefix(query, asset_type, limit + len(seen)))
+        if len(results) >= limit:
+            return results
+
+        # Descriptions starting with the query, then those containing it
+        descriptions = self._descriptions
+        i = bisect_left(descriptions, (query,))
+        starting: List[dict] = []
+        while i < len(descriptions) and descriptions[i][0].startswith(query) and len(results) + len(starting) < limit:
+            key = (descriptions[i][1], descriptions[i][2])
+            i += 1
+            if key in seen or key not in self.instruments or (asset_type is not None and key[1] != asset_type.value):
+                continue
+            starting.append(self.instruments[key])
+        add(starting)
+        if len(results) >= limit or len(query) < 3:
+            return results
+
+        trigrams = sorted(_trigrams(query), key=lambda trigram: len(self._trigrams.get(trigram, ())))
+        if not trigrams or trigrams[0] not in self._trigrams:
+            return results
+        others = [self._trigrams[trigram] for trigram in trigrams[1:]]
+        lowered = self._lowered
+        for key in self._ordered.get(trigrams[0], ()):
+            if len(results) >= limit:
+                break
+            if key in seen or not all(key in keys for keys in others):
+                continue
+            if query in lowered.get(key, ""):
+                add([self.instruments[key]])
+        return results
+
+    def _rank(self, key: Tuple[int, str]) -> Tuple[int, Tuple[int, str]]:
+        return len(self._lowered[key]), key
+
+    def diff(self, asset_type: str, instruments: Iterable[dict]) -> Tuple[List[dict], List[Tuple[int, str]]]:
+        """
+        Compares a fresh listing of one asset type with the index.
+
+        Args:
+            asset_type (str): The asset type the listing covers
+            instruments (Iterable[dict]): All current instruments of that type
+
+        Returns:
+            Tuple[List[dict], List[Tuple[int, str]]]: The new or changed instruments, and the keys of the removed ones
+        """
+        fresh = {_instrument_key(item): item for item in instruments}
+        changed = [item for key, item in fresh.items() if self.instruments.get(key) != item]
+        removed = [key for key in self.instruments if key[1] == asset_type and key not in fresh]
+        return changed, removed
+
+    def apply(self, changed: Iterable[dict], removed: Iterable[Tuple[int, str]] = ()) -> None:
+        """Adds or replaces the changed instruments and drops the removed ones."""
+        changed = list(changed)
+        dropped = set(removed) | {_instrument_key(instrument) for instrument in changed}
+        with self._lock:
+            for key in dropped:
+                self._remove(key)
+            self._names = [entry for entry in self._names if (entry[1], entry[2]) not in dropped]
+            self._descriptions = [entry for entry in self._descriptions if (entry[1], entry[2]) not in dropped]
+            for instrument in changed:
+                self._add(instrument, ordered=True)
+            self._names.sort()
+            self._descriptions.sort()
+
+    def _add(self, instrument: dict, ordered: bool = False) -> None:
+        key = _instrument_key(instrument)
+        self.instruments[key] = instrument
+        self.by_uic.setdefault(key[0], []).append(instrument)
+        for name in _symbol_names(instrument):
+            self.by_symbol.setdefault(name, []).append(instrument)
+            self.by_symbol_type.setdefault((name, key[1]), []).append(instrument)
+            self._names.append((name, key[0], key[1]))
+        description = _description(instrument)
+        if description:
+            self._descriptions.append((description, key[0], key[1]))
+            self._lowered[key] = description
+        for trigram in _trigrams(description):
+            self._trigrams.setdefault(trigram, set()).add(key)
+            if ordered:
+                insort(self._ordered.setdefault(trigram, []), key, key=self._rank)
+
+    def _remove(self, key: Tuple[int, str]) -> None:
+        instrument = self.instruments.pop(key, None)
+        if instrument is None:
+            return
+        self._discard(self.by_uic, key[0], instrument)
+        for name in _symbol_names(instrument):
+            self._discard(self.by_symbol, name, instrument)
+            self._discard(self.by_symbol_type, (name, key[1]), instrument)
+        for trigram in _trigrams(self._lowered.pop(key, "")):
+            keys = self._trigrams.get(trigram)
+            if keys is None or key not in keys:
+                continue
+            keys.discard(key)
+            self._ordered[trigram].remove(key)
+            if not keys:
+                del self._trigrams[trigram]
+                del self._ordered[trigram]
+
+    @staticmethod
+    def _discard(index: dict, name, instrument: dict) -> None:
+        items = [item for item in index.get(name, []) if item is not instrument]
+        if items:
+            index[name] = items
+        else:
+            index.pop(name, None)
+
+
+class InstrumentHandler(HandlerBase):
+    """
+    Resolves symbols to UICs for all handlers.
+
+    Lookups go through the preloaded instrument index, an in-process LRU, then a Redis cache shared by all replicas
+    and kept across restarts, and only then to the Saxo reference data API. Local entries expire after ``local_ttl``
+    so an invalidation on one replica reaches the others.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        base_url: str,
+        redis: Optional[Redis] = None,
+        ttl: Optional[int] = None,
+        local_ttl: Optional[float] = None,
+        maxsize: Optional[int] = None,
+        prefix: Optional[str] = None,
+    ) -> None:
+        """
+        Initialize the InstrumentHandler.
+
+        Args:
+            session (Session): The requests session
+            base_url (str): The base URL for the Saxo Bank API
+            redis (Optional[Redis]): Shared cache. Without it only the in-process cache is used.
+            ttl (Optional[int]): Seconds a UIC is kept in Redis. Defaults to env ``INSTRUMENT_CACHE_TTL`` or one day.
+            local_ttl (Optional[float]): Seconds a UIC is kept in process. Defaults to env ``INSTRUMENT_CACHE_LOCAL_TTL`` or 300.
+            maxsize (Optional[int]): Number of UICs kept in process. Defaults to env ``INSTRUMENT_CACHE_SIZE`` or 1024.
+            prefix (Optional[str]): Prefix of the Redis keys. Defaults to env ``INSTRUMENT_CACHE_PREFIX`` or "instrument".
+        """
+        super().__init__(session, base_url)
+        self.redis = redis
+        self.ttl = ttl or int(os.getenv("INSTRUMENT_CACHE_TTL", "86400"))
+        self.local_ttl = local_ttl if local_ttl is not None else float(os.getenv("INSTRUMENT_CACHE_LOCAL_TTL", "300"))
+        self.maxsize = maxsize or int(os.getenv("INSTRUMENT_CACHE_SIZE", "1024"))
+        self.prefix = prefix or os.getenv("INSTRUMENT_CACHE_PREFIX", "instrument")
+        self._local: "OrderedDict[Tuple[str, str], Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.index: Optional[InstrumentIndex] = None
+        self.running = False
+
+    def _key(self, symbol: str, asset_type: AssetType) -> str:
+        return f"{self.prefix}:uic:{asset_type.value}:{symbol.lower()}"
+
+    def get_uic(self, symbol: str, asset_type: AssetType) -> Optional[int]:
+        """
+        Retrieves the UIC for a given symbol and asset type.
+
+        Args:
+            symbol (str): The symbol of the asset
+            asset_type (AssetType): The type of asset
+
+        Returns:
+            Optional[int]: The UIC of the asset, or None if it is unknown or ambiguous
+        """
+        if self.index is not None:
+            instrument = self.index.get(symbol, asset_type)
+            if instrument is not None:
+                return int(instrument["Identifier"])
+
+        uic = self._get_local(symbol, asset_type)
+        if uic is not None:
+            return uic
+
+        uic = self._get_shared(symbol, asset_type)
+        if uic is None:
+            uic = self._lookup(symbol, asset_type)
+            if uic is None:
+                return None
+            self._set_shared(symbol, asset_type, uic)
+        self._set_local(symbol, asset_type, uic)
+        return uic
+
+    def invalidate(self, symbol: Optional[str] = None, asset_type: Optional[AssetType] = None) -> None:
+        """
+        Drops cached UICs, e.g. after an instrument was relisted.
+
+        Args:
+            symbol (Optional[str]): The symbol to drop. Drops every cached UIC when omitted.
+            asset_type (Optional[AssetType]): The asset type of the symbol. Drops the symbol of every type when omitted.
+        """
+        asset_types = [asset_type.value] if asset_type is not None else None
+        with self._lock:
+            for key in list(self._local):
+                if symbol is not None and key[0] != symbol.lower():
+                    continue
+                if asset_types is not None and key[1] not in asset_types:
+                    continue
+                del self._local[key]
+
+        if self.redis is None:
+            return
+        if symbol is not None and asset_type is not None:
+            try:
+                self.redis.delete(self._key(symbol, asset_type))
+            except Exception as e:
+                logger.error(f"Error invalidating cached UIC for {symbol}: {e}")
+            return
+        pattern = f"{self.prefix}:uic:{asset_type.value if asset_type is not None else '*'}:{symbol.lower() if symbol is not None else '*'}"
+        try:
+            keys = list(self.redis.scan_iter(match=pattern, count=1000))
+            if keys:
+                self.redis.delete(*keys)
+        except Exception as e:
+            logger.error(f"Error invalidating cached UICs matching {pattern}: {e}")
+
+    def _get_local(self, symbol: str, asset_type: AssetType) -> Optional[int]:
+        key = (symbol.lower(), asset_type.value)
+        with self._lock:
+            cached = self._local.get(key)
+            if cached is None:
+                return None
+            if cached[0] < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return cached[1]
+
+    def _set_local(self, symbol: str, asset_type: AssetType, uic: int) -> None:
+        with self._lock:
+            self._local[(symbol.lower(), asset_type.value)] = (time.monotonic() + self.local_ttl, uic)
+            self._local.move_to_end((symbol.lower(), asset_type.value))
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def _get_shared(self, symbol: str, asset_type: AssetType) -> Optional[int]:
+        if self.redis is None:
+            return None
+        try:
+            value = self.redis.get(self._key(symbol, asset_type))
+        except Exception as e:
+            logger.error(f"Error reading cached UIC for {symbol}: {e}")
+            return None
+        return int(value) if value is not None else None
+
+    def _set_shared(self, symbol: str, asset_type: AssetType, uic: int) -> None:
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(self._key(symbol, asset_type), uic, ex=self.ttl)
+        except Exception as e:
+            logger.error(f"Error caching UIC for {symbol}: {e}")
+
+    def _lookup(self, symbol: str, asset_type: AssetType) -> Optional[int]:
+        try:
+            url = f"{self.base_url}/ref/v1/instruments?KeyWords={symbol}&AssetType={asset_type.value}"
+            response = self._get(url)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            logger.error(f"Error getting UIC for {symbol}: {e}")
+            return None
+
+        items = data.get("Data") or []
+        if not items:
+            logger.warning(f"No UIC found for symbol {symbol} and asset type {asset_type}.")
+            return None
+        if len(items) == 1:
+            return items[0]["Identifier"]
+
+        # Try to find exact match
+        matches = [
+            item for item in items
+            if str(item.get("Symbol", "")).lower() == symbol.lower() and item.get("AssetType", asset_type.value) == asset_type.value
+        ]
+        if len(matches) == 1:
+            return matches[0]["Identifier"]
+        logger.warning(f"Multiple UICs found for symbol {symbol} and asset type {asset_type}.")
+        for item in items:
+            logger.warning(f"UIC: {item.get('Identifier')}, Symbol: {item.get('Symbol')}")
+        return None
+
+    def fetch_instruments(self, asset_type: str, page_size: int = 1000) -> List[dict]:
+        """
+        Retrieves all instruments of an asset type, following the result pages.
+
+        Args:
+            asset_type (str): The asset type to list
+            page_size (int): The number of instruments per request
+
+        Returns:
+            List[dict]: The instruments, with the fields in ``INSTRUMENT_FIELDS``
+        """
+        url: Optional[str] = f"{self.base_url}/ref/v1/instruments?AssetTypes={asset_type}&$top={page_size}"
+        instruments = []
+        while url:
+            response = self._get(url)
+            response.raise_for_status()
+            data = response.json()
+            for item in data.get("Data", []):
+                instrument = {field: item[field] for field in INSTRUMENT_FIELDS if field in item}
+                instrument.setdefault("AssetType", asset_type)
+                instruments.append(instrument)
+            url = data.get("__next")
+        return instruments
+
+    def preload(self, asset_types: List[str]) -> int:
+        """
+        Loads the instrument universe of the given asset types into the index, replacing the current one.
+        An asset type that fails to load is left out and resolved through the API as before.
+
+        Args:
+            asset_types (List[str]): The asset types to load, e.g. ``UserHandler.legal_assets``
+
+        Returns:
+            int: The number of instruments indexed
+        """
+        instruments: List[dict] = []
+        for asset_type in asset_types:
+            try:
+                instruments += self.fetch_instruments(asset_type)
+            except Exception as e:
+                logger.error(f"Error preloading {asset_type} instruments: {e}")
+        self.index = InstrumentIndex(instruments)
+        logger.info(f"Indexed {len(self.index)} instruments of {len(self.index.asset_types)} asset types.")
+        return len(self.index)
+
+    def refresh(self, asset_types: List[str]) -> int:
+        """
+        Brings the index up to date, applying only the instruments that were added, changed or removed.
+        Cached UICs of changed or removed symbols are invalidated.
+
+        Args:
+            asset_types (List[str]): The asset types to refresh
+
+        Returns:
+            int: The number of instruments that changed
+        """
+        if self.index is None:
+            return self.preload(asset_types)
+        changes = 0
+        for asset_type in asset_types:
+            try:
+                instruments = self.fetch_instruments(asset_type)
+            except Exception as e:
+                logger.error(f"Error refreshing {asset_type} instruments: {e}")
+                continue
+            changed, removed = self.index.diff(asset_type, instruments)
+            stale = [self.index.instruments[key] for key in removed]
+            stale += [self.index.instruments[_instrument_key(item)] for item in changed if _instrument_key(item) in self.index.instruments]
+            self.index.apply(changed, removed)
+            for instrument in stale:
+                try:
+                    stale_type = AssetType(instrument["AssetType"])
+                except ValueError:
+                    continue
+                for name in _symbol_names(instrument):
+                    self.invalidate(name, stale_type)
+            if changed or removed:
+                logger.info(f"Refreshed {asset_type} instruments: {len(changed)} added or changed, {len(removed)} removed.")
+            changes += len(changed) + len(removed)
+        return changes
+
+    def start(self, asset_types: Callable[[], List[str]], refresh_hour: Optional[int] = None) -> None:
+        """
+        Preloads the index in the background and refreshes it every night.
+
+        Args:
+            asset_types (Callable[[], List[str]]): Returns the asset types to index
+            refresh_hour (Optional[int]): The UTC hour of the nightly refresh. Defaults to env ``INSTRUMENT_REFRESH_HOUR`` or 2.
+        """
+        hour = refresh_hour if refresh_hour is not None else int(os.getenv("INSTRUMENT_REFRESH_HOUR", "2"))
+        self.running = True
+        eventlet.spawn_n(self._run, asset_types, hour)
+
+    def stop(self) -> None:
+        self.running = False
+
+    def _run(self, asset_types: Callable[[], List[str]], hour: int) -> None:
+        try:
+            self.preload(asset_types())
+        except Exception as e:
+            logger.error(f"Instrument preload failed: {e}")
+        while self.running:
+            now = datetime.now(timezone.utc)
+            next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            eventlet.sleep((next_run - now).total_seconds())
+            if not self.running:
+                break
+            try:
+                self.refresh(asset_types())
+            except Exception as e:
+                logger.error(f"Instrument refresh failed: {e}")
@@ -3,20 +3,39 @@ from handlers.handler_base import HandlerBase
 from data_models.trading.asset_type import AssetType
 from data_models.price.price_info import PriceInfo
 from handlers.user_handler import UserHandler
-from typing import List, Dict, Optional, Union
+from handlers.instrument_handler import InstrumentHandler
+from typing import List, Dict, Optional, Tuple, Union
+import eventlet
 import logging
 import functools
+import os
 from utils.database import Database
+from streaming.snapshots import SnapshotStore
 
 logger = logging.getLogger(__name__)
 
+# Values of the X-Price-Source response header
+PRICE_SOURCE_STREAM = "stream"
+PRICE_SOURCE_REST = "rest"
+
 
 class PriceHandler(HandlerBase):
     """
     Handler for retrieving price information from the Saxo Bank API.
     """
     
-    def __init__(self, user_handler: UserHandler, session: Session, base_url: str, context_id: str) -> None:
+    def __init__(
+        self,
+        user_handler: UserHandler,
+        session: Session,
+        base_url: str,
+        context_id: str,
+        snapshots: Optional[SnapshotStore] = None,
+        max_staleness: Optional[float] = None,
+        instruments: Optional[InstrumentHandler] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> None:
         """
         Initialize the PriceHandler.
 
@@ -25,11 +44,20 @@ class PriceHandler(HandlerBase):
             session (Session): The requests session
             base_url (str): The base URL for the Saxo Bank API
             context_id (str): The context ID for the API requests
+            snapshots (Optional[SnapshotStore]): Streamed prices to answer from before calling the API
+            max_staleness (Optional[float]): Maximum age in seconds of a streamed price. Defaults to PRICE_MAX_STALENESS or 5.
+            instruments (Optional[InstrumentHandler]): Shared symbol to UIC resolution. Defaults to a process-local one.
+            batch_size (Optional[int]): Maximum number of UICs per price list request. Defaults to PRICE_BATCH_SIZE or 100.
+            concurrency (Optional[int]): Maximum number of concurrent requests of a batch. Defaults to PRICE_BATCH_CONCURRENCY or 8.
         """
         super().__init__(session, base_url)
         self.user_handler = user_handler
-        self.uic_cache: Dict[str, Dict[AssetType, int]] = {}  # Cache for symbol->UIC lookups
+        self.instruments = instruments or InstrumentHandler(session, base_url)
         self.context_id = context_id
+        self.snapshots = snapshots
+        self.max_staleness = max_staleness if max_staleness is not None else float(os.getenv("PRICE_MAX_STALENESS", "5"))
+        self.batch_size = batch_size or int(os.getenv("PRICE_BATCH_SIZE", "100"))
+        self.concurrency = concurrency or int(os.getenv("PRICE_BATCH_CONCURRENCY", "8"))
 
     def get_price(self, symbol: str, asset_type: AssetType = AssetType.Stock) -> Optional[PriceInfo]:
         """
@@ -42,25 +70,110 @@ class PriceHandler(HandlerBase):
         Returns:
             Optional[PriceInfo]: The price information of the asset, or None if not found
         """
+        return self.get_price_with_source(symbol, asset_type)[0]
+
+    def get_price_with_source(self, symbol: str, asset_type: AssetType = AssetType.Stock) -> Tuple[Optional[PriceInfo], Optional[str]]:
+        """
+        Get the current price info for a symbol, preferring a fresh streamed price over an API call.
+
+        Args:
+            symbol (str): The symbol or friendly name of the asset
+            asset_type (AssetType, optional): The type of asset. Defaults to AssetType.Stock.
+
+        Returns:
+            Tuple[Optional[PriceInfo], Optional[str]]: The price information, or None if not found,
+                and where it came from (PRICE_SOURCE_STREAM or PRICE_SOURCE_REST)
+        """
         try:
             uic = self.get_uic_for_symbol(symbol, asset_type)
             if uic is None:
                 logger.warning(f"No UIC found for symbol: {symbol}, asset type: {asset_type}")
-                return None
-                
+                return None, None
+
+            streamed = self.get_streamed_price(uic, asset_type)
+            if streamed is not None:
+                return streamed, PRICE_SOURCE_STREAM
+
             price_info_list = self.get_price_info_for_assets([uic], asset_type)
             if not price_info_list:
-                return None
-            return price_info_list[0]
+                return None, PRICE_SOURCE_REST
+            return price_info_list[0], PRICE_SOURCE_REST
         except Exception as e:
             logger.error(f"Error getting price for {symbol}: {e}")
+            return None, None
+
+    def get_prices(self, assets: List[Tuple[str, AssetType]]) -> Dict[Tuple[str, AssetType], Optional[PriceInfo]]:
+        """
+        Get the current price info for many symbols with as few API calls as possible.
+        Fresh streamed prices are used as is; the other UICs are fetched with one price list call per asset type
+        and chunk of ``batch_size``, run concurrently.
+
+        Args:
+            assets (List[Tuple[str, AssetType]]): The symbols and their asset types
+
+        Returns:
+            Dict[Tuple[str, AssetType], Optional[PriceInfo]]: The price information per symbol and asset type,
+                None for unknown symbols or missing prices
+        """
+        pool = eventlet.GreenPool(self.concurrency)
+        uics = list(pool.imap(lambda asset: self.get_uic_for_symbol(*asset), assets))
+
+        prices: Dict[Tuple[str, AssetType], Optional[PriceInfo]] = {(symbol, asset_type): None for symbol, asset_type in assets}
+        # Symbols waiting for a price, per UIC and asset type
+        pending: Dict[AssetType, Dict[int, List[str]]] = {}
+        for (symbol, asset_type), uic in zip(assets, uics):
+            if uic is None:
+                logger.warning(f"No UIC found for symbol: {symbol}, asset type: {asset_type}")
+                continue
+            streamed = self.get_streamed_price(uic, asset_type)
+            if streamed is not None:
+                prices[(symbol, asset_type)] = streamed
+                continue
+            pending.setdefault(asset_type, {}).setdefault(uic, []).append(symbol)
+
+        chunks: List[Tuple[AssetType, List[int]]] = []
+        for asset_type, by_uic in pending.items():
+            group = list(by_uic)
+            for i in range(0, len(group), self.batch_size):
+                chunks.append((asset_type, group[i:i + self.batch_size]))
+
+        results = pool.imap(lambda chunk: self.get_price_info_for_assets(chunk[1], chunk[0]), chunks)
+        for (asset_type, _), price_infos in zip(chunks, results):
+            for price_info in price_infos:
+                for symbol in pending[asset_type].get(price_info.uic, []):
+                    prices[(symbol, asset_type)] = price_info
+        return prices
+
+    def get_streamed_price(self, uic: int, asset_type: AssetType) -> Optional[PriceInfo]:
+        """
+        Returns the streamed price of an asset if it is subscribed and no older than ``max_staleness``.
+
+        Args:
+            uic (int): The UIC of the asset
+            asset_type (AssetType): The type of asset
+
+        Returns:
+            Optional[PriceInfo]: The streamed price information, or None on a miss or when it is stale
+        """
+        if self.snapshots is None:
+            return None
+        found = self.snapshots.find_instrument(uic, asset_type.value)
+        if found is None:
+            return None
+        row, age = found
+        if age > self.max_staleness:
+            logger.debug(f"Streamed price for UIC {uic} is stale ({age:.1f}s)")
+            return None
+        try:
+            return PriceInfo(row)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.debug(f"Streamed price for UIC {uic} is incomplete: {e}")
             return None
 
-    @functools.lru_cache(maxsize=128)
     def get_uic_for_symbol(self, symbol: str, asset_type: AssetType) -> Optional[int]:
         """
         Retrieves the UIC for a given symbol and asset type.
-        Uses a cache to avoid repeated API calls for the same symbol.
+        Uses the instrument cache to avoid repeated API calls for the same symbol.
 
         Args:
             symbol (str): The symbol of the asset
@@ -69,41 +182,7 @@ class PriceHandler(HandlerBase):
         Returns:
             Optional[int]: The UIC of the asset, or None if not found
         """
-        # Check cache first
-        if symbol in self.uic_cache and asset_type in self.uic_cache[symbol]:
-            return self.uic_cache[symbol][asset_type]
-
-        try:
-            url = f"{self.base_url}/ref/v1/instruments?KeyWords={symbol}&AssetType={asset_type.value}"
-            response = self.session.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-        except Exception as e:
-            logger.error(f"Error getting UIC for {symbol}: {e}")
-            return None
-        if not data.get("Data"):
-            logger.warning(f"No data found for symbol {symbol} and asset type {asset_type}.")
-            return None
-            
-        if len(data["Data"]) > 1:
-            # Try to find exact match
-            items = [item for item in data["Data"] if item.get("Symbol").lower() == symbol.lower() and item.get("AssetType") == asset_type.value]
-            if len(items) == 1:
-                uic = items[0]["Identifier"]
-            else:
-                logger.warning(f"Multiple UICs found for symbol {symbol} and asset type {asset_type}.")
-                for item in data["Data"]:
-                    logger.warning(f"UIC: {item.get('Identifier')}, Symbol: {item.get('Symbol')}")
-                # Use the first one as default
-                uic = data[0]["Identifier"]
-        elif len(data["Data"]) == 0:
-            logger.warning(f"No UIC found for symbol {symbol} and asset type {asset_type}.")
-            return None
-        else:
-            uic = data["Data"][0]["Identifier"]
-        return uic
-            
+        return self.instruments.get_uic(symbol, asset_type)
 
     def get_price_info_for_asset(self, uic: int, asset_type: AssetType) -> Optional[PriceInfo]:
         """
@@ -144,7 +223,7 @@ class PriceHandler(HandlerBase):
                 f"&AssetType={asset_type.value}"
                 f"&FieldGroups=DisplayAndFormat,Quote"
             )
-            response = self.session.get(url)
+            response = self._get(url)
             response.raise_for_status()
             data = response.json()
             
@@ -179,7 +258,7 @@ class PriceHandler(HandlerBase):
                 f"?AccountKey={self.user_handler.default_account_key}"
                 f"&ClientKey={self.user_handler.client_key}"
             )
-            response = self.session.get(url)
+            response = self._get(url)
             response.raise_for_status()
             data = response.json()
         except Exception as e:
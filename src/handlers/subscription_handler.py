@@ -3,14 +3,58 @@ from handlers.user_handler import UserHandler
 from utils.database import Database
 from data_models.trading.asset_type import AssetType
 import logging
-from typing import Optional, List, Dict, Union
+import os
+import socket
+import threading
+from typing import Any, Callable, Optional, List, Dict, Set, Union
 from requests import Session
 from handlers.handler_base import HandlerBase
+from streaming.snapshots import SnapshotStore
+from streaming.shards import shard_context_id, shard_context_ids, shard_for, standby_context_id
 
 logger = logging.getLogger(__name__)
 
+SUBSCRIPTION_COLUMNS = "context_id, reference_id, algo_name, uic, asset_type, timeframe, created_at"
+# Algo name of the subscriptions created for downstream websocket clients, suffixed per replica
+AUTO_SUBSCRIPTION_TAG = "ws_auto"
+
+
+def auto_subscription_tag() -> str:
+    """Returns the member name of this replica's websocket clients, from env ``REPLICA_ID`` or the host name.
+
+    Every replica counts its own clients, so each holds its own membership and cannot end another one's.
+    The memberships of replicas that are gone are removed by ``ReplicaRegistry``.
+    """
+    return f"{AUTO_SUBSCRIPTION_TAG}:{os.getenv('REPLICA_ID') or socket.gethostname()}"
+
+
+def is_auto_subscription_tag(algo_name: str) -> bool:
+    """Whether a member of a subscription stands for downstream websocket clients rather than an algo."""
+    return algo_name.startswith(AUTO_SUBSCRIPTION_TAG)
+
+
+def parse_asset_type(value: str) -> AssetType:
+    """Parses a stored asset type, including rows written as ``str(AssetType.X)``."""
+    return AssetType(value.split(".")[-1])
+
+
 class SubscriptionHandler(HandlerBase):
-    def __init__(self, price_handler: PriceHandler, user_handler: UserHandler, base_url: str, session: Session):
+    """Price subscriptions, shared between the algos that ask for the same instrument.
+
+    An upstream subscription is identified by (uic, asset type, refresh rate). Every algo subscribing to it is
+    stored as a member row under the same reference ID, so Saxo holds one subscription per unique instrument
+    and rate. It is only removed at Saxo once its last member has left.
+    """
+    def __init__(
+        self,
+        price_handler: PriceHandler,
+        user_handler: UserHandler,
+        base_url: str,
+        session: Session,
+        snapshots: Optional[SnapshotStore] = None,
+        shards: int = 1,
+        standby: bool = False,
+    ):
         """
         Initializes the SubscriptionHandler with necessary handlers and session.
 
@@ -19,46 +63,119 @@ class SubscriptionHandler(HandlerBase):
             user_handler (UserHandler): Handler for user-related operations
             base_url (str): Base URL for the API
             session (Session): Requests session for making API calls
+            snapshots (Optional[SnapshotStore]): Store seeded with the snapshot of every new subscription
+            shards (int): Number of upstream connections the subscriptions of a context are spread over
+            standby (bool): Whether every subscription is mirrored on the standby context of its connection
         """
         super().__init__(session, base_url)
         self.price_handler = price_handler
         self.user_handler = user_handler
+        self.snapshots = snapshots
+        self.shards = shards
+        self.standby = standby
+        # Called with a reference ID whenever an algo joins or leaves it, e.g. to refresh cached tags
+        self.on_members_changed: Optional[Callable[[str], None]] = None
+        # Called with a reference ID whenever an algo joins a subscription that already exists, e.g. to resume it
+        self.on_joined: Optional[Callable[[str], None]] = None
+        # Called with a reference ID and the snapshot Saxo answered a subscribe with, e.g. to publish it to followers
+        self.on_snapshot: Optional[Callable[[str, Any], None]] = None
+        # Downstream clients of this replica per ref id, sharing the membership named auto_tag
+        self._demand: Dict[str, int] = {}
+        self.auto_tag = auto_subscription_tag()
+        # Subscriptions stopped or slowed down for lack of demand, which stay so when they are recreated
+        self._suspended: Set[str] = set()
+        self._refresh_rates: Dict[str, int] = {}
+        # Serializes joining and leaving, so concurrent calls for one instrument subscribe it once
+        self._members_lock = threading.RLock()
+
+    @staticmethod
+    def reference_id_for(uic: int, asset_type: AssetType, timeframe: int) -> str:
+        return "TF"+str(uic).replace(',', '_')+f"_{asset_type.value}_{timeframe}"
+
+    def streaming_context_id(self, context_id: str, reference_id: str) -> str:
+        """Returns the context ID of the upstream connection a subscription streams on."""
+        return shard_context_id(context_id, shard_for(reference_id, self.shards), self.shards)
+
+    def streaming_context_ids(self, context_id: str, reference_id: str, standby: Optional[bool] = None) -> List[str]:
+        """
+        Returns the context IDs a subscription is held on: its connection and, if enabled, that connection's standby.
+
+        Args:
+            context_id (str): The logical context ID of the subscription
+            reference_id (str): The reference ID of the subscription
+            standby (Optional[bool]): True for only the standby context, False for only the primary one, None for both
+        """
+        primary = self.streaming_context_id(context_id, reference_id)
+        if not self.standby or standby is False:
+            return [primary]
+        if standby:
+            return [standby_context_id(primary)]
+        return [primary, standby_context_id(primary)]
+
+    def all_streaming_context_ids(self, context_id: str) -> List[str]:
+        """Returns the context IDs of every upstream connection of a logical context, standbys included."""
+        context_ids = shard_context_ids(context_id, self.shards)
+        if self.standby:
+            context_ids += [standby_context_id(primary) for primary in context_ids]
+        return context_ids
 
-    def _subscribe(self, uic: int, asset_type: AssetType, context_id: str, timeframe: int, algo_name: str) -> Optional[str]:
+    def _subscribe(
+        self,
+        uic: int,
+        asset_type: AssetType,
+        context_id: str,
+        timeframe: int,
+        algo_name: str,
+        standby: Optional[bool] = None,
+        reference_id: Optional[str] = None,
+    ) -> Optional[str]:
         url = (
             f"{self.base_url}/trade/v1/infoprices/subscriptions"
         )
-        body = {
-            "Arguments": {
-                "Uics": str(uic),
-                "AssetType": asset_type.value,
-                "AccountKey": self.user_handler.default_account_key,
-            },
-            "RefreshRate": timeframe,
-            "ReferenceId": "TF"+str(uic).replace(',', '_')+f"_{asset_type.value}",
-            "ContextId": context_id,
-            "Tag": algo_name,
-        }
-        try:
-            response = self.session.post(url, json=body)
-            response.raise_for_status()
-            data = response.json()
-            if "ReferenceId" not in data:
-                logger.warning(f"No subscription ID returned for UIC {uic} and asset type {asset_type}.")
-                return None
-            return data["ReferenceId"]
-        except Exception as e:
-            logger.error(f"Error creating price subscription for UIC {uic}: {e}")
-            return None
- 
+        reference_id = reference_id or self.reference_id_for(uic, asset_type, timeframe)
+        created = None
+        for streaming_context_id in self.streaming_context_ids(context_id, reference_id, standby):
+            body = {
+                "Arguments": {
+                    "Uics": str(uic),
+                    "AssetType": asset_type.value,
+                    "AccountKey": self.user_handler.default_account_key,
+                    "FieldGroups": ["DisplayAndFormat", "Quote"],
+                },
+                "RefreshRate": timeframe,
+                "ReferenceId": reference_id,
+                "ContextId": streaming_context_id,
+                "Tag": algo_name,
+            }
+            try:
+                response = self.session.post(url, json=body)
+                response.raise_for_status()
+                data = response.json()
+                if "ReferenceId" not in data:
+                    logger.warning(f"No subscription ID returned for UIC {uic} and asset type {asset_type} in {streaming_context_id}.")
+                    continue
+                # Both mirrors answer with the same snapshot; the first one seeds the store. A standby on its own
+                # keeps its documents apart until it is promoted.
+                if created is None and standby is not True and "Snapshot" in data:
+                    if self.snapshots is not None:
+                        self.snapshots.seed(data["ReferenceId"], data["Snapshot"])
+                    if self.on_snapshot is not None:
+                        self.on_snapshot(data["ReferenceId"], data["Snapshot"])
+                created = created or data["ReferenceId"]
+            except Exception as e:
+                logger.error(f"Error creating price subscription for UIC {uic} in {streaming_context_id}: {e}")
+        return created
+
     def create_price_subscription(self, asset: str, asset_type: AssetType, context_id: str, timeframe: int, algo_name: str) -> Optional[str]:
         """
-        Creates a price subscription for a given asset.
+        Creates a price subscription for a given asset, or joins the algo to the existing subscription
+        of the same asset at the same timeframe.
 
         Args:
             asset (str): The asset identifier (symbol or UIC)
             asset_type (AssetType): The type of asset being traded
             timeframe (int): The timeframe for the subscription in milliseconds
+            algo_name (str): The algo subscribing
 
         Returns:
             Optional[str]: The subscription ID if successful, None otherwise
@@ -67,9 +184,77 @@ class SubscriptionHandler(HandlerBase):
         if uic is None:
             logger.error(f"Cannot create subscription: Unknown asset {asset} of type {asset_type}.")
             return None
-        ref_id = self._subscribe(uic, asset_type, context_id, timeframe, algo_name)
+        return self._join(uic, asset_type, context_id, timeframe, algo_name)
+
+    def _join(self, uic: int, asset_type: AssetType, context_id: str, timeframe: int, algo_name: str) -> Optional[str]:
+        """Adds an algo to the subscription of an instrument, subscribing at Saxo only for its first member."""
+        ref_id = self.reference_id_for(uic, asset_type, timeframe)
+        with self._members_lock:
+            members = self.members(context_id, ref_id)
+            if members:
+                # It may be stored but not streaming, e.g. suspended while idle
+                self._notify(self.on_joined, ref_id)
+            if algo_name in members:
+                return ref_id
+            if not members:
+                if self._subscribe(uic, asset_type, context_id, timeframe, algo_name, reference_id=ref_id) is None:
+                    return None
+            else:
+                logger.info(f"{algo_name} joins subscription {ref_id} of {', '.join(members)}.")
+            self._store_subscription(context_id, ref_id, algo_name, uic, asset_type, timeframe)
+        self._members_changed(ref_id)
+        return ref_id
+
+    def _leave(self, context_id: str, reference_id: str, algo_name: str) -> bool:
+        """Removes an algo from a subscription, and the subscription at Saxo once no member is left."""
+        with self._members_lock:
+            remaining = [member for member in self.members(context_id, reference_id) if member != algo_name]
+            if not remaining:
+                # The last member's row goes with the others once Saxo removed the subscription
+                return self.remove_price_subscription(context_id, reference_id)
+            with Database() as db:
+                db.execute(
+                    "DELETE FROM subscriptions WHERE context_id = %s AND reference_id = %s AND algo_name = %s",
+                    (context_id, reference_id, algo_name)
+                )
+        logger.info(f"{algo_name} left subscription {reference_id}, kept for {', '.join(remaining)}.")
+        self._members_changed(reference_id)
+        return True
+
+    def _members_changed(self, reference_id: str) -> None:
+        self._notify(self.on_members_changed, reference_id)
+
+    @staticmethod
+    def _notify(callback: Optional[Callable[[str], None]], reference_id: str) -> None:
+        if callback is not None:
+            try:
+                callback(reference_id)
+            except Exception as e:
+                logger.error(f"Subscription callback failed for {reference_id}: {e}")
+
+    def members(self, context_id: str, reference_id: str) -> List[str]:
+        """
+        Retrieves the algo names sharing a subscription in a context.
+
+        Args:
+            context_id (str): The context ID of the subscription
+            reference_id (str): The reference ID of the subscription
+
+        Returns:
+            List[str]: The algo names, empty if the subscription does not exist
+        """
+        with Database() as db:
+            items = db.execute(
+                "SELECT DISTINCT algo_name FROM subscriptions WHERE context_id = %s AND reference_id = %s",
+                (context_id, reference_id)
+            )
+        return [item[0] for item in items or []]
+
+    def _store_subscription(
+        self, context_id: str, ref_id: str, algo_name: str, uic: int, asset_type: AssetType, timeframe: int
+    ) -> None:
         with Database() as db:
-            params = (context_id, ref_id, algo_name, uic, str(asset_type), timeframe)
+            params = (context_id, ref_id, algo_name, uic, asset_type.value, timeframe)
             db.execute(
                 """
                 INSERT INTO subscriptions (context_id, reference_id, algo_name, uic, asset_type, timeframe)
@@ -78,9 +263,64 @@ class SubscriptionHandler(HandlerBase):
                 params
             )
             logger.info(f"Subscription created for UIC {uic} with ID {ref_id}.")
-            
+
+    def acquire_price_subscription(self, asset: str, asset_type: AssetType, context_id: str, timeframe: int = 1000) -> Optional[str]:
+        """
+        Registers a downstream client for an asset. The clients share one membership in the subscription of the
+        asset at ``timeframe``, so an algo subscription at that rate is reused. Every successful call must be paired
+        with ``release_price_subscription``.
+
+        Args:
+            asset (str): The asset identifier (symbol or UIC)
+            asset_type (AssetType): The type of asset
+            context_id (str): The context ID to subscribe in
+            timeframe (int, optional): The refresh rate in milliseconds of a new subscription. Defaults to 1000.
+
+        Returns:
+            Optional[str]: The reference ID to stream, or None if the asset is unknown or cannot be subscribed
+        """
+        uic = self.price_handler.get_uic_for_symbol(asset, asset_type)
+        if uic is None:
+            logger.error(f"Cannot stream unknown asset {asset} of type {asset_type}.")
+            return None
+        with self._members_lock:
+            ref_id = self.reference_id_for(uic, asset_type, timeframe)
+            if not self._demand.get(ref_id):
+                if self._join(uic, asset_type, context_id, timeframe, self.auto_tag) is None:
+                    return None
+            self._demand[ref_id] = self._demand.get(ref_id, 0) + 1
         return ref_id
 
+    def release_price_subscription(self, context_id: str, reference_id: str) -> None:
+        """
+        Unregisters a downstream client. The last one leaving ends the clients' membership, which removes the
+        subscription unless an algo is still subscribed to it.
+
+        Args:
+            context_id (str): The context ID the subscription streams on
+            reference_id (str): The reference ID returned by ``acquire_price_subscription``
+        """
+        with self._members_lock:
+            remaining = self._demand.get(reference_id, 0) - 1
+            if remaining > 0:
+                self._demand[reference_id] = remaining
+                return
+            if self._demand.pop(reference_id, None) is None:
+                return
+            self._leave(context_id, reference_id, self.auto_tag)
+
+    @staticmethod
+    def _row_to_subscription(item: tuple) -> Dict[str, Union[str, int]]:
+        return {
+            "context_id": item[0],
+            "reference_id": item[1],
+            "algo_name": item[2],
+            "uic": item[3],
+            "asset_type": item[4],
+            "timeframe": item[5],
+            "created_at": item[6].isoformat() if item[6] else None
+        }
+
     def get_price_subscriptions(self, context_id: str = "") -> List[Dict[str, Union[str, int]]]:
         """
         Retrieves all price subscriptions for the given context ID.
@@ -95,53 +335,114 @@ class SubscriptionHandler(HandlerBase):
         with Database() as db: 
             if context_id:
                 items = db.execute(
-                    "SELECT * FROM subscriptions",
+                    f"SELECT {SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE context_id = %s",
                     (context_id,)
                 )
             else:
-                items = db.execute("SELECT * FROM subscriptions")
+                items = db.execute(f"SELECT {SUBSCRIPTION_COLUMNS} FROM subscriptions")
         if not items:
             logger.info("No price subscriptions found.")
             return []
-        subscriptions = []
-        for item in items:
-            subscription = {
-                "context_id": item[1],
-                "reference_id": item[2],
-                "algo_name": item[3],
-                "uic": item[4],
-                "asset_type": item[5],
-                "timeframe": item[6],
-                "created_at": item[7].isoformat() if item[7] else None
-            }
-            subscriptions.append(subscription)
+        subscriptions = [self._row_to_subscription(item) for item in items]
         logger.info(f"Retrieved {len(subscriptions)} price subscriptions for context ID {context_id}.")
         return subscriptions
             
-    def remove_price_subscription(self, context_id: str, reference_id) -> bool:
+    def auto_subscription_tags(self, context_id: str) -> List[str]:
+        """
+        Retrieves the member names of the replicas whose websocket clients hold subscriptions in a context.
+
+        Args:
+            context_id (str): The context ID of the subscriptions
+
+        Returns:
+            List[str]: The member names, see ``auto_subscription_tag``
+        """
+        with Database() as db:
+            items = db.execute(
+                "SELECT DISTINCT algo_name FROM subscriptions WHERE context_id = %s AND algo_name LIKE %s",
+                (context_id, f"{AUTO_SUBSCRIPTION_TAG}%")
+            )
+        return [item[0] for item in items or []]
+
+    def migrate_reference_ids(self, context_id: str) -> int:
+        """
+        Moves the rows stored under a reference ID of an older format, e.g. one without the refresh rate, to the
+        current one, so algos joining the subscription find its members. Run before the subscriptions are recreated.
+
+        Args:
+            context_id (str): The context ID of the subscriptions
+
+        Returns:
+            int: The number of reference IDs that were migrated
+        """
+        renames = {}
+        for sub in self.get_price_subscriptions(context_id):
+            reference_id = str(sub["reference_id"])
+            current = self.reference_id_for(int(sub["uic"]), parse_asset_type(str(sub["asset_type"])), int(sub["timeframe"]))
+            if reference_id != current:
+                renames[reference_id] = current
+        if not renames:
+            return 0
+        with Database() as db:
+            for reference_id, current in renames.items():
+                db.execute(
+                    "UPDATE subscriptions SET reference_id = %s WHERE context_id = %s AND reference_id = %s",
+                    (current, context_id, reference_id)
+                )
+                logger.info(f"Migrated subscription {reference_id} to {current}.")
+        return len(renames)
+
+    def get_subscription_tags(self, reference_id: str) -> List[str]:
+        """
+        Retrieves the algo names subscribed to a reference ID.
+
+        Args:
+            reference_id (str): The reference ID of the subscription
+
+        Returns:
+            List[str]: The algo names, empty if there is no such subscription
+        """
+        with Database() as db:
+            items = db.execute(
+                "SELECT DISTINCT algo_name FROM subscriptions WHERE reference_id = %s",
+                (reference_id,)
+            )
+        return [item[0] for item in items or []]
+
+    def remove_price_subscription(self, context_id: str, reference_id, algo_name: Optional[str] = None) -> bool:
         """
         Removes a price subscription by its ID.
 
         Args:
             subscription_id (str): The ID of the subscription to remove
+            algo_name (Optional[str]): Only removes this algo from the subscription, which stays at Saxo
+                while other algos are subscribed to it
 
         Returns:
             bool: True if the subscription was successfully removed, False otherwise
         """
-        url = f"{self.base_url}/trade/v1/prices/subscriptions/{context_id}/{reference_id}"
-        try:
-            response = self.session.delete(url)
-            response.raise_for_status()
-        except Exception as e:
-            logger.error(f"Error removing price subscription {reference_id}: {e}")
-            return False
-            
+        if algo_name:
+            return self._leave(context_id, reference_id, algo_name)
+        for streaming_context_id in self.streaming_context_ids(context_id, reference_id):
+            url = f"{self.base_url}/trade/v1/infoprices/subscriptions/{streaming_context_id}/{reference_id}"
+            try:
+                response = self.session.delete(url)
+                response.raise_for_status()
+            except Exception as e:
+                logger.error(f"Error removing price subscription {reference_id} from {streaming_context_id}: {e}")
+                return False
+        if self.snapshots is not None:
+            self.snapshots.discard(reference_id)
+        self._suspended.discard(reference_id)
+        self._refresh_rates.pop(reference_id, None)
+
         with Database() as db:
             db.execute(
                 "DELETE FROM subscriptions WHERE reference_id = %s",
                 (reference_id,)
             )
             logger.info(f"Subscription {reference_id} removed successfully.")
+        self._members_changed(reference_id)
         return True
 
     def remove_active_price_subscriptions(self, context_id: str) -> bool:
@@ -154,15 +455,17 @@ class SubscriptionHandler(HandlerBase):
         Returns:
             bool: True if all active subscriptions were successfully removed, False otherwise
         """
-        url = f"{self.base_url}/trade/v1/prices/subscriptions/active/{context_id}"
-        try:
-            response = self.session.delete(url)
-            response.raise_for_status()
-        except Exception as e:
-            logger.error(f"Error removing active price subscriptions for context {context_id}: {e}")
-            return False
-           
-        return True
+        removed = True
+        for streaming_context_id in self.all_streaming_context_ids(context_id):
+            url = f"{self.base_url}/trade/v1/prices/subscriptions/active/{streaming_context_id}"
+            try:
+                response = self.session.delete(url)
+                response.raise_for_status()
+            except Exception as e:
+                logger.error(f"Error removing active price subscriptions for context {streaming_context_id}: {e}")
+                removed = False
+
+        return removed
 
     def resubscribe_all_price_subscriptions(self, context_id: str) -> None:
         """
@@ -175,10 +478,139 @@ class SubscriptionHandler(HandlerBase):
         if not subscriptions:
             logger.info(f"No subscriptions found for context {context_id} to resubscribe.")
             return
-        for sub in subscriptions:
-            self._subscribe(int(sub["uic"]), AssetType(sub["asset_type"]), context_id, int(sub["timeframe"]), str(sub["algo_name"]))
+        # Every member algo has a row, the subscription itself is made once
+        shared = {str(sub["reference_id"]): sub for sub in reversed(subscriptions)}
+        for reference_id, sub in shared.items():
+            if reference_id in self._suspended:
+                continue
+            self._subscribe(
+                int(sub["uic"]), parse_asset_type(str(sub["asset_type"])), context_id,
+                self._refresh_rates.get(reference_id, int(sub["timeframe"])), str(sub["algo_name"]),
+                reference_id=reference_id
+            )
         logger.info(f"Resubscribed to all price subscriptions for context {context_id}.")
 
+    def resubscribe_price_subscriptions(
+        self, context_id: str, reference_ids: List[str], shard: Optional[int] = None, standby: Optional[bool] = None
+    ) -> List[str]:
+        """
+        Recreates the given price subscriptions, or all subscriptions of the context when none are given.
+
+        Args:
+            context_id (str): The context ID the subscriptions stream on
+            reference_ids (List[str]): The reference IDs of the subscriptions, empty for all
+            shard (Optional[int]): Limits "all" to the subscriptions streaming on this shard
+            standby (Optional[bool]): Limits the resubscribe to the standby (True) or primary (False) connection
+
+        Returns:
+            List[str]: The reference IDs that were recreated
+        """
+        if not reference_ids:
+            reference_ids = list(dict.fromkeys(str(sub["reference_id"]) for sub in self.get_price_subscriptions(context_id)))
+            if shard is not None:
+                reference_ids = [ref_id for ref_id in reference_ids if shard_for(ref_id, self.shards) == shard]
+        return [
+            reference_id for reference_id in reference_ids
+            if self.resubscribe_price_subscription(context_id, reference_id, standby)
+        ]
+
+    def resubscribe_price_subscription(
+        self, context_id: str, reference_id: str, standby: Optional[bool] = None, refresh_rate: Optional[int] = None
+    ) -> bool:
+        """
+        Recreates a single price subscription, e.g. after messages for it were lost, leaving all others untouched.
+        Saxo answers with a fresh snapshot, which replaces the one in the snapshot store. A suspended subscription
+        is not recreated, and a downgraded one keeps its refresh rate.
+
+        Args:
+            context_id (str): The context ID the subscription streams on
+            reference_id (str): The reference ID of the subscription
+            standby (Optional[bool]): Limits the resubscribe to the standby (True) or primary (False) connection
+            refresh_rate (Optional[int]): Streams at this refresh rate in milliseconds instead of the stored timeframe
+                from now on, e.g. to downgrade it
+
+        Returns:
+            bool: True if the subscription was recreated, False otherwise
+        """
+        if refresh_rate is None and reference_id in self._suspended:
+            logger.info(f"Not resubscribing {reference_id}: suspended.")
+            return False
+        with Database() as db:
+            items = db.execute(
+                f"SELECT {SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE reference_id = %s LIMIT 1",
+                (reference_id,)
+            )
+        if not items:
+            logger.warning(f"Cannot resubscribe {reference_id}: no such subscription.")
+            return False
+        sub = self._row_to_subscription(items[0])
+
+        for streaming_context_id in self.streaming_context_ids(context_id, reference_id, standby):
+            url = f"{self.base_url}/trade/v1/infoprices/subscriptions/{streaming_context_id}/{reference_id}"
+            try:
+                self.session.delete(url).raise_for_status()
+            except Exception as e:
+                logger.warning(f"Error removing price subscription {reference_id} before resubscribing: {e}")
+
+        timeframe = refresh_rate or self._refresh_rates.get(reference_id, int(sub["timeframe"]))
+        ref_id = self._subscribe(
+            int(sub["uic"]), parse_asset_type(str(sub["asset_type"])), context_id, timeframe, str(sub["algo_name"]), standby,
+            reference_id=reference_id
+        )
+        if ref_id is None:
+            return False
+        if refresh_rate is not None:
+            self._suspended.discard(reference_id)
+            self._refresh_rates[reference_id] = refresh_rate
+        logger.info(f"Resubscribed to price subscription {reference_id} in context {context_id}.")
+        return True
+
+    def suspend_price_subscription(self, context_id: str, reference_id: str) -> bool:
+        """
+        Stops streaming a price subscription but keeps it stored, so it can be resumed with ``resubscribe_price_subscription``.
+
+        Args:
+            context_id (str): The context ID the subscription streams on
+            reference_id (str): The reference ID of the subscription
+
+        Returns:
+            bool: True if Saxo stopped streaming the subscription, False otherwise
+        """
+        suspended = True
+        for streaming_context_id in self.streaming_context_ids(context_id, reference_id):
+            url = f"{self.base_url}/trade/v1/infoprices/subscriptions/{streaming_context_id}/{reference_id}"
+            try:
+                self.session.delete(url).raise_for_status()
+            except Exception as e:
+                logger.error(f"Error suspending price subscription {reference_id} in {streaming_context_id}: {e}")
+                suspended = False
+        if suspended:
+            self._suspended.add(reference_id)
+            logger.info(f"Suspended price subscription {reference_id} in context {context_id}.")
+        return suspended
+
+    def resume_price_subscription(self, context_id: str, reference_id: str) -> bool:
+        """
+        Streams a suspended or downgraded price subscription at its stored timeframe again.
+
+        Args:
+            context_id (str): The context ID the subscription streams on
+            reference_id (str): The reference ID of the subscription
+
+        Returns:
+            bool: True if the subscription was recreated, False otherwise, leaving it suspended or downgraded
+        """
+        suspended = reference_id in self._suspended
+        refresh_rate = self._refresh_rates.pop(reference_id, None)
+        self._suspended.discard(reference_id)
+        if self.resubscribe_price_subscription(context_id, reference_id):
+            return True
+        if suspended:
+            self._suspended.add(reference_id)
+        if refresh_rate is not None:
+            self._refresh_rates[reference_id] = refresh_rate
+        return False
+
 
     def remove_all_price_subscriptions(self, context_id: str, tag: Optional[str] = None) -> bool:
         """
@@ -186,29 +618,34 @@ class SubscriptionHandler(HandlerBase):
 
         Args:
             context_id (str): The context ID for which to remove subscriptions
+            tag (Optional[str]): Only removes the subscriptions of this algo, keeping those shared with other algos
 
         Returns:
             bool: True if all subscriptions were successfully removed, False otherwise
         """
-        url = f"{self.base_url}/trade/v1/prices/subscriptions/{context_id}"
         if tag:
-            url += f"?Tag={tag}"
-        try:
-            response = self.session.delete(url)
-            response.raise_for_status()
-        except Exception as e:
-            logger.error(f"Error removing all price subscriptions for context {context_id}: {e}")
-            return False
+            # Saxo only knows the tag of the algo that created a shared subscription, so leave them one by one
+            with Database() as db:
+                items = db.execute(
+                    "SELECT DISTINCT reference_id FROM subscriptions WHERE context_id = %s AND algo_name = %s",
+                    (context_id, tag)
+                )
+            results = [self._leave(context_id, item[0], tag) for item in items or []]
+            return all(results)
+
+        for streaming_context_id in self.all_streaming_context_ids(context_id):
+            url = f"{self.base_url}/trade/v1/infoprices/subscriptions/{streaming_context_id}"
+            try:
+                response = self.session.delete(url)
+                response.raise_for_status()
+            except Exception as e:
+                logger.error(f"Error removing all price subscriptions for context {streaming_context_id}: {e}")
+                return False
             
         with Database() as db:
-            query = "DELETE FROM subscriptions WHERE context_id = %s"
-            params = (context_id,)
-            if tag:
-                query += " AND algo_name = %s"
-                params = (context_id, tag)
             db.execute(
-                query,
-                params
+                "DELETE FROM subscriptions WHERE context_id = %s",
+                (context_id,)
             )
             logger.info(f"All subscriptions for context {context_id} removed successfully.")
         return True
@@ -8,6 +8,7 @@ from data_models.order.order_duration import OrderDuration
 from data_models.price.price_info import PriceInfo
 from handlers.user_handler import UserHandler
 from handlers.price_handler import PriceHandler
+from handlers.instrument_handler import InstrumentHandler
 from typing import List
 from datetime import datetime
 import logging
@@ -19,10 +20,18 @@ logger = logging.getLogger(__name__)
 
 
 class TradeHandler(HandlerBase):
-    def __init__(self, user_handler: UserHandler, price_handler: PriceHandler, session: Session, base_url: str) -> None:
+    def __init__(
+        self,
+        user_handler: UserHandler,
+        price_handler: PriceHandler,
+        session: Session,
+        base_url: str,
+        instruments: Optional[InstrumentHandler] = None,
+    ) -> None:
         super().__init__(session, base_url)
         self.user_handler = user_handler
         self.price_handler = price_handler
+        self.instruments = instruments or InstrumentHandler(session, base_url)
 
     def _place_order(self, order_payload: dict) -> dict:
         """
@@ -36,6 +45,7 @@ class TradeHandler(HandlerBase):
         """
         url = f"{self.base_url}/trade/v2/orders"
         response = self.session.post(url, json=order_payload)
+        self._forget_portfolio_gets()
         logger.debug(f"Placing order with payload: {order_payload}")
         logger.debug(f"Response status code: {response.status_code}")
         if not response.ok:
@@ -240,23 +250,14 @@ class TradeHandler(HandlerBase):
 
         Returns:
             int: The UIC of the asset.
+
+        Raises:
+            ValueError: If the symbol is unknown or ambiguous.
         """
-        url = f"{self.base_url}/ref/v1/instruments?KeyWords={symbol}&AssetType={asset_type.value}"
-        response = self.session.get(url)
-        response.raise_for_status()
-        data = response.json()
-        if not data.get("Data"):
-            raise ValueError(f"No data found for symbol {symbol} and asset type {asset_type}.")
-        if len(data["Data"]) > 1:
-            itm = [itm for itm in data["Data"] if itm["Symbol"] == symbol]
-            if len(itm) == 1:
-                return itm[0]["Identifier"]
-            else:
-                logger.warning(f"Multiple UICs found for symbol {symbol} and asset type {asset_type}.")
-                for itm in data["Data"]:
-                    logger.warning(f"UIC: {itm['Uic']}, Symbol: {itm['Symbol']}")
-                raise ValueError(f"Multiple UICs found for symbol {symbol} and asset type {asset_type}.")
-        return data["Data"][0]["Identifier"]
+        uic = self.instruments.get_uic(symbol, asset_type)
+        if uic is None:
+            raise ValueError(f"No unique UIC found for symbol {symbol} and asset type {asset_type}.")
+        return uic
 
     def buy_market_sl_tp(
         self,
@@ -311,6 +312,7 @@ class TradeHandler(HandlerBase):
         data["AccountKey"] = self.user_handler.default_account_key
 
         response = self.session.post(url, json=data)
+        self._forget_portfolio_gets()
         if not response.ok:
             raise Exception(f"Failed to place order: {response.status_code} {response.json()}")
         return response.json()
@@ -356,6 +358,7 @@ class TradeHandler(HandlerBase):
         data["AccountKey"] = self.user_handler.default_account_key
 
         response = self.session.post(url, json=data)
+        self._forget_portfolio_gets()
         if not response.ok:
             raise Exception(f"Failed to place order: {response.status_code} {response.json()}")
         return response.json()
@@ -368,7 +371,7 @@ class TradeHandler(HandlerBase):
             dict: The orders.
         """
         url = f"{self.base_url}/port/v1/orders/me?fieldGroups=DisplayAndFormat"
-        response = self.session.get(url)
+        response = self._get(url)
         response.raise_for_status()
         return [OrderInformation(order) for order in response.json().get("Data", [])]
 
@@ -393,6 +396,7 @@ class TradeHandler(HandlerBase):
             f"{self.base_url}/trade/v2/orders/{','.join(order_ids)}?AccountKey={self.user_handler.default_account_key}"
         )
         response = self.session.delete(url)
+        self._forget_portfolio_gets()
         if not response.ok:
             raise Exception(f"Failed to cancel order: {response.status_code} {response.json()}")
         return response.json()
@@ -427,6 +431,7 @@ class TradeHandler(HandlerBase):
         """
         url = f"{self.base_url}/trade/v2/orders?AccountKey={self.user_handler.default_account_key}&Uic={uic}&AssetType={asset_type.value}"
         response = self.session.delete(url)
+        self._forget_portfolio_gets()
         if not response.ok:
             raise Exception(f"Failed to cancel all orders: {response.status_code} {response.json()}")
         return response.json()
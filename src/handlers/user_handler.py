@@ -10,14 +10,14 @@ class UserHandler(HandlerBase):
         self.client_info: dict = {}
 
     def get_user(self) -> UserModel:
-        response = self.session.get(f"{self.base_url}/root/v2/user")
+        response = self._get(f"{self.base_url}/root/v2/user")
         response.raise_for_status()
         return UserModel.from_json(response.json())
 
     def _get_client_info(self) -> None:
         if self.client_info:
             return
-        response = self.session.get(f"{self.base_url}/port/v1/clients/me")
+        response = self._get(f"{self.base_url}/port/v1/clients/me")
         response.raise_for_status()
         self.client_info = response.json()
 
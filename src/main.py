@@ -89,7 +89,7 @@ def create_app(args):
     container.config.redis_host.from_env("REDIS_HOST", args.redis_host)
     container.config.redis_port.from_env("REDIS_PORT", args.redis_port)
     container.config.redis_db.from_env("REDIS_DB", args.redis_db)
-    container.wire(modules=["routes.trade", "routes.account", "routes.price", "routes.subscription", __name__])
+    container.wire(modules=["routes.trade", "routes.account", "routes.price", "routes.instruments", "routes.subscription", "routes.stream", __name__])
     logger.debug("Wired container with routes")
     logger.debug(f"Container: {container}")
     app = Flask(__name__)
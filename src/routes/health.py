@@ -3,6 +3,7 @@ from dependency_injector.wiring import inject, Provide
 from container import Container
 from saxo_client import SaxoClient
 from utils.database import Database
+from utils.single_flight import single_flight
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,3 +53,24 @@ def ready_check():
 
     if request.method == "GET":
         return handle_GET()
+
+
+def stats():
+    """
+    Request statistics endpoint, e.g. how many Saxo GETs were collapsed into a concurrent identical one, and how
+    many portfolio GETs in flight were forgotten after an order so later callers did not share their answer.
+    """
+
+    def handle_GET():
+        """
+        Handle GET request for request statistics.
+        """
+        return {
+            "status": "ok",
+            "message": "Request statistics retrieved successfully.",
+            "status_code": 200,
+            "coalesced_gets": single_flight.stats(),
+        }
+
+    if request.method == "GET":
+        return handle_GET()
@@ -0,0 +1,70 @@
+from flask import request, abort
+from dependency_injector.wiring import inject, Provide
+from container import Container
+from saxo_client import SaxoClient
+from objects import ApiResponse
+import logging
+import humps
+from data_models.trading.asset_type import AssetType
+
+logger = logging.getLogger(__name__)
+
+# Upper bound of the ?limit= query argument
+MAX_SEARCH_RESULTS = 100
+
+
+@inject
+def search_instruments(saxo_client: SaxoClient = Provide[Container.saxo_client]):
+    """
+    Search the preloaded instrument universe by symbol or description.
+
+    Query args:
+        q (str): The text to search for
+        asset_type (str, optional): Only returns instruments of this type
+        limit (int, optional): The maximum number of instruments returned. Defaults to 20.
+
+    Returns:
+        dict: A dictionary containing the matching instruments, best match first.
+    """
+
+    def handle_GET():
+        """
+        Handle GET request for searching instruments.
+        """
+        query = request.args.get("q", "").strip()
+        if not query:
+            abort(400, "Search text 'q' is required.")
+        _asset_type = None
+        if request.args.get("asset_type"):
+            try:
+                _asset_type = AssetType(request.args["asset_type"])
+            except ValueError:
+                abort(400, f"Invalid asset type: {request.args['asset_type']}")
+        try:
+            limit = min(max(int(request.args.get("limit", 20)), 1), MAX_SEARCH_RESULTS)
+        except ValueError:
+            abort(400, "Limit must be a number.")
+
+        index = saxo_client.instrument_handler.index if saxo_client.instrument_handler else None
+        if index is None:
+            return ApiResponse(
+                status_code=503,
+                message="Instrument index is not loaded. Enable INSTRUMENT_PRELOAD."
+            ), 503
+
+        instruments = index.search(query, _asset_type, limit)
+        return ApiResponse(
+            status_code=200,
+            message=f"Found {len(instruments)} instruments matching '{query}'.",
+            instruments=[humps.decamelize(instrument) for instrument in instruments]
+        )
+
+    logger.debug("Received request method: %s", request.method)
+    if request.method == "GET":
+        return handle_GET()
+    elif request.method == "OPTIONS":
+        return ApiResponse(
+            status_code=200,
+            message="CORS preflight response",
+            allowed_methods="GET, OPTIONS"
+        )
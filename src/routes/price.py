@@ -3,6 +3,7 @@ from dependency_injector.wiring import inject, Provide
 from container import Container
 from saxo_client import SaxoClient
 from objects import ApiResponse
+from collections import defaultdict
 import logging
 import humps
 from data_models.trading.asset_type import AssetType
@@ -34,7 +35,7 @@ def get_single_price(asset: str, asset_type: str, saxo_client: SaxoClient = Prov
         except ValueError:
             abort(400, f"Invalid asset type: {asset_type}")
 
-        price = saxo_client.price_handler.get_price(asset, _asset_type)
+        price, source = saxo_client.price_handler.get_price_with_source(asset, _asset_type)
         if price is None:
             abort(404, f"Price for asset '{asset}' not found.")
 
@@ -42,7 +43,7 @@ def get_single_price(asset: str, asset_type: str, saxo_client: SaxoClient = Prov
             status_code=200,
             message=f"Price for asset {asset_type} '{asset}' retrieved successfully.",
             price=price.to_json()
-        )
+        ), 200, {"X-Price-Source": source}
 
     logger.debug("Received request method: %s", request.method)
     if request.method == "GET":
@@ -154,3 +155,76 @@ def get_price_details(asset: str, asset_type: str, saxo_client: SaxoClient = Pro
             allowed_methods="GET, OPTIONS"
         )
 
+
+# Upper bound of the number of assets of one batch request
+MAX_BATCH_ASSETS = 500
+
+
+@inject
+def get_batch_prices(saxo_client: SaxoClient = Provide[Container.saxo_client]):
+    """
+    Get the prices of many assets in one request.
+
+    GET takes ``?assets=EURUSD,GBPUSD&asset_type=FxSpot`` for assets of one type; POST takes
+    ``{"assets": [{"asset": "AAPL:xnas", "asset_type": "Stock"}, ...]}`` for mixed types.
+
+    Returns:
+        dict: A dictionary containing the price details keyed by asset, None for assets without a price.
+            An asset can only be requested with one asset type at a time.
+    """
+
+    def parse_assets():
+        if request.method == "GET":
+            asset_type = request.args.get("asset_type", "")
+            items = [
+                {"asset": asset.strip(), "asset_type": asset_type}
+                for asset in request.args.get("assets", "").split(",") if asset.strip()
+            ]
+        else:
+            body = request.get_json(silent=True) or {}
+            items = body.get("assets", [])
+        if not isinstance(items, list) or not items:
+            abort(400, "At least one asset is required.")
+        if len(items) > MAX_BATCH_ASSETS:
+            abort(400, f"At most {MAX_BATCH_ASSETS} assets can be requested at once.")
+        assets = []
+        for item in items:
+            if not isinstance(item, dict) or not item.get("asset"):
+                abort(400, "Every asset needs an 'asset' and an 'asset_type'.")
+            try:
+                assets.append((str(item["asset"]), AssetType(item.get("asset_type", ""))))
+            except ValueError:
+                abort(400, f"Invalid asset type: {item.get('asset_type')}")
+        # The response is keyed by asset alone
+        types = defaultdict(set)
+        for asset, asset_type in assets:
+            types[asset].add(asset_type)
+        duplicates = sorted(asset for asset, asset_types in types.items() if len(asset_types) > 1)
+        if duplicates:
+            abort(400, f"Assets requested with more than one asset type: {', '.join(duplicates)}")
+        return assets
+
+    def handle_batch():
+        """
+        Handle GET and POST requests for retrieving the prices of many assets.
+        """
+        if not saxo_client.price_handler:
+            abort(403, "Price handler is not available.")
+
+        prices = saxo_client.price_handler.get_prices(parse_assets())
+        found = sum(1 for price in prices.values() if price is not None)
+        return ApiResponse(
+            status_code=200,
+            message=f"Prices for {found} of {len(prices)} assets retrieved successfully.",
+            prices={asset: price.to_json() if price is not None else None for (asset, _), price in prices.items()}
+        )
+
+    logger.debug("Received request method: %s", request.method)
+    if request.method in ("GET", "POST"):
+        return handle_batch()
+    elif request.method == "OPTIONS":
+        return ApiResponse(
+            status_code=200,
+            message="CORS preflight response",
+            allowed_methods="GET, POST, OPTIONS"
+        )
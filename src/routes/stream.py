@@ -0,0 +1,108 @@
+from flask import request
+from dependency_injector.wiring import inject, Provide
+from container import Container
+from saxo_client import SaxoClient
+from typing import Optional
+from simple_websocket import ConnectionClosed
+from streaming.clients import clients
+from streaming.snapshots import snapshots
+from streaming.replay import replay
+from data_models.trading.asset_type import AssetType
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Websocket close code for a request the server will not serve
+POLICY_VIOLATION = 1008
+
+
+def _hold_open(ws) -> None:
+    """Blocks until the downstream websocket is closed. Inbound data is ignored."""
+    while ws.connected:
+        try:
+            _ = ws.receive(timeout=60)
+        except ConnectionClosed:
+            break
+
+
+def _conflation_args() -> dict:
+    """
+    Reads the conflation options of a downstream websocket from the query string.
+
+    ``?conflate=true`` sends only the newest merged state per ref id as JSON text instead of every binary delta,
+    and ``&max_rate=<n>`` caps it at n messages per second.
+    """
+    conflate = request.args.get("conflate", "").lower() in ("1", "true", "yes")
+    try:
+        max_rate = float(request.args.get("max_rate", 0)) or None
+    except ValueError:
+        max_rate = None
+    if max_rate is not None and max_rate < 0:
+        max_rate = None
+    return {"conflate": conflate, "max_rate": max_rate}
+
+
+def _since_arg() -> Optional[int]:
+    """Reads ``?since=<msgId>``, the id of the last message a reconnecting client received."""
+    try:
+        return int(request.args["since"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _stream_ref(ws, ref_id: str) -> None:
+    since = _since_arg()
+    backlog = replay.since(ref_id, since) if since is not None else None
+    # Replay the gap when the buffer still covers it, otherwise start over from the merged snapshot
+    snapshot = snapshots.get(ref_id) if backlog is None else None
+    clients.add_ref(ref_id, ws, snapshot=snapshot, backlog=backlog, **_conflation_args())
+    try:
+        _hold_open(ws)
+    finally:
+        clients.remove_ref(ref_id, ws)
+
+
+def ws_all(ws):
+    since = _since_arg()
+    backlog = replay.since_all(since) if since is not None else None
+    clients.add_all(ws, backlog=backlog, **_conflation_args())
+    try:
+        _hold_open(ws)
+    finally:
+        clients.remove_all(ws)
+
+
+def ws_ref(ws, ref_id):
+    _stream_ref(ws, ref_id)
+
+
+@inject
+def ws_symbol(ws, asset: str, asset_type: str, saxo_client: SaxoClient = Provide[Container.saxo_client]):
+    """
+    Streams an asset by symbol, subscribing to it for as long as any client listens.
+    Clients of the same asset share one upstream subscription.
+
+    Args:
+        asset (str): The asset identifier (symbol or UIC)
+        asset_type (str): The asset type, e.g. ``FxSpot``
+    """
+    try:
+        _asset_type = AssetType(asset_type)
+    except ValueError:
+        ws.close(POLICY_VIOLATION, f"Invalid asset type: {asset_type}")
+        return
+    try:
+        timeframe = int(request.args.get("timeframe", 1000))
+    except ValueError:
+        timeframe = 1000
+
+    context_id = str(saxo_client.context_id)
+    ref_id = saxo_client.subscription_handler.acquire_price_subscription(asset, _asset_type, context_id, timeframe)
+    if ref_id is None:
+        ws.close(POLICY_VIOLATION, f"Cannot stream {asset_type} '{asset}'")
+        return
+    logger.debug(f"Streaming {asset_type} '{asset}' as {ref_id}")
+    try:
+        _stream_ref(ws, ref_id)
+    finally:
+        saxo_client.subscription_handler.release_price_subscription(context_id, ref_id)
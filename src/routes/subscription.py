@@ -103,7 +103,8 @@ def price_subscription(asset: str = "", asset_type: str = "", reference_id: str
 
         result = saxo_client.subscription_handler.remove_price_subscription(
             context_id=context_id,
-            reference_id=reference_id
+            reference_id=reference_id,
+            algo_name=request.args.get("algo_name")  # Leaves a shared subscription to the other algos
         )
         if result is None:
             abort(500, f"Failed to remove price subscription for asset '{asset}'.")
@@ -1,18 +1,29 @@
 import requests
 import logging
-from typing import Optional
+from typing import Any, List, Optional
 import os
 from handlers.user_handler import UserHandler
 from handlers.account_handler import AccountHandler
 from handlers.trade_handler import TradeHandler
 from handlers.price_handler import PriceHandler
+from handlers.instrument_handler import InstrumentHandler
 from handlers.subscription_handler import SubscriptionHandler
 from data_models.response_models import UserModel
 from redis import Redis
 from redis.client import PubSub
 import threading
-from streaming.upstream import Upstream
+import eventlet
+from streaming.upstream import FrameDispatcher, Upstream
+from streaming.control import ControlMessages
+from streaming.quote_log import QuoteLog
+from streaming.shards import shard_context_id, shard_count, standby_context_id
+from streaming.failover import StandbyPair
+from streaming.reaper import SubscriptionReaper
+from streaming.replicas import ReplicaRegistry
+from streaming.fanout import LeaderElection, RedisFeed, RedisPublisher, binary_connection
 from streaming.clients import clients
+from streaming.snapshots import snapshots
+from streaming.replay import replay
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +35,8 @@ class SaxoClient:
 
     user_handler: Optional[UserHandler] = None
     price_handler: Optional[PriceHandler] = None
+    instrument_handler: Optional[InstrumentHandler] = None
+    subscription_handler: Optional[SubscriptionHandler] = None
     redis_channel: str = "oauth_access_token"
     access_token: Optional[str] = None
     context_id: Optional[str] = None
@@ -42,17 +55,155 @@ class SaxoClient:
         self.redis_thread.start()
         self.set_token(str(redis.get(self.redis_channel)))
         self.context_id = os.getenv("CONTEXT_ID", "default_context") # Default context ID for local development. TF_DEV for development, TF_PROD for production
+        self.shards = shard_count()
+        self.standby = os.getenv("STREAM_STANDBY", "").lower() in ("1", "true", "yes")
+        self.upstreams: List[Upstream] = []
+        self.standby_pairs: List[StandbyPair] = []
         self.set_up_handlers()
-        self.subscription_handler.remove_active_price_subscriptions(self.context_id)
-        upstream = Upstream(
-            url=os.getenv("STREAM_URL", "wss://streaming.saxobank.com/sim/openapi/streamingws/connect"),
-            token=str(self.access_token),
-            context_id=self.context_id,
-            clients=clients,
+        # Rows of older reference IDs join the current ones before anything subscribes
+        self.subscription_handler.migrate_reference_ids(str(self.context_id))
+        # This replica's websocket clients from before a restart are gone, and so is their demand
+        self.subscription_handler.remove_all_price_subscriptions(str(self.context_id), self.subscription_handler.auto_tag)
+        # So is the demand of replicas that were replaced since
+        self.replicas = ReplicaRegistry(self.redis, self.subscription_handler, str(self.context_id))
+        self.replicas.start()
+        if os.getenv("INSTRUMENT_PRELOAD", "").lower() in ("1", "true", "yes"):
+            self.instrument_handler.start(lambda: self.user_handler.legal_assets)
+        self.stream_url = os.getenv("STREAM_URL", "wss://streaming.saxobank.com/sim/openapi/streamingws/connect")
+        self.reaper: Optional[SubscriptionReaper] = None
+        if os.getenv("STREAM_FANOUT", "").lower() == "redis":
+            self._start_fanout()
+        else:
+            self._start_upstream(clients, snapshots, replay)
+            if os.getenv("SUBSCRIPTION_REAPER", "").lower() in ("1", "true", "yes"):
+                self.reaper = SubscriptionReaper(
+                    clients, self.subscription_handler, str(self.context_id), quote_log=bool(os.getenv("QUOTE_LOG"))
+                )
+                self.reaper.start()
+
+    def _start_upstream(self: "SaxoClient", sink, snapshots=None, replay=None) -> List[Upstream]:
+        """Takes over the price subscriptions of the context and opens one upstream streaming session per shard,
+        plus a hot standby for each when enabled.
+
+        Args:
+            sink: Receives the upstream frames, the local Clients or a RedisPublisher
+            snapshots (SnapshotStore, optional): Store the streamed messages are merged into
+            replay (ReplayBuffer, optional): Buffer the streamed messages are recorded in
+
+        Returns:
+            List[Upstream]: The upstream connections opened
+        """
+        self.subscription_handler.remove_active_price_subscriptions(str(self.context_id))
+        sinks = []
+        quote_log = os.getenv("QUOTE_LOG", "").lower()
+        if quote_log:
+            log = QuoteLog(self.redis, quote_log, self.subscription_handler.get_subscription_tags)
+            self.subscription_handler.on_members_changed = log.forget
+            sinks.append(log)
+        started: List[Upstream] = []
+        for shard in range(self.shards):
+            primary_context_id = shard_context_id(str(self.context_id), shard, self.shards)
+            mirrors = [(primary_context_id, False)]
+            if self.standby:
+                mirrors.append((standby_context_id(primary_context_id), True))
+            shard_upstreams = []
+            for streaming_context_id, standby in mirrors:
+                shard_upstreams.append(Upstream(
+                    url=self.stream_url,
+                    token=str(self.access_token),
+                    context_id=streaming_context_id,
+                    clients=sink,
+                    snapshots=snapshots,
+                    replay=replay,
+                    resubscribe=lambda ref_ids, shard=shard, standby=standby: self.subscription_handler.resubscribe_price_subscriptions(
+                        str(self.context_id), ref_ids, shard, standby
+                    ),
+                    sinks=sinks,
+                ))
+            if self.standby:
+                self.standby_pairs.append(StandbyPair(*shard_upstreams))
+            for upstream in shard_upstreams:
+                upstream.start()
+            self.upstreams.extend(shard_upstreams)
+            started.extend(shard_upstreams)
+        self.subscription_handler.resubscribe_all_price_subscriptions(str(self.context_id))
+        return started
+
+    def _stop_upstream(self: "SaxoClient", upstreams: Optional[List[Upstream]] = None) -> None:
+        """Closes the given upstream connections, or all of them."""
+        stopping = self.upstreams if upstreams is None else upstreams
+        for upstream in stopping:
+            upstream.stop()
+        self.upstreams = [upstream for upstream in self.upstreams if upstream not in stopping]
+        self.standby_pairs = [
+            pair for pair in self.standby_pairs if not any(upstream in stopping for upstream in pair.upstreams)
+        ]
+
+    def _lead(self: "SaxoClient", sink) -> None:
+        """Streams from Saxo into the fan-out channel, unless leadership was lost while the connections were opened.
+        The snapshots Saxo answers the subscribes with are published as well, so every replica starts from them."""
+        term = self.term
+        self.subscription_handler.on_snapshot = sink.publish_snapshot
+        started = self._start_upstream(sink)
+        if term != self.term or not self.election.is_leader:
+            logger.warning("Lost upstream leadership while taking over, closing the new upstream connections")
+            self._stop_upstream(started)
+            if self.subscription_handler.on_snapshot == sink.publish_snapshot:
+                self.subscription_handler.on_snapshot = None
+
+    def _demote(self: "SaxoClient") -> None:
+        self.term += 1
+        self.subscription_handler.on_snapshot = None
+        self._stop_upstream()
+
+    def _start_fanout(self: "SaxoClient") -> None:
+        """Serves the downstream clients from the Redis feed, and streams from Saxo only while elected leader."""
+        binary_redis = binary_connection(self.redis)
+        self.publisher = RedisPublisher(binary_redis)
+        # The leader handles resets and disconnects of its connections, the feed carries heartbeats and snapshots
+        control = ControlMessages(
+            on_heartbeat=self._on_feed_heartbeat,
+            on_snapshot=self._on_feed_snapshot,
+            on_snapshot_request=self._on_snapshot_request,
         )
-        upstream.start()
-        self.subscription_handler.resubscribe_all_price_subscriptions(self.context_id)
+        self.feed = RedisFeed(binary_redis, FrameDispatcher(clients, snapshots, replay, on_control=control.handle))
+        # Counts demotions, so a takeover that outlived its leadership is undone
+        self.term = 0
+        self.election = LeaderElection(
+            self.redis,
+            # Taking over the subscriptions takes a while; the lock has to keep being renewed meanwhile
+            on_elected=lambda: eventlet.spawn_n(self._lead, self.publisher),
+            on_demoted=self._demote,
+        )
+        self.feed.start()
+        self.election.start()
+
+    @staticmethod
+    def _on_feed_heartbeat(ref_id: str, reason: str) -> None:
+        # A subscription without new data is still current
+        if reason == "NoNewData":
+            snapshots.touch(ref_id)
 
+    @staticmethod
+    def _on_feed_snapshot(ref_id: str, snapshot: Any, msg_id: int) -> None:
+        """Replaces the document merged from the fan-out deltas with the full one the leader published, and resyncs
+        the clients of the ref id if it differed."""
+        current = snapshots.get(ref_id)
+        if current is not None and current["msg"] == snapshot:
+            return
+        snapshots.seed(ref_id, snapshot, msg_id)
+        clients.push_ref(ref_id, Upstream.encode_ws_msg(ref_id, snapshot, msg_id), [snapshots.get(ref_id)])
+
+    def _on_snapshot_request(self: "SaxoClient") -> None:
+        if self.election.is_leader:
+            eventlet.spawn_n(self._publish_snapshots)
+
+    def _publish_snapshots(self: "SaxoClient") -> None:
+        """Publishes the full document of every ref id, for followers that missed the snapshots of the subscribes."""
+        for ref_id in snapshots.ref_ids():
+            doc = snapshots.get(ref_id)
+            if doc is not None:
+                self.publisher.publish_snapshot(ref_id, doc["msg"], doc["msgId"])
 
     def set_up_handlers(self: "SaxoClient") -> None:
         """This method sets up the user, account, trade, and price handlers.
@@ -63,9 +214,23 @@ class SaxoClient:
         """
         self.user_handler = UserHandler(self.session, self.base_url)
         self.account_handler = AccountHandler(self.session, self.base_url, self.user_handler)
-        self.price_handler = PriceHandler(self.user_handler, self.session, self.base_url, str(self.context_id))
-        self.trade_handler = TradeHandler(self.user_handler, self.price_handler, self.session, self.base_url)
-        self.subscription_handler = SubscriptionHandler(self.price_handler, self.user_handler, self.base_url, self.session)
+        # Kept across calls, it holds the preloaded instrument index
+        if self.instrument_handler is None:
+            self.instrument_handler = InstrumentHandler(self.session, self.base_url, self.redis)
+        self.price_handler = PriceHandler(
+            self.user_handler, self.session, self.base_url, str(self.context_id), snapshots, instruments=self.instrument_handler
+        )
+        self.trade_handler = TradeHandler(
+            self.user_handler, self.price_handler, self.session, self.base_url, instruments=self.instrument_handler
+        )
+        # Kept across calls as well, the upstreams and the reaper hold on to it and its hooks
+        if self.subscription_handler is None:
+            self.subscription_handler = SubscriptionHandler(
+                self.price_handler, self.user_handler, self.base_url, self.session, snapshots, self.shards, self.standby
+            )
+        else:
+            self.subscription_handler.price_handler = self.price_handler
+            self.subscription_handler.user_handler = self.user_handler
 
     def set_token(self: "SaxoClient", token: str) -> None:
         """This method sets the access token for the session.
@@ -93,6 +258,8 @@ class SaxoClient:
                 self.access_token = str(message["data"])
                 logger.debug(f"Received access token: {self.access_token[:10]}...{self.access_token[-10:]}")
                 self.session.headers.update({"Authorization": f"Bearer {self.access_token}"})
+                for upstream in getattr(self, "upstreams", []):
+                    upstream.reauthorize(self.access_token)
 
     @property
     def can_trade(self: "SaxoClient") -> bool:
@@ -1,109 +1,237 @@
 import asyncio
+import functools
+import os
 import threading
-import struct
-import json
 import uuid
 import logging
 import requests
-import websockets
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from streaming.upstream import Upstream
+
+logger = logging.getLogger(__name__)
+
+
+def _rows_by_uic(payload: Any) -> Iterator[Tuple[int, Any]]:
+    """Yields the instrument rows of a list subscription message with their UIC."""
+    items = payload.get("Data") if isinstance(payload, dict) and "Data" in payload else payload
+    if isinstance(items, dict):
+        items = [items]
+    if isinstance(items, list):
+        for item in items:
+            if isinstance(item, dict) and "Uic" in item:
+                yield item["Uic"], item
 
 
 class SocketDistributor:
-    def __init__(self, session, subscription_url, socket_url):
+    """Callback subscribers per UIC on top of the shared streaming engine.
+
+    Frames are received and decoded once by an ``Upstream``; the distributor plugs into it in place of
+    ``Clients`` and hands every message of a subscribed UIC to its callbacks. Coroutine callbacks run on
+    the distributor's own event loop. Passing ``clients`` forwards the same frames to the websocket fan-out,
+    so callbacks and downstream websockets share one connection and one decoder.
+
+    New UICs are not subscribed one by one: those of the same asset type requested within ``batch_window``
+    seconds are subscribed with a single multi-UIC call, made in an executor so the event loop never waits
+    on HTTP.
+
+    Subscriptions are reference counted by their callbacks. When the last callback of a UIC leaves, the UIC
+    lingers for ``linger`` seconds so a restarting algo picks it up again without churn; after that its Saxo
+    subscription is deleted, or, for a batch, once every UIC of the batch has been released. Adding and
+    removing callbacks is safe from any thread: the subscriber maps are only changed on the event loop.
+    """
+    def __init__(
+        self,
+        session,
+        subscription_url,
+        socket_url,
+        clients=None,
+        upstream: Optional[Upstream] = None,
+        context_id: Optional[str] = None,
+        batch_window: Optional[float] = None,
+        max_batch: int = 200,
+        linger: Optional[float] = None,
+    ):
+        """
+        Args:
+            session (Session): Authorized requests session used for the subscription calls
+            subscription_url (str): The price subscriptions endpoint
+            socket_url (str): The streaming connect URL
+            clients (Clients, optional): Websocket fan-out that receives the frames as well
+            upstream (Optional[Upstream]): An upstream to attach to instead of opening a new connection;
+                it has to be created with this distributor as its clients
+            context_id (Optional[str]): The streaming context id. Defaults to the one of ``upstream`` or a new one.
+            batch_window (Optional[float]): Seconds to collect UICs for one subscription call.
+                Defaults to env ``SUBSCRIPTION_BATCH_WINDOW``.
+            max_batch (int): Maximum number of UICs per subscription call
+            linger (Optional[float]): Seconds a UIC without callbacks stays subscribed. Defaults to env ``SUBSCRIPTION_LINGER``.
+        """
         self.session = session
         self.subscription_url = subscription_url
         self.socket_url = socket_url
-        self.context_id = str(uuid.uuid4())
-        self.subscriptions = {}
-        self.socket = None
-        self.ref_to_uic = {}
+        self.clients = clients
+        self.context_id = context_id or (upstream.context_id if upstream else str(uuid.uuid4()))
+        self.batch_window = batch_window if batch_window is not None else float(os.getenv("SUBSCRIPTION_BATCH_WINDOW", "0.05"))
+        self.max_batch = max_batch
+        self.linger = linger if linger is not None else float(os.getenv("SUBSCRIPTION_LINGER", "30"))
+        self.subscriptions: Dict[int, Dict[str, Any]] = {}
+        # A batch subscription streams the rows of all its UICs under one ref id
+        self.ref_to_uics: Dict[str, List[int]] = {}
+        self._pending: Dict[str, List[int]] = {}
+        self._batches = 0
         self.loop = asyncio.new_event_loop()
         threading.Thread(target=self._run_event_loop, daemon=True).start()
+        self.upstream = upstream
+        if self.upstream is None:
+            token = str(self.session.headers.get("Authorization", "")).split(" ", 1)[-1]
+            self.upstream = Upstream(self.socket_url, token, self.context_id, clients=self)
+            self.upstream.start()
 
     def add_subscriber(self, uic, asset_type, callback):
-        if uic not in self.subscriptions:
-            ref_id = f"uic_{uic}"
-            self.subscriptions[uic] = {"ref_id": ref_id, "last_message": None, "subscribers": set()}
-            self.ref_to_uic[ref_id] = uic
-            self.loop.call_soon_threadsafe(asyncio.create_task, self._subscribe(uic, ref_id, asset_type))
-        self.subscriptions[uic]["subscribers"].add(callback)
+        # The subscriber maps are only touched on the loop, where lingers, batches and releases change them too
+        self.loop.call_soon_threadsafe(self._add_subscriber, uic, asset_type, callback)
 
     def remove_subscriber(self, uic, callback):
-        if uic in self.subscriptions:
-            self.subscriptions[uic]["subscribers"].discard(callback)
-            if not self.subscriptions[uic]["subscribers"]:
-                logging.info(f"Unsubscribing from {uic}")
+        self.loop.call_soon_threadsafe(self._remove_subscriber, uic, callback)
+
+    def _add_subscriber(self, uic, asset_type, callback):
+        subscription = self.subscriptions.get(uic)
+        if subscription is None:
+            subscription = {"ref_id": None, "asset_type": asset_type, "last_message": None, "subscribers": set(), "linger": None}
+            self.subscriptions[uic] = subscription
+            self._queue_subscribe(uic, asset_type)
+        elif not subscription["subscribers"]:
+            self._cancel_linger(uic)
+        subscription["subscribers"].add(callback)
+
+    def _remove_subscriber(self, uic, callback):
+        subscription = self.subscriptions.get(uic)
+        if subscription is None:
+            return
+        subscription["subscribers"].discard(callback)
+        if not subscription["subscribers"]:
+            logger.info(f"Last subscriber of {uic} left, unsubscribing in {self.linger:.0f}s")
+            self._start_linger(uic)
+
+    def _start_linger(self, uic):
+        subscription = self.subscriptions.get(uic)
+        if subscription is None or subscription["subscribers"] or subscription["linger"] is not None:
+            return
+        subscription["linger"] = self.loop.call_later(self.linger, self._release, uic)
+
+    def _cancel_linger(self, uic):
+        subscription = self.subscriptions.get(uic)
+        if subscription is not None and subscription["linger"] is not None:
+            subscription["linger"].cancel()
+            subscription["linger"] = None
+
+    def _release(self, uic):
+        subscription = self.subscriptions.get(uic)
+        if subscription is None:
+            return
+        subscription["linger"] = None
+        if subscription["subscribers"]:
+            return
+        del self.subscriptions[uic]
+        ref_id = subscription["ref_id"]
+        if ref_id is None:
+            # Released before its batch was sent
+            pending = self._pending.get(subscription["asset_type"], [])
+            if uic in pending:
+                pending.remove(uic)
+            return
+        uics = self.ref_to_uics.get(ref_id, [])
+        if uic in uics:
+            uics.remove(uic)
+        if not uics:
+            self.ref_to_uics.pop(ref_id, None)
+            self.loop.create_task(self._unsubscribe(ref_id))
+
+    def _queue_subscribe(self, uic, asset_type):
+        pending = self._pending.setdefault(asset_type, [])
+        if not pending:
+            self.loop.call_later(self.batch_window, self._flush, asset_type)
+        pending.append(uic)
+
+    def _flush(self, asset_type):
+        uics = self._pending.pop(asset_type, [])
+        for i in range(0, len(uics), self.max_batch):
+            self.loop.create_task(self._subscribe(uics[i:i + self.max_batch], asset_type))
 
-    async def _subscribe(self, uic, ref_id, asset_type):
+    async def _subscribe(self, uics, asset_type):
+        # UICs released since their batch was flushed are left out
+        uics = [uic for uic in uics if uic in self.subscriptions]
+        if not uics:
+            return
+        if len(uics) == 1:
+            ref_id = f"uic_{uics[0]}"
+        else:
+            self._batches += 1
+            ref_id = f"uics_{asset_type}_{self._batches}"
+        self.ref_to_uics[ref_id] = list(uics)
+        for uic in uics:
+            subscription = self.subscriptions.get(uic)
+            if subscription is not None:
+                subscription["ref_id"] = ref_id
         url = f"{self.subscription_url}?context_id={self.context_id}"
-        body = (
-            {"Arguments": {"AssetType": asset_type, "Uic": uic}, "ContextId": self.context_id, "ReferenceId": ref_id},
-        )
+        body = {
+            "Arguments": {"AssetType": asset_type, "Uics": ",".join(str(uic) for uic in uics)},
+            "ContextId": self.context_id,
+            "ReferenceId": ref_id,
+        }
         try:
-            response = self.session.post(url, json=body)
+            # requests blocks; running it in the executor keeps the loop delivering messages meanwhile
+            response = await self.loop.run_in_executor(None, functools.partial(self.session.post, url, json=body))
             if response.status_code == 201:
-                logging.info(f"Subscribed to {uic}")
+                logger.info(f"Subscribed to {uics} as {ref_id}")
             else:
-                logging.error(f"Failed to subscribe to {uic}: {response.status_code} - {response.text}")
+                logger.error(f"Failed to subscribe to {uics}: {response.status_code} - {response.text}")
         except requests.exceptions.RequestException as e:
-            logging.error(f"Request failed: {e}")
+            logger.error(f"Request failed: {e}")
 
-    def _unsubscribe(self, uic):
-        url = f"{self.subscription_url}?context_id={self.context_id}"
+    async def _unsubscribe(self, ref_id):
+        url = f"{self.subscription_url}/{self.context_id}/{ref_id}"
+        try:
+            response = await self.loop.run_in_executor(None, functools.partial(self.session.delete, url))
+            if response.status_code in (200, 202, 204):
+                logger.info(f"Unsubscribed {ref_id}")
+            else:
+                logger.error(f"Failed to unsubscribe {ref_id}: {response.status_code} - {response.text}")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Request failed: {e}")
 
     def _run_event_loop(self):
         asyncio.set_event_loop(self.loop)
-        self.loop.run_until_complete(self._main())
+        self.loop.run_forever()
 
-    async def _connect_to_socket(self):
-        headers = [(k, v) for k, v in self.session.headers.items()]
-        self.websocket = await websockets.connect(
-            f"{self.socket_url}?context_id={self.context_id}",
-            extra_headers=headers,
-        )
-        logging.info("Connected to saxo socket")
+    # Clients interface, called by the upstream for every frame
 
-    async def _receive_messages(self):
-        try:
-            async for message in self.websocket:
-                if isinstance(message, bytes):
-                    await self._process_message(message)
-        except Exception as e:
-            logging.error(f"Error receiving message: {e}")
+    def push_all(self, payload: Any, messages: Optional[List[Dict[str, Any]]] = None) -> None:
+        if self.clients is not None:
+            self.clients.push_all(payload, messages)
 
-    async def _process_message(self, message: bytes):
-        try:
-            offset = 0
-            message_id = struct.unpack_from("<Q", message)[0]
-            offset += 8
-            offset += 2
-            ref_id_size = struct.unpack_from("<B", message, offset)[0]
-            offset += 1
-            ref_id = message[offset : offset + ref_id_size].decode("utf-8")
-            offset += ref_id_size
-            offset += 1
-            payload_size = struct.unpack_from("<I", message, offset)[0]
-            offset += 4
-            payload = message[offset : offset + payload_size].decode("utf-8")
-            parsed_payload = json.loads(payload)
-
-            message_obj = {"message_id": message_id, "ref_id": ref_id, "payload": parsed_payload}
-
-            await self._broadcast_message(message_obj)
-        except Exception as e:
-            logging.error(f"Error processing message: {e}")
-
-    async def _broadcast_message(self, message_obj):
-        uic = self.ref_to_uic.get(message_obj["ref_id"])
-        if not uic:
+    def push_ref(self, ref_id: str, payload: Any, messages: Optional[List[Dict[str, Any]]] = None) -> None:
+        if self.clients is not None:
+            self.clients.push_ref(ref_id, payload, messages)
+        uics = self.ref_to_uics.get(ref_id)
+        if not uics:
             return
-        self.subscriptions[uic]["last_message"] = message_obj
-        for subscribers in self.subscriptions[uic]["subscribers"]:
+        if messages is None:
+            messages = list(Upstream.decode_ws_msg(payload))
+        for m in messages:
+            # Every subscription is a list subscription, so callbacks get one row whether or not it was batched
+            for uic, row in _rows_by_uic(m["msg"]):
+                message_obj = {"message_id": m["msgId"], "ref_id": ref_id, "payload": row}
+                asyncio.run_coroutine_threadsafe(self._broadcast_message(uic, message_obj), self.loop)
+
+    async def _broadcast_message(self, uic, message_obj):
+        subscription = self.subscriptions.get(uic)
+        if subscription is None:
+            return
+        subscription["last_message"] = message_obj
+        for subscriber in list(subscription["subscribers"]):
             try:
-                await subscribers(message_obj)
+                result = subscriber(message_obj)
+                if asyncio.iscoroutine(result):
+                    await result
             except Exception as e:
-                logging.error(f"Error broadcasting message to subscriber: {e}")
-
-    async def _main(self):
-        await self._connect_to_socket()
-        await self._receive_messages()
+                logger.error(f"Error broadcasting message to subscriber: {e}")
@@ -1,19 +1,301 @@
-from typing import Dict, Set, Any
+from collections import deque
+from enum import Enum
+from typing import Callable, Deque, Dict, List, Optional, Set, Any, Tuple
+import json
+import logging
+import os
+import time
+import eventlet
+from eventlet.semaphore import Semaphore
+from streaming.upstream import Upstream
+from streaming.snapshots import merge_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(Enum):
+    """What a client writer does when its send queue is full."""
+    DropOldest = "drop_oldest"
+    Disconnect = "disconnect"
+    Conflate = "conflate"
+
+
+class ClientWriter:
+    """Bounded send queue drained by a dedicated writer green thread for one downstream websocket.
+
+    Producers only append to the queue, so a slow client never blocks the upstream receive loop.
+    When the queue is full the overflow policy decides what happens:
+
+    - ``DropOldest`` discards the oldest queued payload.
+    - ``Disconnect`` closes the client, which has to reconnect and catch up.
+    - ``Conflate`` merges the payload into the newest queued one of the same ref id, so the client still gets
+      every field. Without one queued it makes room like ``DropOldest``, merging the oldest payload into a later
+      one of its ref id if there is one.
+    """
+
+    # Whether put() needs the decoded messages of a frame
+    wants_messages = False
+
+    def __init__(
+        self,
+        ws: Any,
+        max_queue: int,
+        policy: OverflowPolicy,
+        on_closed: Optional[Callable[["ClientWriter"], None]] = None,
+    ) -> None:
+        self.ws = ws
+        self.max_queue = max_queue
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self._queue: Deque[Tuple[Optional[str], Any]] = deque()
+        self._ready = Semaphore(0)
+        self._on_closed = on_closed
+        self._thread = eventlet.spawn(self._run)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def put(self, payload: Any, ref_id: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """Queues a payload for sending. Never blocks.
+
+        Returns:
+            bool: False if the payload was not queued because the writer is closed.
+        """
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            if self.policy is OverflowPolicy.Conflate and ref_id is not None and self._conflate(ref_id, payload, messages):
+                return True
+            if not self._make_room():
+                return False
+        was_empty = not self._queue
+        self._queue.append((ref_id, payload))
+        if was_empty:
+            self._ready.release()
+        return True
+
+    @staticmethod
+    def _merge(older: Any, newer: Any, newer_messages: Optional[List[Dict[str, Any]]] = None) -> bytes:
+        """Merges two frames of one ref id into a single message with the fields of both and the newest message id."""
+        messages = list(Upstream.decode_ws_msg(older))
+        messages += newer_messages if newer_messages is not None else list(Upstream.decode_ws_msg(newer))
+        doc = None
+        for m in messages:
+            doc = merge_snapshot(doc, m["msg"])
+        return Upstream.encode_ws_msg(messages[-1]["refid"], doc, messages[-1]["msgId"])
+
+    def _conflate(self, ref_id: str, payload: Any, messages: Optional[List[Dict[str, Any]]]) -> bool:
+        for i in range(len(self._queue) - 1, -1, -1):
+            if self._queue[i][0] == ref_id:
+                self._queue[i] = (ref_id, self._merge(self._queue[i][1], payload, messages))
+                return True
+        return False
+
+    def _make_room(self) -> bool:
+        if self.policy is OverflowPolicy.Disconnect:
+            logger.warning(f"Send queue full ({self.max_queue}), disconnecting slow client")
+            self.close()
+            return False
+        ref_id, payload = self._queue.popleft()
+        if self.policy is OverflowPolicy.Conflate and ref_id is not None:
+            for i, (queued_ref_id, queued) in enumerate(self._queue):
+                if queued_ref_id == ref_id:
+                    self._queue[i] = (ref_id, self._merge(payload, queued))
+                    return True
+        self.dropped += 1
+        return True
+
+    def close(self, close_socket: bool = True) -> None:
+        """Stops the writer, drops anything still queued and optionally closes the websocket."""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._ready.release()
+        if close_socket:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+        if self._on_closed:
+            self._on_closed(self)
+
+    def _run(self) -> None:
+        while not self.closed:
+            self._ready.acquire()
+            while self._queue and not self.closed:
+                _, payload = self._queue.popleft()
+                try:
+                    self.ws.send(payload)
+                except Exception as e:
+                    logger.info(f"Dropping downstream client after failed send: {e}")
+                    self.close()
+
+
+class ConflatingWriter(ClientWriter):
+    """Writer that only keeps the newest merged state per ref id instead of queueing every delta.
+
+    Deltas are merged into the state the client last saw, and the full state of every ref id that
+    changed is sent as a JSON text message (``{"refid", "msgId", "msg"}``) as soon as the socket is
+    free, or at most ``max_rate`` times per second. Memory per client is bounded by the number of
+    ref ids rather than by how far behind the client is.
+    """
+
+    wants_messages = True
+
+    def __init__(
+        self,
+        ws: Any,
+        max_rate: Optional[float] = None,
+        on_closed: Optional[Callable[["ClientWriter"], None]] = None,
+    ) -> None:
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._changed: Dict[str, None] = {}
+        super().__init__(ws, max_queue=0, policy=OverflowPolicy.Conflate, on_closed=on_closed)
+
+    def __len__(self) -> int:
+        return len(self._changed)
+
+    def put(self, payload: Any, ref_id: Optional[str] = None, messages: Optional[List[Dict[str, Any]]] = None) -> bool:
+        if self.closed:
+            return False
+        if messages is None:
+            messages = list(Upstream.decode_ws_msg(payload))
+        was_empty = not self._changed
+        for m in messages:
+            self.merge(m)
+        if was_empty and self._changed:
+            self._ready.release()
+        return True
+
+    def merge(self, message: Dict[str, Any]) -> None:
+        """Merges one decoded message into the state of its ref id and marks it for sending."""
+        refid = message["refid"]
+        state = self._state.setdefault(refid, {"refid": refid, "msgId": None, "msg": None})
+        state["msgId"] = message["msgId"]
+        state["msg"] = merge_snapshot(state["msg"], message["msg"])
+        self._changed[refid] = None
+
+    def close(self, close_socket: bool = True) -> None:
+        self._changed.clear()
+        super().close(close_socket)
+
+    def _run(self) -> None:
+        while not self.closed:
+            self._ready.acquire()
+            while self._changed and not self.closed:
+                refid = next(iter(self._changed))
+                del self._changed[refid]
+                started = time.monotonic()
+                try:
+                    self.ws.send(json.dumps(self._state[refid]))
+                except Exception as e:
+                    logger.info(f"Dropping downstream client after failed send: {e}")
+                    self.close()
+                    break
+                if self.min_interval:
+                    eventlet.sleep(max(0.0, self.min_interval - (time.monotonic() - started)))
+
 
 class Clients:
     """Manages downstream WebSocket clients and fan-out by refId."""
-    def __init__(self) -> None:
+
+    # Whether dispatched frames keep their control messages
+    wants_control = False
+
+    def __init__(self, max_queue: Optional[int] = None, policy: Optional[OverflowPolicy] = None) -> None:
+        self.max_queue = max_queue or int(os.getenv("CLIENT_QUEUE_SIZE", "1000"))
+        self.policy = policy or OverflowPolicy(os.getenv("CLIENT_OVERFLOW_POLICY", OverflowPolicy.DropOldest.value))
         self._all: Set[Any] = set()
         self._by_ref: Dict[str, Set[Any]] = {}
+        self._writers: Dict[Any, ClientWriter] = {}
+        # When the last client of each ref id left
+        self._last_consumer: Dict[str, float] = {}
+        # Called with a ref id when it gets a client while it had none
+        self.on_demand: Optional[Callable[[str], Any]] = None
+
+    def consumers(self, ref_id: str) -> int:
+        """Returns the number of clients listening to a ref id, not counting ``/ws/all`` clients."""
+        return len(self._by_ref.get(ref_id, ()))
 
-    def add_all(self, ws: Any) -> None:
+    def all_consumers(self) -> int:
+        """Returns the number of ``/ws/all`` clients, which consume every ref id."""
+        return len(self._all)
+
+    def idle_for(self, ref_id: str) -> Optional[float]:
+        """Returns the seconds since the last client of a ref id left, 0 while it has clients, or None if it never had one."""
+        if self._by_ref.get(ref_id):
+            return 0.0
+        left = self._last_consumer.get(ref_id)
+        if left is None:
+            return None
+        return time.monotonic() - left
+
+    def _writer(self, ws: Any, conflate: bool = False, max_rate: Optional[float] = None) -> ClientWriter:
+        writer = self._writers.get(ws)
+        if writer is None:
+            if conflate:
+                writer = ConflatingWriter(ws, max_rate, on_closed=self._on_writer_closed)
+            else:
+                writer = ClientWriter(ws, self.max_queue, self.policy, on_closed=self._on_writer_closed)
+            self._writers[ws] = writer
+        return writer
+
+    def _release(self, ws: Any) -> None:
+        """Stops the writer of a websocket that is no longer registered anywhere."""
+        if ws in self._all or any(ws in s for s in self._by_ref.values()):
+            return
+        writer = self._writers.pop(ws, None)
+        if writer is not None:
+            writer.close(close_socket=False)
+
+    def _on_writer_closed(self, writer: ClientWriter) -> None:
+        self._writers.pop(writer.ws, None)
+        self._all.discard(writer.ws)
+        for ref_id in [ref_id for ref_id, s in self._by_ref.items() if writer.ws in s]:
+            self.remove_ref(ref_id, writer.ws)
+
+    def add_all(
+        self,
+        ws: Any,
+        conflate: bool = False,
+        max_rate: Optional[float] = None,
+        backlog: Optional[List[bytes]] = None,
+    ) -> None:
         self._all.add(ws)
+        writer = self._writer(ws, conflate, max_rate)
+        for frame in backlog or ():
+            writer.put(frame)
 
     def remove_all(self, ws: Any) -> None:
         self._all.discard(ws)
+        self._release(ws)
 
-    def add_ref(self, ref_id: str, ws: Any) -> None:
+    def add_ref(
+        self,
+        ref_id: str,
+        ws: Any,
+        conflate: bool = False,
+        max_rate: Optional[float] = None,
+        snapshot: Optional[Dict[str, Any]] = None,
+        backlog: Optional[List[bytes]] = None,
+    ) -> None:
+        in_demand = bool(self._by_ref.get(ref_id))
         self._by_ref.setdefault(ref_id, set()).add(ws)
+        if not in_demand and self.on_demand is not None:
+            try:
+                self.on_demand(ref_id)
+            except Exception as e:
+                logger.error(f"Demand callback for {ref_id} failed: {e}")
+        writer = self._writer(ws, conflate, max_rate)
+        # Queued before any delta pushed after registration, so the client continues seamlessly from them
+        if snapshot is not None:
+            frame = Upstream.encode_ws_msg(snapshot["refid"], snapshot["msg"], snapshot["msgId"])
+            writer.put(frame, ref_id, [snapshot])
+        for frame in backlog or ():
+            writer.put(frame, ref_id)
 
     def remove_ref(self, ref_id: str, ws: Any) -> None:
         s = self._by_ref.get(ref_id)
@@ -21,26 +303,24 @@ class Clients:
             s.discard(ws)
             if not s:
                 self._by_ref.pop(ref_id, None)
+                self._last_consumer[ref_id] = time.monotonic()
+        self._release(ws)
 
-    def push_all(self, payload: str) -> None:
-        dead = []
+    def push_all(self, payload: Any, messages: Optional[List[Dict[str, Any]]] = None) -> None:
         for ws in list(self._all):
-            try:
-                ws.send(payload)
-            except Exception:
-                dead.append(ws)
-        for d in dead:
-            self.remove_all(d)
+            writer = self._writers.get(ws)
+            if writer is not None:
+                if writer.wants_messages and messages is None:
+                    messages = list(Upstream.decode_ws_msg(payload))
+                writer.put(payload, messages=messages)
 
-    def push_ref(self, ref_id: str, payload: str) -> None:
-        dead = []
+    def push_ref(self, ref_id: str, payload: Any, messages: Optional[List[Dict[str, Any]]] = None) -> None:
         for ws in list(self._by_ref.get(ref_id, ())):
-            try:
-                ws.send(payload)
-            except Exception:
-                dead.append(ws)
-        for d in dead:
-            self.remove_ref(ref_id, d)
+            writer = self._writers.get(ws)
+            if writer is not None:
+                if writer.wants_messages and messages is None:
+                    messages = list(Upstream.decode_ws_msg(payload))
+                writer.put(payload, ref_id, messages)
 
 # export a singleton registry
 clients = Clients()
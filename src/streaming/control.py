@@ -0,0 +1,94 @@
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = "_heartbeat"
+RESET_SUBSCRIPTIONS = "_resetsubscriptions"
+DISCONNECT = "_disconnect"
+# Reserved for the fan-out feed between replicas, never sent by Saxo
+SNAPSHOT = "_snapshot"
+SNAPSHOT_REQUEST = "_snapshotrequest"
+
+
+def is_control_message(ref_id: str) -> bool:
+    """Saxo control messages use reserved ref ids starting with an underscore."""
+    return ref_id.startswith("_")
+
+
+class ControlMessages:
+    """Dispatches Saxo streaming control messages and records heartbeat liveness per refId."""
+    def __init__(
+        self,
+        on_reset: Optional[Callable[[List[str]], Any]] = None,
+        on_disconnect: Optional[Callable[[], Any]] = None,
+        on_heartbeat: Optional[Callable[[str, str], Any]] = None,
+        on_snapshot: Optional[Callable[[str, Any, int], Any]] = None,
+        on_snapshot_request: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """
+        Args:
+            on_reset (Optional[Callable[[List[str]], Any]]): Called with the ref ids to resubscribe; empty means all
+            on_disconnect (Optional[Callable[[], Any]]): Called when Saxo is about to drop the connection
+            on_heartbeat (Optional[Callable[[str, str], Any]]): Called with the ref id and reason of every heartbeat
+            on_snapshot (Optional[Callable[[str, Any, int], Any]]): Called with the ref id, full document and message id
+                of every snapshot the fan-out leader publishes
+            on_snapshot_request (Optional[Callable[[], Any]]): Called when a fan-out follower asks for the snapshots
+        """
+        self.on_reset = on_reset
+        self.on_disconnect = on_disconnect
+        self.on_heartbeat = on_heartbeat
+        self.on_snapshot = on_snapshot
+        self.on_snapshot_request = on_snapshot_request
+        self.heartbeats: Dict[str, float] = {}
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        """
+        Handles a decoded control message.
+
+        Args:
+            message (Dict[str, Any]): A message as returned by ``Upstream.decode_ws_msg``
+        """
+        payload = message["msg"]
+        items = payload if isinstance(payload, list) else [payload]
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            ref_id = item.get("ReferenceId", message["refid"])
+            if ref_id == HEARTBEAT:
+                self._heartbeat(item)
+            elif ref_id == RESET_SUBSCRIPTIONS:
+                targets = list(item.get("TargetReferenceIds") or [])
+                logger.warning(f"Saxo reset subscriptions: {targets or 'all'}")
+                if self.on_reset:
+                    self.on_reset(targets)
+            elif ref_id == DISCONNECT:
+                logger.warning("Saxo requested a disconnect")
+                if self.on_disconnect:
+                    self.on_disconnect()
+            elif ref_id == SNAPSHOT:
+                if self.on_snapshot:
+                    self.on_snapshot(item["TargetReferenceId"], item.get("Snapshot"), int(item.get("MsgId", 0)))
+            elif ref_id == SNAPSHOT_REQUEST:
+                if self.on_snapshot_request:
+                    self.on_snapshot_request()
+            else:
+                logger.info(f"Ignoring unknown control message {ref_id}: {item}")
+
+    def _heartbeat(self, item: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        for heartbeat in item.get("Heartbeats", []):
+            ref_id = heartbeat.get("OriginatingReferenceId")
+            if not ref_id:
+                continue
+            self.heartbeats[ref_id] = now
+            if self.on_heartbeat:
+                self.on_heartbeat(ref_id, heartbeat.get("Reason", ""))
+
+    def last_heartbeat(self, ref_id: str) -> Optional[float]:
+        """Returns the number of seconds since the last heartbeat for a ref id, or None if there was none."""
+        seen = self.heartbeats.get(ref_id)
+        if seen is None:
+            return None
+        return time.monotonic() - seen
@@ -0,0 +1,49 @@
+from typing import List
+import logging
+from streaming.upstream import Upstream
+
+logger = logging.getLogger(__name__)
+
+
+class StandbyPair:
+    """Runs a hot standby next to an upstream connection and promotes it as soon as the active one drops.
+
+    Both connections hold the same subscriptions, but only the active one feeds the snapshots, replay buffer
+    and clients. Saxo numbers messages per connection, so the two streams cannot be matched up by message id;
+    forwarding a single connection at a time is what keeps the handover free of duplicates. The standby merges
+    its messages into documents of its own, which the shared snapshots take over on promotion.
+    """
+    def __init__(self, primary: Upstream, standby: Upstream) -> None:
+        self.upstreams: List[Upstream] = [primary, standby]
+        self.active = primary
+        self.failovers = 0
+        primary.active = True
+        standby.active = False
+        for upstream in self.upstreams:
+            upstream.on_state = self._on_state
+
+    @property
+    def standby(self) -> Upstream:
+        return self.upstreams[1] if self.active is self.upstreams[0] else self.upstreams[0]
+
+    def _on_state(self, _upstream: Upstream) -> None:
+        # The active connection keeps its role until it drops and the other one is up to take over
+        if self.active.connected or not self.standby.connected:
+            return
+        previous, self.active = self.active, self.standby
+        previous.active = False
+        self.active.take_over()
+        self.failovers += 1
+        logger.warning(f"Upstream {previous.context_id} down, promoted standby {self.active.context_id}")
+
+    def start(self) -> None:
+        for upstream in self.upstreams:
+            upstream.start()
+
+    def stop(self) -> None:
+        for upstream in self.upstreams:
+            upstream.stop()
+
+    def reauthorize(self, token: str) -> None:
+        for upstream in self.upstreams:
+            upstream.reauthorize(token)
@@ -0,0 +1,215 @@
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+import logging
+import os
+import socket
+import eventlet
+from redis import ConnectionPool, Redis
+from streaming.control import SNAPSHOT, SNAPSHOT_REQUEST
+from streaming.upstream import Upstream
+
+logger = logging.getLogger(__name__)
+
+# Extends the lock only while it is still held by this replica
+_RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def fanout_channel() -> str:
+    return os.getenv("STREAM_FANOUT_CHANNEL", "saxo_stream")
+
+
+def binary_connection(redis: Redis) -> Redis:
+    """
+    Returns a connection to the same Redis server that does not decode responses, for binary frames.
+
+    Args:
+        redis (Redis): The connection to copy the settings from
+
+    Returns:
+        Redis: A connection with ``decode_responses`` disabled
+    """
+    pool = redis.connection_pool
+    kwargs = {**pool.connection_kwargs, "decode_responses": False}
+    return Redis(connection_pool=ConnectionPool(connection_class=pool.connection_class, **kwargs))
+
+
+def snapshot_frame(ref_id: str, snapshot: Any, msg_id: int = 0) -> bytes:
+    """Encodes the full document of a ref id as a control message of the fan-out feed, see ``ControlMessages``."""
+    item = {"ReferenceId": SNAPSHOT, "TargetReferenceId": ref_id, "MsgId": msg_id, "Snapshot": snapshot}
+    return Upstream.encode_ws_msg(SNAPSHOT, [item])
+
+
+class LeaderElection:
+    """Elects a single upstream leader among replicas with a Redis lock that the leader keeps renewing."""
+    def __init__(
+        self,
+        redis: Redis,
+        key: Optional[str] = None,
+        ttl: Optional[float] = None,
+        on_elected: Optional[Callable[[], Any]] = None,
+        on_demoted: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """
+        Args:
+            redis (Redis): The Redis connection holding the lock
+            key (Optional[str]): The lock key. Defaults to env ``STREAM_LEADER_KEY``.
+            ttl (Optional[float]): Seconds the lock outlives a leader that stops renewing. Defaults to env ``STREAM_LEADER_TTL``.
+            on_elected (Optional[Callable[[], Any]]): Called when this replica becomes the leader
+            on_demoted (Optional[Callable[[], Any]]): Called when this replica loses the lock
+        """
+        self.redis = redis
+        self.key = key or os.getenv("STREAM_LEADER_KEY", "saxo_stream_leader")
+        self.ttl = ttl or float(os.getenv("STREAM_LEADER_TTL", "10"))
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self.running = False
+
+    def step(self) -> bool:
+        """
+        Runs one election round: renews the lock when leading, tries to take it otherwise.
+
+        Returns:
+            bool: True if this replica is the leader after the round
+        """
+        ttl_ms = int(self.ttl * 1000)
+        try:
+            if self.is_leader:
+                leading = bool(self.redis.eval(_RENEW_SCRIPT, 1, self.key, self.identity, ttl_ms))
+            else:
+                leading = bool(self.redis.set(self.key, self.identity, nx=True, px=ttl_ms))
+        except Exception as e:
+            # Without Redis the lock cannot be proven, so a leader steps down before another replica takes over
+            logger.error(f"Leader election failed: {e}")
+            leading = False
+
+        if leading and not self.is_leader:
+            logger.info(f"Elected upstream leader as {self.identity}")
+            self.is_leader = True
+            if self.on_elected:
+                self.on_elected()
+        elif not leading and self.is_leader:
+            logger.warning(f"Lost upstream leadership as {self.identity}")
+            self.is_leader = False
+            if self.on_demoted:
+                self.on_demoted()
+        return self.is_leader
+
+    def start(self) -> None:
+        self.running = True
+        eventlet.spawn_n(self._run)
+
+    def _run(self) -> None:
+        while self.running:
+            self.step()
+            eventlet.sleep(self.ttl / 3)
+
+    def resign(self) -> None:
+        """Stops the election and releases the lock if this replica holds it."""
+        self.running = False
+        if not self.is_leader:
+            return
+        try:
+            self.redis.eval(_RELEASE_SCRIPT, 1, self.key, self.identity)
+        except Exception as e:
+            logger.error(f"Releasing upstream leadership failed: {e}")
+        self.is_leader = False
+        if self.on_demoted:
+            self.on_demoted()
+
+
+class RedisPublisher:
+    """Stands in for Clients on the leader: publishes every upstream frame to a Redis channel."""
+
+    # Followers need the heartbeats to know which subscriptions are current without new data
+    wants_control = True
+
+    def __init__(self, redis: Redis, channel: Optional[str] = None) -> None:
+        self.redis = redis
+        self.channel = channel or fanout_channel()
+
+    def push_all(self, payload: Any, messages: Optional[List[Dict[str, Any]]] = None) -> None:
+        try:
+            self.redis.publish(self.channel, bytes(payload))
+        except Exception as e:
+            logger.error(f"Publishing frame to {self.channel} failed: {e}")
+
+    def push_ref(self, ref_id: str, payload: Any, messages: Optional[List[Dict[str, Any]]] = None) -> None:
+        # Followers split the frame themselves
+        pass
+
+    def publish_snapshot(self, ref_id: str, snapshot: Any, msg_id: int = 0) -> None:
+        """Publishes the full document of a ref id, which replaces the one the replicas merged from the deltas."""
+        self.push_all(snapshot_frame(ref_id, snapshot, msg_id))
+
+
+class RedisFeed:
+    """Serves the local downstream clients from the frames the leader publishes to Redis."""
+    def __init__(self, redis: Redis, dispatcher, channel: Optional[str] = None) -> None:
+        """
+        Args:
+            redis (Redis): A connection that does not decode responses, see ``binary_connection``
+            dispatcher (FrameDispatcher): Feeds the frames to the local snapshots, replay buffer and clients
+            channel (Optional[str]): The channel to subscribe to. Defaults to env ``STREAM_FANOUT_CHANNEL``.
+        """
+        self.redis = redis
+        self.dispatcher = dispatcher
+        self.channel = channel or fanout_channel()
+        self.running = False
+
+    def start(self) -> None:
+        self.running = True
+        eventlet.spawn_n(self._run)
+
+    def stop(self) -> None:
+        self.running = False
+
+    def request_snapshots(self) -> None:
+        """Asks the leader to publish the full document of every ref id, e.g. after missing the ones it published."""
+        try:
+            self.redis.publish(self.channel, Upstream.encode_ws_msg(SNAPSHOT_REQUEST, [{"ReferenceId": SNAPSHOT_REQUEST}]))
+        except Exception as e:
+            logger.error(f"Requesting snapshots on {self.channel} failed: {e}")
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        if message.get("type") != "message":
+            return
+        try:
+            self.dispatcher.dispatch(message["data"])
+        except Exception as e:
+            logger.warning(f"Error handling fan-out frame: {e}")
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while self.running:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                logger.info(f"Listening for upstream frames on {self.channel}")
+                backoff = 1.0
+                # Deltas alone do not make a document; whatever was published before is missing
+                self.request_snapshots()
+                for message in pubsub.listen():
+                    if not self.running:
+                        break
+                    self.handle(message)
+            except Exception as e:
+                logger.error(f"Fan-out subscription failed: {e}")
+            finally:
+                pubsub.close()
+            if self.running:
+                eventlet.sleep(backoff)
+                backoff = min(backoff * 2.0, 15.0)
@@ -0,0 +1,199 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+import json
+import logging
+import os
+import time
+import eventlet
+from eventlet import tpool
+from redis import Redis
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+KEY_BY_REF = "ref"
+KEY_BY_TAG = "tag"
+
+
+class QuoteLog:
+    """Sink that appends every decoded streaming message to a capped Redis Stream per ref id or per algo tag.
+
+    The tag lookup hits the database, so it runs in a thread pool and never on the receive path. Messages of a
+    ref id whose tags are not known yet are held back until the lookup finishes; expired tags keep being used
+    while they are refreshed.
+    """
+    def __init__(
+        self,
+        redis: Redis,
+        key_by: str = KEY_BY_REF,
+        tags: Optional[Callable[[str], List[str]]] = None,
+        maxlen: Optional[int] = None,
+        prefix: Optional[str] = None,
+        tag_ttl: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            redis (Redis): The Redis connection the streams live on
+            key_by (str): ``"ref"`` for a stream per ref id, ``"tag"`` for a stream per algo tag
+            tags (Optional[Callable[[str], List[str]]]): Returns the algo tags subscribed to a ref id, required for ``"tag"``
+            maxlen (Optional[int]): Approximate number of entries kept per stream. Defaults to env ``QUOTE_LOG_MAXLEN``.
+            prefix (Optional[str]): Prefix of the stream keys. Defaults to env ``QUOTE_LOG_PREFIX``.
+            tag_ttl (float): Seconds the tags of a ref id are cached for
+        """
+        if key_by not in (KEY_BY_REF, KEY_BY_TAG):
+            raise ValueError(f"Unknown quote log key {key_by}, expected '{KEY_BY_REF}' or '{KEY_BY_TAG}'")
+        if key_by == KEY_BY_TAG and tags is None:
+            raise ValueError("A quote log keyed by tag needs a tag lookup")
+        self.redis = redis
+        self.key_by = key_by
+        self.tags = tags
+        self.maxlen = maxlen or int(os.getenv("QUOTE_LOG_MAXLEN", "10000"))
+        self.prefix = prefix or os.getenv("QUOTE_LOG_PREFIX", "quotes")
+        self.tag_ttl = tag_ttl
+        self._tags: Dict[str, Tuple[float, List[str]]] = {}
+        self._looking_up: Set[str] = set()
+        # Messages of ref ids whose tags are being looked up for the first time
+        self._waiting: Dict[str, List[Dict[str, Any]]] = {}
+
+    def stream_keys(self, ref_id: str) -> Optional[List[str]]:
+        """Returns the keys of the streams the messages of a ref id are appended to, or None while its tags are
+        being looked up."""
+        if self.key_by == KEY_BY_REF:
+            return [f"{self.prefix}:{ref_id}"]
+        cached = self._tags.get(ref_id)
+        if cached is None or time.monotonic() - cached[0] > self.tag_ttl:
+            self._look_up(ref_id)
+        if cached is None:
+            return None
+        return [f"{self.prefix}:{tag}" for tag in cached[1]]
+
+    def _look_up(self, ref_id: str) -> None:
+        if ref_id not in self._looking_up:
+            self._looking_up.add(ref_id)
+            eventlet.spawn_n(self._resolve, ref_id)
+
+    def _resolve(self, ref_id: str) -> None:
+        try:
+            tags = list(tpool.execute(self.tags, ref_id))  # type: ignore[arg-type]
+        except Exception as e:
+            logger.error(f"Looking up the tags of {ref_id} failed: {e}")
+            cached = self._tags.get(ref_id)
+            tags = cached[1] if cached else []
+        self._tags[ref_id] = (time.monotonic(), tags)
+        self._looking_up.discard(ref_id)
+        waiting = self._waiting.pop(ref_id, None)
+        if waiting:
+            self.write(waiting)
+
+    def write(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        Appends decoded messages to their streams in a single round trip.
+
+        Args:
+            messages (List[Dict[str, Any]]): Messages as returned by ``Upstream.decode_ws_msg``
+        """
+        if not messages:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        appended = 0
+        for m in messages:
+            # Later messages of a ref id queue up behind the held back ones, keeping their order
+            keys = None if m["refid"] in self._waiting else self.stream_keys(m["refid"])
+            if keys is None:
+                self._waiting.setdefault(m["refid"], []).append(m)
+                continue
+            fields = {"refid": m["refid"], "msgId": m["msgId"], "msg": json.dumps(m["msg"])}
+            for key in keys:
+                pipe.xadd(key, fields, maxlen=self.maxlen, approximate=True)
+                appended += 1
+        if not appended:
+            return
+        try:
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Appending {len(messages)} messages to the quote log failed: {e}")
+
+    def forget(self, ref_id: str) -> None:
+        """Drops the cached tags of a ref id, e.g. when an algo subscribes to or leaves it."""
+        self._tags.pop(ref_id, None)
+
+
+class QuoteLogConsumer:
+    """Reads a quote log stream through a consumer group, so every entry is handled at least once."""
+    def __init__(
+        self,
+        redis: Redis,
+        stream: str,
+        group: str,
+        consumer: str,
+        count: int = 100,
+        block_ms: int = 5000,
+    ) -> None:
+        """
+        Args:
+            redis (Redis): A Redis connection with ``decode_responses`` enabled
+            stream (str): The stream key, e.g. ``quotes:TF21_FxSpot``
+            group (str): The consumer group, shared by the workers that split the stream between them
+            consumer (str): The name of this worker within the group
+            count (int): Maximum number of entries per read
+            block_ms (int): How long a read waits for new entries
+        """
+        self.redis = redis
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.count = count
+        self.block_ms = block_ms
+        # Entries delivered before a restart but never acknowledged are read first
+        self._pending = True
+
+    def ensure_group(self, start: str = "0") -> None:
+        """Creates the consumer group, and the stream, unless they exist. ``start`` is where a new group begins reading."""
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id=start, mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    @staticmethod
+    def _decode(fields: Dict[str, Any]) -> Dict[str, Any]:
+        return {"refid": fields["refid"], "msgId": int(fields["msgId"]), "msg": json.loads(fields["msg"])}
+
+    def read(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Reads the next entries for this consumer: its unacknowledged ones first, then new ones.
+
+        Returns:
+            List[Tuple[str, Dict[str, Any]]]: Entry ids with the decoded messages
+        """
+        response = self.redis.xreadgroup(
+            self.group,
+            self.consumer,
+            {self.stream: "0" if self._pending else ">"},
+            count=self.count,
+            block=None if self._pending else self.block_ms,
+        )
+        entries = response[0][1] if response else []
+        if self._pending and not entries:
+            self._pending = False
+        # Pending entries trimmed by MAXLEN come back without fields and can never be handled
+        self.ack([entry_id for entry_id, fields in entries if not fields])
+        return [(entry_id, self._decode(fields)) for entry_id, fields in entries if fields]
+
+    def ack(self, entry_ids: List[str]) -> None:
+        if entry_ids:
+            self.redis.xack(self.stream, self.group, *entry_ids)
+
+    def claim_stale(self, min_idle_ms: int = 60000) -> List[Tuple[str, Dict[str, Any]]]:
+        """Takes over entries another consumer of the group read but did not acknowledge within ``min_idle_ms``."""
+        response = self.redis.xautoclaim(self.stream, self.group, self.consumer, min_idle_ms, count=self.count)
+        return [(entry_id, self._decode(fields)) for entry_id, fields in response[1] if fields]
+
+    def __iter__(self) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """Yields batches of entries forever; the entries of a batch are acknowledged once the next one is requested."""
+        self.ensure_group()
+        while True:
+            batch = self.read()
+            if not batch:
+                continue
+            yield batch
+            self.ack([entry_id for entry_id, _ in batch])
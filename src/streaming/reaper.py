@@ -0,0 +1,139 @@
+from enum import Enum
+from typing import Dict, Optional, Set
+import logging
+import os
+import time
+import eventlet
+from eventlet import tpool
+from handlers.subscription_handler import is_auto_subscription_tag
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionState(Enum):
+    """How a stored price subscription currently streams from Saxo."""
+    Active = "active"
+    Downgraded = "downgraded"
+    Suspended = "suspended"
+
+
+class SubscriptionReaper:
+    """Matches upstream bandwidth to downstream demand.
+
+    Subscriptions without ``/ws/<ref_id>`` clients are first downgraded to a slow refresh rate and, once idle
+    for longer, suspended at Saxo while their rows are kept. The subscription handler keeps them that way when it
+    recreates subscriptions, e.g. after a gap or a reset. The first client asking for a ref id again reinstates it
+    at its stored timeframe, as does an algo joining it. While ``/ws/all`` clients are connected every
+    subscription is in demand. With a quote log, the algos subscribed to a ref id consume it from the log, so
+    only subscriptions held for websocket clients alone can go idle.
+    """
+    def __init__(
+        self,
+        clients,
+        subscription_handler,
+        context_id: str,
+        idle_after: Optional[float] = None,
+        suspend_after: Optional[float] = None,
+        idle_refresh_rate: Optional[int] = None,
+        interval: Optional[float] = None,
+        quote_log: bool = False,
+    ) -> None:
+        """
+        Args:
+            clients (Clients): The downstream clients whose occupancy defines demand
+            subscription_handler (SubscriptionHandler): Handler used to change the subscriptions at Saxo
+            context_id (str): The context ID of the subscriptions
+            idle_after (Optional[float]): Idle seconds before downgrading. Defaults to env ``SUBSCRIPTION_IDLE_AFTER``.
+            suspend_after (Optional[float]): Idle seconds before suspending. Defaults to env ``SUBSCRIPTION_IDLE_TTL``.
+            idle_refresh_rate (Optional[int]): Refresh rate in milliseconds of downgraded subscriptions.
+                Defaults to env ``SUBSCRIPTION_IDLE_REFRESH_RATE``.
+            interval (Optional[float]): Seconds between sweeps. Defaults to env ``SUBSCRIPTION_REAP_INTERVAL``.
+            quote_log (bool): Whether the streamed messages are appended to a quote log the algos read
+        """
+        self.clients = clients
+        self.subscription_handler = subscription_handler
+        self.context_id = context_id
+        self.idle_after = idle_after or float(os.getenv("SUBSCRIPTION_IDLE_AFTER", "300"))
+        self.suspend_after = suspend_after or float(os.getenv("SUBSCRIPTION_IDLE_TTL", "3600"))
+        self.idle_refresh_rate = idle_refresh_rate or int(os.getenv("SUBSCRIPTION_IDLE_REFRESH_RATE", "60000"))
+        self.interval = interval or float(os.getenv("SUBSCRIPTION_REAP_INTERVAL", "60"))
+        self.quote_log = quote_log
+        self.states: Dict[str, SubscriptionState] = {}
+        # When the reaper first saw a ref id, for subscriptions that never had a client
+        self._first_seen: Dict[str, float] = {}
+        self.running = False
+
+    def _idle_for(self, ref_id: str, now: float) -> float:
+        if self.clients.all_consumers():
+            return 0.0
+        idle = self.clients.idle_for(ref_id)
+        if idle is None:
+            idle = now - self._first_seen.setdefault(ref_id, now)
+        return idle
+
+    def sweep(self) -> None:
+        """Downgrades or suspends the subscriptions that have been idle long enough."""
+        # psycopg2 and the Saxo calls would block the hub
+        subscriptions = tpool.execute(self.subscription_handler.get_price_subscriptions, self.context_id)
+        now = time.monotonic()
+        ref_ids = {str(sub["reference_id"]) for sub in subscriptions}
+        logged: Set[str] = set()
+        if self.quote_log:
+            logged = {
+                str(sub["reference_id"]) for sub in subscriptions if not is_auto_subscription_tag(str(sub["algo_name"]))
+            }
+        for ref_id in set(self.states) - ref_ids:
+            self.states.pop(ref_id, None)
+            self._first_seen.pop(ref_id, None)
+
+        for ref_id in ref_ids:
+            state = self.states.get(ref_id, SubscriptionState.Active)
+            idle = 0.0 if ref_id in logged else self._idle_for(ref_id, now)
+            if idle >= self.suspend_after and state is not SubscriptionState.Suspended:
+                logger.info(f"Suspending {ref_id}, idle for {idle:.0f}s")
+                if tpool.execute(self.subscription_handler.suspend_price_subscription, self.context_id, ref_id):
+                    self.states[ref_id] = SubscriptionState.Suspended
+            elif self.idle_after <= idle < self.suspend_after and state is SubscriptionState.Active:
+                logger.info(f"Downgrading {ref_id} to {self.idle_refresh_rate}ms, idle for {idle:.0f}s")
+                if tpool.execute(
+                    self.subscription_handler.resubscribe_price_subscription,
+                    self.context_id, ref_id, refresh_rate=self.idle_refresh_rate,
+                ):
+                    self.states[ref_id] = SubscriptionState.Downgraded
+            elif idle < self.idle_after and state is not SubscriptionState.Active:
+                self.reinstate(ref_id)
+
+    def reinstate(self, ref_id: str) -> None:
+        """Restores the stored timeframe of a downgraded or suspended subscription, in the background."""
+        self._first_seen.pop(ref_id, None)
+        if self.states.get(ref_id, SubscriptionState.Active) is SubscriptionState.Active:
+            return
+        # Marked first so a burst of clients reinstates once
+        previous = self.states.pop(ref_id)
+        eventlet.spawn_n(self._reinstate, ref_id, previous)
+
+    def _reinstate(self, ref_id: str, previous: SubscriptionState) -> None:
+        logger.info(f"Reinstating {previous.value} subscription {ref_id}")
+        if not tpool.execute(self.subscription_handler.resume_price_subscription, self.context_id, ref_id):
+            self.states[ref_id] = previous
+
+    def start(self) -> None:
+        self.clients.on_demand = self.reinstate
+        self.subscription_handler.on_joined = self.reinstate
+        self.running = True
+        eventlet.spawn_n(self._run)
+
+    def stop(self) -> None:
+        self.running = False
+        if self.clients.on_demand == self.reinstate:
+            self.clients.on_demand = None
+        if self.subscription_handler.on_joined == self.reinstate:
+            self.subscription_handler.on_joined = None
+
+    def _run(self) -> None:
+        while self.running:
+            eventlet.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Subscription sweep failed: {e}")
@@ -0,0 +1,72 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import heapq
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayBuffer:
+    """Bounded per-refId history of recent messages, used to fill the gap of a reconnecting client."""
+    def __init__(self, size: Optional[int] = None) -> None:
+        self.size = size or int(os.getenv("REPLAY_BUFFER_SIZE", "500"))
+        self._buffers: Dict[str, Deque[Tuple[int, bytes]]] = {}
+        # Lowest message id a client may have last seen for its gap to still be in the buffer
+        self._floors: Dict[str, int] = {}
+
+    def append(self, ref_id: str, msg_id: int, frame: bytes) -> None:
+        """
+        Records a message, evicting the oldest one of the ref id when its buffer is full.
+
+        Args:
+            ref_id (str): The reference id of the message
+            msg_id (int): The Saxo message id
+            frame (bytes): The message encoded as a binary frame
+        """
+        buffer = self._buffers.get(ref_id)
+        if buffer is None:
+            buffer = self._buffers[ref_id] = deque(maxlen=self.size)
+            self._floors[ref_id] = msg_id
+        elif msg_id <= buffer[-1][0]:
+            # Message ids restart when the upstream reconnects; the old ones can no longer be resumed from
+            buffer.clear()
+            self._floors[ref_id] = msg_id
+        elif len(buffer) == buffer.maxlen:
+            self._floors[ref_id] = buffer[0][0]
+        buffer.append((msg_id, frame))
+
+    def since(self, ref_id: str, msg_id: int) -> Optional[List[bytes]]:
+        """
+        Returns the messages of a ref id received after a message id.
+
+        Args:
+            ref_id (str): The reference id to replay
+            msg_id (int): The id of the last message the client received
+
+        Returns:
+            Optional[List[bytes]]: The missed messages in order, or None if the buffer no longer covers the gap
+        """
+        buffer = self._buffers.get(ref_id)
+        if not buffer:
+            return None
+        if msg_id < self._floors[ref_id] or msg_id > buffer[-1][0]:
+            return None
+        return [frame for buffered_id, frame in buffer if buffered_id > msg_id]
+
+    def since_all(self, msg_id: int) -> List[bytes]:
+        """Returns the buffered messages of every ref id received after a message id, ordered by message id."""
+        merged = heapq.merge(*(list(buffer) for buffer in self._buffers.values()), key=lambda item: item[0])
+        return [frame for buffered_id, frame in merged if buffered_id > msg_id]
+
+    def discard(self, ref_id: str) -> None:
+        self._buffers.pop(ref_id, None)
+        self._floors.pop(ref_id, None)
+
+    def clear(self) -> None:
+        """Forgets every message, e.g. when the stream moves to a connection that numbers its messages anew."""
+        self._buffers.clear()
+        self._floors.clear()
+
+# export a singleton buffer
+replay = ReplayBuffer()
@@ -0,0 +1,81 @@
+from typing import List, Optional
+import logging
+import os
+import eventlet
+from eventlet import tpool
+from redis import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRegistry:
+    """Keeps this replica's websocket membership alive in Redis and ends the memberships of replicas that are gone.
+
+    Every replica holds the demand of its downstream clients under its own member name, see
+    ``auto_subscription_tag``. A replica that is replaced, e.g. by a container with a new host name on a redeploy,
+    never leaves its subscriptions, so every replica keeps refreshing a key with a TTL and removes the members
+    whose key has expired.
+    """
+    def __init__(
+        self,
+        redis: Redis,
+        subscription_handler,
+        context_id: str,
+        ttl: Optional[float] = None,
+        prefix: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            redis (Redis): The Redis connection holding the keys
+            subscription_handler (SubscriptionHandler): Handler holding the memberships
+            context_id (str): The context ID of the subscriptions
+            ttl (Optional[float]): Seconds a replica counts as alive after its last refresh. Defaults to env ``REPLICA_TTL``.
+            prefix (Optional[str]): Prefix of the keys. Defaults to env ``REPLICA_KEY_PREFIX``.
+        """
+        self.redis = redis
+        self.subscription_handler = subscription_handler
+        self.context_id = context_id
+        self.ttl = ttl or float(os.getenv("REPLICA_TTL", "60"))
+        self.prefix = prefix or os.getenv("REPLICA_KEY_PREFIX", "replica")
+        self.running = False
+
+    def key(self, tag: str) -> str:
+        return f"{self.prefix}:{tag}"
+
+    def beat(self) -> None:
+        """Marks this replica as alive for another TTL."""
+        self.redis.set(self.key(self.subscription_handler.auto_tag), "1", px=int(self.ttl * 1000))
+
+    def sweep(self) -> List[str]:
+        """
+        Removes the memberships of the replicas whose key has expired.
+
+        Returns:
+            List[str]: The member names that were removed
+        """
+        # psycopg2 and the Saxo calls would block the hub
+        tags = tpool.execute(self.subscription_handler.auto_subscription_tags, self.context_id)
+        gone = [
+            tag for tag in tags if tag != self.subscription_handler.auto_tag and not self.redis.exists(self.key(tag))
+        ]
+        for tag in gone:
+            logger.warning(f"Replica {tag} is gone, removing its websocket membership")
+            tpool.execute(self.subscription_handler.remove_all_price_subscriptions, self.context_id, tag)
+        return gone
+
+    def start(self) -> None:
+        self.running = True
+        eventlet.spawn_n(self._run)
+
+    def stop(self) -> None:
+        self.running = False
+
+    def _run(self) -> None:
+        while self.running:
+            try:
+                self.beat()
+                # Only a replica that proved itself alive may judge the others
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Replica heartbeat failed: {e}")
+            eventlet.sleep(self.ttl / 3)
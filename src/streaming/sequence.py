@@ -0,0 +1,52 @@
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SequenceTracker:
+    """Tracks the Saxo message ids of one streaming connection and counts gaps in the sequence.
+
+    Saxo numbers the messages of a connection in one sequence, shared by all ref ids and the control messages,
+    so every message has to be observed, in the order it appears on the wire, for the sequence to be continuous.
+    """
+    def __init__(self) -> None:
+        self._last: Optional[int] = None
+        self._last_ref_id: Optional[str] = None
+        self.gaps = 0
+
+    def observe(self, ref_id: str, msg_id: int) -> Optional[List[str]]:
+        """
+        Records a message id.
+
+        Args:
+            ref_id (str): The reference id of the message
+            msg_id (int): The Saxo message id
+
+        Returns:
+            Optional[List[str]]: None if the message continues the sequence. Otherwise the ref ids whose data may be
+                off: just ``ref_id`` if the message arrived late or twice, or the ref ids of the messages on either
+                side of the gap if messages were skipped, since the skipped ones carry no ref id of their own.
+        """
+        last, last_ref_id = self._last, self._last_ref_id
+        if last is None or msg_id == last + 1:
+            self._last, self._last_ref_id = msg_id, ref_id
+            return None
+        self.gaps += 1
+        if msg_id <= last:
+            logger.warning(f"Message id {msg_id} on {ref_id} arrived after {last} ({self.gaps} gaps so far)")
+            return [ref_id]
+        self._last, self._last_ref_id = msg_id, ref_id
+        logger.warning(
+            f"Message id gap between {last_ref_id} and {ref_id}: expected {last + 1}, got {msg_id} "
+            f"({self.gaps} gaps so far)"
+        )
+        return list(dict.fromkeys((last_ref_id, ref_id)))
+
+    def last(self) -> Optional[int]:
+        return self._last
+
+    def reset(self) -> None:
+        """Forgets the last message id, e.g. after reconnecting, which starts a new sequence."""
+        self._last = None
+        self._last_ref_id = None
@@ -0,0 +1,30 @@
+from typing import List
+import os
+import zlib
+
+
+def shard_count() -> int:
+    """Returns the number of upstream connections to spread the subscriptions over, from env ``STREAM_SHARDS``."""
+    return max(1, int(os.getenv("STREAM_SHARDS", "1")))
+
+
+def shard_for(ref_id: str, shards: int) -> int:
+    """Returns the shard a ref id streams on. Stable across processes and restarts, unlike ``hash``."""
+    return zlib.crc32(ref_id.encode("utf-8")) % shards
+
+
+def shard_context_id(context_id: str, shard: int, shards: int) -> str:
+    """Returns the streaming context id of a shard. A single shard keeps the context id unchanged."""
+    if shards == 1:
+        return context_id
+    return f"{context_id}_{shard}"
+
+
+def shard_context_ids(context_id: str, shards: int) -> List[str]:
+    """Returns the streaming context ids of all shards."""
+    return [shard_context_id(context_id, i, shards) for i in range(shards)]
+
+
+def standby_context_id(context_id: str) -> str:
+    """Returns the context id the standby connection of a streaming context mirrors its subscriptions on."""
+    return f"{context_id}_standby"
@@ -0,0 +1,158 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+import time
+from utils.dict_utils import deep_merge
+
+logger = logging.getLogger(__name__)
+
+
+def merge_snapshot(doc: Any, delta: Any) -> Any:
+    """
+    Merges a streamed delta into a subscription document.
+
+    List subscriptions return their snapshot as ``{"Data": [...]}`` but stream their deltas as bare lists,
+    so those are merged into ``Data``; everything else is merged with ``deep_merge``.
+    """
+    if isinstance(doc, dict) and isinstance(doc.get("Data"), list) and isinstance(delta, list):
+        doc["Data"] = deep_merge(doc["Data"], delta)
+        return doc
+    return deep_merge(doc, delta)
+
+
+def _rows(doc: Any) -> Iterator[Dict[str, Any]]:
+    """Yields the instrument rows of a document: the document itself, or the items of a list subscription."""
+    items = doc.get("Data") if isinstance(doc, dict) and "Data" in doc else doc
+    if isinstance(items, dict):
+        items = [items]
+    if isinstance(items, list):
+        for item in items:
+            if isinstance(item, dict) and "Uic" in item:
+                yield item
+
+
+class SnapshotStore:
+    """Keeps the current document per refId by merging Saxo deltas into the last snapshot."""
+    def __init__(self, base: Optional["SnapshotStore"] = None) -> None:
+        """
+        Args:
+            base (Optional[SnapshotStore]): Store whose document a ref id starts from when its first delta arrives,
+                e.g. the shared store for the one a standby connection keeps. Defaults to starting from the delta.
+        """
+        self.base = base
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._updated: Dict[str, float] = {}
+        self._instruments: Dict[Tuple[int, str], str] = {}
+
+    def _index(self, ref_id: str, doc: Any) -> None:
+        for row in _rows(doc):
+            if "AssetType" in row:
+                self._instruments[(row["Uic"], row["AssetType"])] = ref_id
+
+    def seed(self, ref_id: str, snapshot: Any, msg_id: int = 0) -> None:
+        """
+        Replaces the document of a ref id, e.g. with the snapshot returned when subscribing.
+
+        Args:
+            ref_id (str): The reference id of the subscription
+            snapshot (Any): The full document
+            msg_id (int, optional): The message id the snapshot corresponds to. Defaults to 0.
+        """
+        self._docs[ref_id] = {"refid": ref_id, "msgId": msg_id, "msg": deep_merge(None, snapshot)}
+        self._updated[ref_id] = time.monotonic()
+        self._index(ref_id, self._docs[ref_id]["msg"])
+
+    def apply(self, message: Dict[str, Any]) -> None:
+        """
+        Merges a decoded streaming message into the document of its ref id.
+
+        Args:
+            message (Dict[str, Any]): A message as returned by ``Upstream.decode_ws_msg``
+        """
+        ref_id = message["refid"]
+        doc = self._docs.get(ref_id)
+        if doc is None:
+            base_doc = self.base.get(ref_id) if self.base is not None else None
+            if base_doc is None:
+                self.seed(ref_id, message["msg"], message["msgId"])
+                return
+            self.seed(ref_id, base_doc["msg"], base_doc["msgId"])
+            doc = self._docs[ref_id]
+        doc["msgId"] = message["msgId"]
+        doc["msg"] = merge_snapshot(doc["msg"], message["msg"])
+        self._updated[ref_id] = time.monotonic()
+        # Only the rows of the delta can add instruments; merged rows keep the AssetType indexed from the snapshot
+        self._index(ref_id, message["msg"])
+
+    def touch(self, ref_id: str) -> None:
+        """Marks the document of a ref id as current without changing it, e.g. on a heartbeat."""
+        if ref_id in self._docs:
+            self._updated[ref_id] = time.monotonic()
+
+    def get(self, ref_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the current document of a ref id as ``{"refid", "msgId", "msg"}``, or None if nothing was received.
+        The document is shared with the store and must not be modified.
+        """
+        return self._docs.get(ref_id)
+
+    def age(self, ref_id: str) -> Optional[float]:
+        """Returns the number of seconds since the document of a ref id last changed, or None if there is none."""
+        updated = self._updated.get(ref_id)
+        if updated is None:
+            return None
+        return time.monotonic() - updated
+
+    def find_instrument(self, uic: int, asset_type: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Looks up the streamed row of an instrument in any subscription that contains it.
+
+        Args:
+            uic (int): The UIC of the instrument
+            asset_type (str): The asset type of the instrument
+
+        Returns:
+            Optional[Tuple[Dict[str, Any], float]]: The row and its age in seconds, or None if it is not streamed
+        """
+        ref_id = self._instruments.get((uic, asset_type))
+        doc = self._docs.get(ref_id) if ref_id else None
+        if doc is None:
+            return None
+        for row in _rows(doc["msg"]):
+            if row["Uic"] == uic:
+                return row, time.monotonic() - self._updated[ref_id]
+        return None
+
+    def adopt(self, other: "SnapshotStore") -> List[str]:
+        """
+        Moves the documents of another store into this one, replacing those of the same ref ids, and empties it.
+
+        Args:
+            other (SnapshotStore): The store to take the documents from, e.g. the one a promoted standby kept
+
+        Returns:
+            List[str]: The ref ids whose document changed
+        """
+        changed = []
+        for ref_id, doc in other._docs.items():
+            current = self._docs.get(ref_id)
+            if current is None or current["msg"] != doc["msg"]:
+                changed.append(ref_id)
+            self._docs[ref_id] = doc
+            self._updated[ref_id] = other._updated[ref_id]
+            self._index(ref_id, doc["msg"])
+        other._docs.clear()
+        other._updated.clear()
+        other._instruments.clear()
+        return changed
+
+    def discard(self, ref_id: str) -> None:
+        self._docs.pop(ref_id, None)
+        self._updated.pop(ref_id, None)
+        for key in [key for key, indexed in self._instruments.items() if indexed == ref_id]:
+            del self._instruments[key]
+
+    def ref_ids(self) -> List[str]:
+        return list(self._docs)
+
+# export a singleton store
+snapshots = SnapshotStore()
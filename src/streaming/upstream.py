@@ -2,64 +2,415 @@ import json
 import time
 import struct
 import eventlet
+import requests
 from websocket import WebSocketApp  # websocket-client
-from typing import Any, Dict, Generator
+from typing import Any, Callable, Dict, Generator, List, NamedTuple, Optional, Set
 import logging
+from streaming.sequence import SequenceTracker
+from streaming.snapshots import SnapshotStore
+from streaming.control import ControlMessages, is_control_message
 
 logger = logging.getLogger(__name__)
 
+# Saxo streaming frame layout (little endian): 8 byte message id, 2 reserved bytes,
+# 1 byte ref id size, ref id, 1 byte payload format, 4 byte payload size, payload.
+_MSG_ID = struct.Struct("<Q")
+_RESERVED_SIZE = 2
+_BYTE = struct.Struct("<B")
+_PAYLOAD_SIZE = struct.Struct("<i")
+# The same fields combined, so decoding needs two unpacks per message: message id and ref id size
+# (skipping the reserved bytes), then payload format and payload size.
+_MSG_HEADER = struct.Struct("<Q2xB")
+_PAYLOAD_HEADER = struct.Struct("<Bi")
+
+
+class FrameMessage(NamedTuple):
+    """A single message inside a binary streaming frame."""
+
+    start: int
+    end: int
+    refid: str
+    msg_id: int
+    payload_format: int
+    payload: memoryview
+
+
+class FrameDispatcher:
+    """Feeds binary streaming frames to the snapshot store, the replay buffer and the downstream clients."""
+
+    def __init__(
+        self,
+        clients,
+        snapshots=None,
+        replay=None,
+        observe: Optional[Callable[[str, int], Any]] = None,
+        on_control: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        sinks: Optional[List[Any]] = None,
+    ) -> None:
+        """
+        Args:
+            clients: Receives ``push_all`` with the frame and ``push_ref`` with the messages of each ref id, if given.
+                The control messages are left out of the frame unless ``clients.wants_control`` is set.
+            snapshots (SnapshotStore, optional): Store the decoded messages are merged into
+            replay (ReplayBuffer, optional): Buffer every message is recorded in
+            observe (Optional[Callable[[str, int], Any]]): Called with the ref id and message id of every message in the
+                order they appear in the frame, control messages included
+            on_control (Optional[Callable[[Dict[str, Any]], Any]]): Called with every decoded control message
+            sinks (Optional[List[Any]]): Receive ``write`` with the decoded data messages of every frame, e.g. a QuoteLog
+        """
+        self.clients = clients
+        self.snapshots = snapshots
+        self.replay = replay
+        self.observe = observe
+        self.on_control = on_control
+        self.sinks = sinks or []
+
+    def dispatch(self, raw: bytes) -> None:
+        """
+        Dispatches a binary frame. Control messages are handed to ``on_control`` and only forwarded in the
+        frame to clients that want them, e.g. the fan-out publisher.
+
+        Args:
+            raw (bytes): The frame as received from Saxo
+        """
+        # /ws/all clients get the frame once, /ws/<ref_id> clients only the messages for their ref id
+        decoded: List[Dict[str, Any]] = []
+        data_frames: List[bytes] = []
+        if self.observe is not None:
+            # Message ids run across ref ids, so they are checked before the frame is grouped by ref id
+            for frame_msg in Upstream.iter_frame(raw):
+                self.observe(frame_msg.refid, frame_msg.msg_id)
+        frames = Upstream.split_ws_frame(raw)
+        for refid, frame in frames.items():
+            if is_control_message(refid):
+                for m in Upstream.decode_ws_msg(frame):
+                    logger.debug(f"Control message: {m}")
+                    if self.on_control is not None:
+                        self.on_control(m)
+                continue
+            data_frames.append(frame)
+            messages = list(Upstream.decode_ws_msg(frame))
+            for m in messages:
+                logger.debug(f"Decoded message: {m}")
+                if self.snapshots is not None:
+                    self.snapshots.apply(m)
+            if self.replay is not None:
+                view = memoryview(frame)
+                for frame_msg in Upstream.iter_frame(view):
+                    self.replay.append(refid, frame_msg.msg_id, bytes(view[frame_msg.start:frame_msg.end]))
+            if self.clients is not None:
+                self.clients.push_ref(refid, frame, messages)
+            decoded.extend(messages)
+        if len(data_frames) < len(frames) and not getattr(self.clients, "wants_control", False):
+            # Control traffic stays upstream
+            raw = b"".join(data_frames)
+        if raw and self.clients is not None:
+            self.clients.push_all(raw, decoded)
+        for sink in self.sinks:
+            sink.write(decoded)
+
+
 class Upstream:
     """Maintains one upstream connection to Saxo and fans out messages via Clients."""
 
-    def __init__(self, url: str, token: str, context_id: str, clients) -> None:
-        self.url = f"{url}?contextId={context_id}&authorization=Bearer%20{token}"
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        context_id: str,
+        clients,
+        snapshots=None,
+        replay=None,
+        resubscribe: Optional[Callable[[List[str]], Optional[List[str]]]] = None,
+        sinks: Optional[List[Any]] = None,
+    ) -> None:
+        self.connect_url = url
+        self.context_id = context_id
         self.token = token
         self.clients = clients
+        self.snapshots = snapshots
+        self.replay = replay
+        # Called with the ref ids to recreate after a gap or a reset (empty for all), leaving the connection up.
+        # Returns the ref ids it recreated, whose fresh snapshots are then pushed to the clients.
+        self.resubscribe = resubscribe
+        self.sequences = SequenceTracker()
+        self.control = ControlMessages(
+            on_reset=self._request_resubscribe,
+            on_disconnect=self._disconnect,
+            on_heartbeat=self._on_heartbeat,
+        )
+        self._resubscribing: Set[str] = set()
+        self._resubscribing_all = False
+        self.dispatcher = FrameDispatcher(
+            clients, snapshots, replay, observe=self._observe, on_control=self.control.handle, sinks=sinks
+        )
+        # A standby connection keeps its subscriptions alive and merges its messages into documents of its own,
+        # which replace the shared ones when it takes over; nothing of it reaches the replay buffer or the clients
+        self.active = True
+        self.standby_snapshots = SnapshotStore(base=snapshots) if snapshots is not None else None
+        self._standby_dispatcher = FrameDispatcher(
+            None, self.standby_snapshots, observe=self._observe, on_control=self.control.handle
+        )
+        # Called with this upstream whenever it connects or disconnects
+        self.on_state: Optional[Callable[["Upstream"], Any]] = None
         self.ws: WebSocketApp | None = None
         self.backoff = 1.0
         self.max_backoff = 15.0
+        self.running = False
+
+    @property
+    def connected(self) -> bool:
+        return self.ws is not None and self.ws.sock is not None and bool(self.ws.sock.connected)
+
+    @property
+    def url(self) -> str:
+        return f"{self.connect_url}?contextId={self.context_id}&authorization=Bearer%20{self.token}"
+
+    @property
+    def authorize_url(self) -> str:
+        """The REST endpoint that extends the streaming session, derived from the websocket connect URL."""
+        base = self.connect_url.replace("wss://", "https://", 1).replace("ws://", "http://", 1)
+        if base.endswith("/connect"):
+            base = base[:-len("/connect")]
+        return f"{base}/authorize?contextId={self.context_id}"
+
+    def reauthorize(self, token: str) -> bool:
+        """
+        Hands a new access token to the live streaming session without reconnecting it.
+        The token is also used for the next connection if the socket drops anyway.
+
+        Args:
+            token (str): The new access token
+
+        Returns:
+            bool: True if Saxo accepted the token for the current session
+        """
+        self.token = token
+        if not self.connected:
+            logger.debug("Upstream not connected, new token will be used on connect")
+            return False
+        try:
+            response = requests.put(self.authorize_url, headers={"Authorization": f"Bearer {token}"}, timeout=10)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.error(f"Re-authorizing the streaming session failed: {e}")
+            return False
+        logger.info("Streaming session re-authorized")
+        return True
 
     def start(self) -> None:
         logger.info(f"Starting upstream connection to {self.url[:50]}...")
         logger.debug(f"Using token: {self.token[:10]}...{self.token[-10:]}")
+        self.running = True
         eventlet.spawn_n(self._run_loop)
 
+    def stop(self) -> None:
+        """Closes the connection and stops reconnecting."""
+        self.running = False
+        self._disconnect()
+
+    @staticmethod
+    def iter_frame(raw: bytes) -> Generator[FrameMessage, None, None]:
+        """Walks a binary frame and yields the location and header of every message in it.
+
+        Uses a running offset over a ``memoryview`` so that nothing but the ref id is
+        copied out of the frame; the payload is returned as a view.
+        """
+        view = memoryview(raw)
+        end = len(view)
+        offset = 0
+        while offset < end:
+            start = offset
+            (msgIdentifier,) = _MSG_ID.unpack_from(view, offset)
+            offset += _MSG_ID.size + _RESERVED_SIZE
+            (Srefid,) = _BYTE.unpack_from(view, offset)
+            offset += _BYTE.size
+            refid = str(view[offset:offset + Srefid], "utf-8")
+            offset += Srefid
+            (payloadFmt,) = _BYTE.unpack_from(view, offset)
+            offset += _BYTE.size
+            (payloadSize,) = _PAYLOAD_SIZE.unpack_from(view, offset)
+            offset += _PAYLOAD_SIZE.size
+            if payloadSize < 0 or offset + payloadSize > end:
+                raise struct.error(f"payload of {payloadSize} bytes overruns frame at offset {offset}")
+            payload = view[offset:offset + payloadSize]
+            offset += payloadSize
+            yield FrameMessage(start, offset, refid, msgIdentifier, payloadFmt, payload)
+
     @staticmethod
-    def decode_ws_msg(raw: (bytes)) -> Generator[Dict[str, Any], None, None]:
-        """Binary frame → messages (compatible with your tested dummy)."""
-        while raw:
-            (msgIdentifier,), raw = struct.unpack_from("Q", raw[:8]), raw[8 + 2:]
-            (Srefid,), raw = struct.unpack_from("B", raw[:1]), raw[1:]
-            (refid_bytes,), raw = struct.unpack_from(f"{Srefid}s", raw[:Srefid]), raw[Srefid:]
-            (payloadFmt,), raw = struct.unpack_from("B", raw[:1]), raw[1:]
-            (payloadSize,), raw = struct.unpack_from("i", raw[:4]), raw[4:]
-            (payload,) = struct.unpack_from(f"{payloadSize}s", raw[:payloadSize])
-
-            refid = refid_bytes.decode("utf-8")
+    def decode_ws_msg(raw: bytes) -> Generator[Dict[str, Any], None, None]:
+        """Binary frame → messages (compatible with your tested dummy).
+
+        Walks the frame like ``iter_frame`` but with one unpack per header half and
+        without building a ``FrameMessage``, which keeps single-message frames as
+        cheap to decode as with plain slicing.
+        """
+        end = len(raw)
+        if end == 0:
+            return
+        view = raw if isinstance(raw, memoryview) else memoryview(raw)
+        offset = 0
+        while offset < end:
+            msgIdentifier, Srefid = _MSG_HEADER.unpack_from(view, offset)
+            offset += _MSG_HEADER.size
+            refid = str(view[offset:offset + Srefid], "utf-8")
+            offset += Srefid
+            payloadFmt, payloadSize = _PAYLOAD_HEADER.unpack_from(view, offset)
+            offset += _PAYLOAD_HEADER.size
+            if payloadSize < 0 or offset + payloadSize > end:
+                raise struct.error(f"payload of {payloadSize} bytes overruns frame at offset {offset}")
+            payload = view[offset:offset + payloadSize]
+            offset += payloadSize
             msg: Dict[str, Any] = {"refid": refid, "msgId": msgIdentifier}
             if payloadFmt == 0:
-                msg["msg"] = json.loads(payload.decode("utf-8"))
+                msg["msg"] = json.loads(str(payload, "utf-8"))
             else:
                 try:
-                    msg["msg"] = payload.decode("utf-8")
+                    msg["msg"] = str(payload, "utf-8")
                 except Exception:
                     msg["msg"] = payload.hex()
-            raw = raw[payloadSize:]
             yield msg
 
+    @staticmethod
+    def split_ws_frame(raw: bytes) -> Dict[str, bytes]:
+        """Splits a binary frame into one binary frame per ref id.
+
+        The messages keep their original encoding and order, so every returned
+        frame can be decoded with ``decode_ws_msg`` like the upstream frame.
+        """
+        spans: Dict[str, List[List[int]]] = {}
+        for frame_msg in Upstream.iter_frame(raw):
+            ref_spans = spans.setdefault(frame_msg.refid, [])
+            if ref_spans and ref_spans[-1][1] == frame_msg.start:
+                ref_spans[-1][1] = frame_msg.end
+            else:
+                ref_spans.append([frame_msg.start, frame_msg.end])
+
+        if len(spans) == 1:
+            ((refid, ref_spans),) = spans.items()
+            if len(ref_spans) == 1 and ref_spans[0] == [0, len(raw)]:
+                return {refid: bytes(raw)}
+
+        view = memoryview(raw)
+        return {refid: b"".join(view[s:e] for s, e in ref_spans) for refid, ref_spans in spans.items()}
+
+    @staticmethod
+    def encode_ws_msg(refid: str, msg: Any, msg_id: int = 0) -> bytes:
+        """Message → binary frame in the upstream format, the inverse of ``decode_ws_msg``."""
+        if isinstance(msg, str):
+            payloadFmt, payload = 1, msg.encode("utf-8")
+        else:
+            payloadFmt, payload = 0, json.dumps(msg).encode("utf-8")
+        ref = refid.encode("utf-8")
+        return b"".join((
+            _MSG_ID.pack(msg_id),
+            bytes(_RESERVED_SIZE),
+            _BYTE.pack(len(ref)),
+            ref,
+            _BYTE.pack(payloadFmt),
+            _PAYLOAD_SIZE.pack(len(payload)),
+            payload,
+        ))
+
     def _on_open(self, _ws) -> None:
-        logger.info(f"Upstream connected")
+        logger.info(f"Upstream connected on {self.context_id}")
         self.backoff = 1.0
+        self.sequences.reset()
+        self._notify_state()
 
-    def _on_message(self, _ws, message: Any) -> None:
-        logger.debug(f"Upstream message received: {type(message)} {len(message) if hasattr(message, '__len__') else ''}")
+    def _notify_state(self) -> None:
+        if self.on_state is not None:
+            try:
+                self.on_state(self)
+            except Exception as e:
+                logger.error(f"Upstream state callback failed: {e}")
+
+    def _request_resubscribe(self, ref_ids: List[str]) -> None:
+        """Resubscribes ref ids (all of them when empty) in the background, at most once at a time per ref id."""
+        if self.resubscribe is None:
+            return
+        if not ref_ids:
+            if self._resubscribing_all:
+                return
+            self._resubscribing_all = True
+            eventlet.spawn_n(self._resubscribe, [])
+            return
+        pending = [ref_id for ref_id in ref_ids if ref_id not in self._resubscribing]
+        if not pending:
+            return
+        self._resubscribing.update(pending)
+        eventlet.spawn_n(self._resubscribe, pending)
+
+    def _resubscribe(self, ref_ids: List[str]) -> None:
+        recreated: List[str] = []
         try:
-            for m in self.decode_ws_msg(message):
-                logger.debug(f"Decoded message: {m}")
-                self.clients.push_all(message)
-                self.clients.push_ref(m.get("refid", ""), message)
+            if self.resubscribe is not None:
+                recreated = self.resubscribe(ref_ids) or []
         except Exception as e:
-            logger.warning("Error handling message: %s", e)
+            logger.error(f"Resubscribing {ref_ids or 'all subscriptions'} failed: {e}")
+        finally:
+            if not ref_ids:
+                self._resubscribing_all = False
+            for ref_id in ref_ids:
+                self._resubscribing.discard(ref_id)
+        if self.active:
+            self._push_snapshots(recreated)
+        elif self.standby_snapshots is not None:
+            # Only recreated on this connection, so its documents start over from the shared ones
+            for ref_id in recreated:
+                self.standby_snapshots.discard(ref_id)
+
+    def take_over(self) -> None:
+        """Makes this connection feed the snapshots, the replay buffer and the clients, e.g. a standby whose active
+        connection dropped. The documents it merged as a standby replace the shared ones and the clients get those
+        that differ, so nothing has to be resubscribed."""
+        self.active = True
+        if self.replay is not None:
+            # The buffered message ids belong to the other connection and cannot be resumed from on this one
+            self.replay.clear()
+        if self.snapshots is not None and self.standby_snapshots is not None:
+            self._push_snapshots(self.snapshots.adopt(self.standby_snapshots))
+
+    def _push_snapshots(self, ref_ids: List[str]) -> None:
+        """Sends the current snapshot of each ref id to its clients, e.g. the fresh one after resubscribing,
+        so they resync instead of keeping deltas merged onto lost data."""
+        if self.snapshots is None or self.clients is None:
+            return
+        for ref_id in ref_ids:
+            snapshot = self.snapshots.get(ref_id)
+            if snapshot is None:
+                continue
+            frame = self.encode_ws_msg(snapshot["refid"], snapshot["msg"], snapshot["msgId"])
+            self.clients.push_ref(ref_id, frame, [snapshot])
+
+    def _observe(self, ref_id: str, msg_id: int) -> None:
+        ref_ids = self.sequences.observe(ref_id, msg_id)
+        if ref_ids is None:
+            return
+        # Control messages have no subscription to recreate
+        targets = [target for target in ref_ids if not is_control_message(target)]
+        if targets:
+            self._request_resubscribe(targets)
+
+    def _on_heartbeat(self, ref_id: str, reason: str) -> None:
+        # A subscription without new data is still current
+        if self.snapshots is not None and reason == "NoNewData":
+            self.snapshots.touch(ref_id)
+
+    def _disconnect(self) -> None:
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+
+    def _on_message(self, _ws, message: Any) -> None:
+        logger.debug(f"Upstream message received: {type(message)} {len(message) if hasattr(message, '__len__') else ''}")
+        if isinstance(message, (bytes, bytearray)):
+            try:
+                (self.dispatcher if self.active else self._standby_dispatcher).dispatch(message)
+            except Exception as e:
+                logger.warning("Error handling message: %s", e)
 
         # Optional: reset handling for JSON path
         try:
@@ -74,18 +425,19 @@ class Upstream:
             pass
 
     def _on_error(self, _ws, error: Any) -> None:
-        logger.error("Upstream error:", error)
+        logger.error(f"Upstream {self.context_id} error: {error}")
 
     def _on_close(self, _ws, status_code: Any, msg: Any) -> None:
-        logger.warning("Upstream closed:", status_code, msg)
+        logger.warning(f"Upstream {self.context_id} closed: {status_code} {msg}")
+        self._notify_state()
 
     def _run_loop(self) -> None:
         logger.debug("Starting upstream connection loop")
-        headers = [f"Authorization: Bearer {self.token}"]
-        while True:
+        while self.running:
+            # Rebuilt on every attempt so a reconnect picks up the latest token
             self.ws = WebSocketApp(
                 self.url,
-                header=headers,
+                header=[f"Authorization: Bearer {self.token}"],
                 on_open=self._on_open,
                 on_message=self._on_message,
                 on_error=self._on_error,
@@ -93,9 +445,10 @@ class Upstream:
             )
             try:
                 self.ws.run_forever(ping_interval=20, ping_timeout=10, ping_payload="ping")
-                # TODO handle re-authentication if needed
             except Exception as e:
-                logger.error("run_forever failed:", e)
+                logger.error(f"run_forever failed: {e}")
+            if not self.running:
+                break
 
             delay = self.backoff
             self.backoff = min(self.backoff * 2.0, self.max_backoff)
@@ -1,7 +1,6 @@
 from flask import Blueprint
-from routes import trade, account, price, subscription, health
+from routes import trade, account, price, subscription, health, stream, instruments
 import os
-from streaming.clients import clients
 from flask_sock import Sock
 
 trade_bp = Blueprint("trade", __name__, url_prefix="/trade")
@@ -18,10 +17,14 @@ if os.getenv("ENVIRONMENT") == "development":
 
 
 price_bp = Blueprint("price", __name__, url_prefix="/price")
+price_bp.add_url_rule("/batch", view_func=price.get_batch_prices, methods=["GET", "POST", "OPTIONS"])  # type: ignore
 price_bp.add_url_rule("/<asset>/<asset_type>", view_func=price.get_single_price, methods=["GET", "OPTIONS"])  # type: ignore
 price_bp.add_url_rule('/<asset>/<asset_type>/details', view_func=price.get_price_details, methods=['GET', 'OPTIONS'])  # type: ignore
 price_bp.add_url_rule('/<asset>/<asset_type>/validate/<price>', view_func=price.validate_price, methods=['GET', 'OPTIONS'])  # type: ignore
 
+instruments_bp = Blueprint("instruments", __name__, url_prefix="/instruments")
+instruments_bp.add_url_rule("/search", view_func=instruments.search_instruments, methods=["GET", "OPTIONS"])  # type: ignore
+
 subscription_bp = Blueprint("subscription", __name__, url_prefix="/subscription")
 subscription_bp.add_url_rule("/", view_func=subscription.get_price_subscriptions, methods=["GET", "OPTIONS"])  # type: ignore
 subscription_bp.add_url_rule("/<asset>/<asset_type>", view_func=subscription.price_subscription, methods=["POST", "OPTIONS"])  # type: ignore
@@ -31,37 +34,15 @@ subscription_bp.add_url_rule("/<context_id>", view_func=subscription.get_price_s
 health_bp = Blueprint("health", __name__, url_prefix="/health")
 health_bp.add_url_rule("/", view_func=health.health_check, methods=["GET", "OPTIONS"])  # type: ignore
 health_bp.add_url_rule("/ready", view_func=health.ready_check, methods=["GET", "OPTIONS"])  # type: ignore
+health_bp.add_url_rule("/stats", view_func=health.stats, methods=["GET", "OPTIONS"])  # type: ignore
 
 ws_bp = Blueprint("ws", __name__, url_prefix="/ws")
 ws_sock = Sock(ws_bp)
+ws_sock.route("/all")(stream.ws_all)
+ws_sock.route("/symbol/<asset>/<asset_type>")(stream.ws_symbol)
+ws_sock.route("/<ref_id>")(stream.ws_ref)
 
 
-@ws_sock.route("/all")
-def ws_all(ws):
-    clients.add_all(ws)
-    try:
-        while True:
-            # keep the socket open; ignore inbound data
-            try:
-                _ = ws.receive(timeout=60)
-            except Exception:
-                pass
-    finally:
-        clients.remove_all(ws)
-
-
-@ws_sock.route("/<ref_id>")
-def ws_ref(ws, ref_id):
-    clients.add_ref(ref_id, ws)
-    try:
-        while True:
-            try:
-                _ = ws.receive(timeout=60)
-            except Exception:
-                pass
-    finally:
-        clients.remove_ref(ref_id, ws)
-
 def register_blueprints(app):
     """
     Register all blueprints with the Flask app.
@@ -69,6 +50,7 @@ def register_blueprints(app):
     app.register_blueprint(trade_bp)
     app.register_blueprint(account_bp)
     app.register_blueprint(price_bp)
+    app.register_blueprint(instruments_bp)
     app.register_blueprint(subscription_bp)
     app.register_blueprint(health_bp)
     app.register_blueprint(ws_bp)
@@ -0,0 +1,57 @@
+from copy import deepcopy
+from typing import Any
+
+# Keys that identify the elements of list payloads, e.g. the rows of an infoprices list subscription
+LIST_ITEM_KEYS = ("Uic", "Identifier")
+
+
+def _item_key(item: Any) -> Any:
+    if isinstance(item, dict):
+        for key in LIST_ITEM_KEYS:
+            if key in item:
+                return (key, item[key])
+    return None
+
+
+def deep_merge(base: Any, delta: Any) -> Any:
+    """
+    Merge a Saxo streaming delta into the current state of a document.
+
+    Dictionaries are merged recursively, lists of items identified by ``Uic`` or ``Identifier``
+    are merged item by item, and every other value in the delta replaces the current one.
+    ``base`` is updated in place when possible; ``delta`` is never modified or aliased.
+
+    Args:
+        base (Any): The current state of the document.
+        delta (Any): The partial update.
+
+    Returns:
+        Any: The merged document.
+    """
+    if isinstance(base, dict) and isinstance(delta, dict):
+        for key, value in delta.items():
+            if key in base:
+                base[key] = deep_merge(base[key], value)
+            else:
+                base[key] = deepcopy(value)
+        return base
+
+    if isinstance(base, list) and isinstance(delta, list):
+        index = {}
+        for i, item in enumerate(base):
+            key = _item_key(item)
+            if key is None:
+                return deepcopy(delta)
+            index[key] = i
+        for item in delta:
+            key = _item_key(item)
+            if key is None:
+                return deepcopy(delta)
+            if key in index:
+                base[index[key]] = deep_merge(base[index[key]], item)
+            else:
+                index[key] = len(base)
+                base.append(deepcopy(item))
+        return base
+
+    return deepcopy(delta)
@@ -0,0 +1,93 @@
+from typing import Any, Callable, Dict, Optional
+import threading
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one.
+
+    The first caller of a key runs the call; callers arriving while it is in flight wait for it and share its
+    result, or its exception. Nothing is cached once the call returns.
+    """
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.collapsed = 0
+        self.forgotten = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Runs ``fn`` unless a call for ``key`` is already in flight, in which case its result is returned.
+
+        Args:
+            key (str): Identifies identical calls, e.g. the URL of a GET
+            fn (Callable[[], Any]): The call to run
+
+        Returns:
+            Any: The result of ``fn``, of this or of the concurrent call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                # A forgotten call may have been followed by a new one for the same key
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def forget(self, matches: Callable[[str], bool]) -> int:
+        """
+        Lets the next callers of the matching keys run a new call instead of joining the one in flight, e.g. a
+        GET sent before a write whose result it would not reflect. Callers already waiting still share it.
+
+        Args:
+            matches (Callable[[str], bool]): Selects the keys to forget
+
+        Returns:
+            int: The number of calls in flight that were forgotten
+        """
+        with self._lock:
+            keys = [key for key in self._calls if matches(key)]
+            for key in keys:
+                del self._calls[key]
+            self.forgotten += len(keys)
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns how many calls were run, how many were collapsed into a concurrent one, how many were forgotten
+        while in flight, and how many are in flight."""
+        return {
+            "executed": self.executed,
+            "collapsed": self.collapsed,
+            "forgotten": self.forgotten,
+            "in_flight": len(self._calls),
+        }
+
+
+single_flight = SingleFlight()
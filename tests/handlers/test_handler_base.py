@@ -41,3 +41,66 @@ class TestHandlerBase:
         
         with pytest.raises(ValueError, match="base_url must be a string"):
             HandlerBase(session, base_url)
+
+
+def test_get_coalesces_reference_and_portfolio_paths_by_default(monkeypatch):
+    from unittest.mock import patch
+
+    monkeypatch.delenv("COALESCE_GET_PATHS", raising=False)
+    session = Mock(spec=Session)
+    session.headers = {"Authorization": "Bearer token123"}
+    handler = HandlerBase(session, "https://api.example.com/sim/openapi")
+
+    with patch("handlers.handler_base.single_flight") as flight:
+        handler._get("https://api.example.com/sim/openapi/ref/v1/instruments?KeyWords=AAPL")
+        handler._get("https://api.example.com/sim/openapi/port/v1/balances/me")
+        handler._get("https://api.example.com/sim/openapi/trade/v1/infoprices/list?Uics=1")
+
+    assert [c.args[0] for c in flight.do.call_args_list] == [
+        "https://api.example.com/sim/openapi/ref/v1/instruments?KeyWords=AAPL",
+        "https://api.example.com/sim/openapi/port/v1/balances/me",
+    ]
+    assert [c.args[0] for c in session.get.call_args_list] == [
+        "https://api.example.com/sim/openapi/trade/v1/infoprices/list?Uics=1",
+    ]
+
+
+def test_portfolio_get_after_an_order_does_not_join_one_sent_before(monkeypatch):
+    import eventlet
+    from eventlet.event import Event
+    from unittest.mock import MagicMock
+    from handlers.trade_handler import TradeHandler
+
+    monkeypatch.delenv("COALESCE_GET_PATHS", raising=False)
+    session = Mock(spec=Session)
+    session.headers = {"Authorization": "Bearer token123"}
+    before_order, answers = Event(), iter(["before order", "after order"])
+
+    def get(url):
+        answer = next(answers)
+        if answer == "before order":
+            before_order.wait()
+        return answer
+
+    session.get.side_effect = get
+    handler = TradeHandler(MagicMock(), MagicMock(), session, "https://api.example.com", instruments=MagicMock())
+    url = "https://api.example.com/port/v1/orders/me"
+    in_flight = eventlet.spawn(handler._get, url)
+    eventlet.sleep(0)
+
+    handler.cancel_order(["1"])
+    after = eventlet.spawn(handler._get, url)
+    eventlet.sleep(0)
+    before_order.send()
+
+    assert in_flight.wait() == "before order"
+    assert after.wait() == "after order"
+    assert session.get.call_count == 2
+
+
+def test_coalesced_paths_are_configurable(monkeypatch):
+    monkeypatch.setenv("COALESCE_GET_PATHS", "/trade/v1/infoprices/")
+    session = Mock(spec=Session)
+    session.headers = {"Authorization": "Bearer token123"}
+
+    assert HandlerBase(session, "https://api.example.com").coalesced_paths == ["/trade/v1/infoprices/"]
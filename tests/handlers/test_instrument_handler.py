@@ -0,0 +1,242 @@
+import fnmatch
+import pytest
+from unittest.mock import MagicMock
+from requests import Session
+from handlers.instrument_handler import InstrumentHandler, InstrumentIndex
+from data_models.trading.asset_type import AssetType
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.expiries = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = str(value)
+        self.expiries[key] = ex
+
+    def scan_iter(self, match="*", count=None):
+        return [key for key in self.values if fnmatch.fnmatch(key, match)]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+
+@pytest.fixture
+def mock_session():
+    session = Session()
+    session.get = MagicMock()
+    session.headers["Authorization"] = "Bearer mock-token"
+    session.get.return_value.json.return_value = {"Data": [{"Identifier": 21, "Symbol": "EURUSD", "AssetType": "FxSpot"}]}
+    return session
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+def test_lookup_is_cached_in_process_and_in_redis(mock_session, redis):
+    instruments = InstrumentHandler(mock_session, "https://test-api.saxobank.com", redis, ttl=60)
+
+    assert instruments.get_uic("EURUSD", AssetType.FxSpot) == 21
+    assert instruments.get_uic("eurusd", AssetType.FxSpot) == 21
+
+    mock_session.get.assert_called_once_with("https://test-api.saxobank.com/ref/v1/instruments?KeyWords=EURUSD&AssetType=FxSpot")
+    assert redis.values == {"instrument:uic:FxSpot:eurusd": "21"}
+    assert redis.expiries["instrument:uic:FxSpot:eurusd"] == 60
+
+
+def test_replica_resolves_from_redis(mock_session, redis):
+    InstrumentHandler(mock_session, "https://test-api.saxobank.com", redis).get_uic("EURUSD", AssetType.FxSpot)
+    replica = InstrumentHandler(mock_session, "https://test-api.saxobank.com", redis)
+
+    assert replica.get_uic("EURUSD", AssetType.FxSpot) == 21
+    assert mock_session.get.call_count == 1
+
+
+def test_lru_evicts_least_recently_used(mock_session):
+    instruments = InstrumentHandler(mock_session, "https://test-api.saxobank.com", maxsize=2)
+
+    for symbol in ("A", "B", "A", "C"):
+        instruments.get_uic(symbol, AssetType.Stock)
+
+    assert [key[0] for key in instruments._local] == ["a", "c"]
+
+
+def test_local_entries_expire(mock_session):
+    instruments = InstrumentHandler(mock_session, "https://test-api.saxobank.com", local_ttl=0)
+
+    instruments.get_uic("EURUSD", AssetType.FxSpot)
+    instruments.get_uic("EURUSD", AssetType.FxSpot)
+
+    assert mock_session.get.call_count == 2
+
+
+def test_invalidate_symbol(mock_session, redis):
+    instruments = InstrumentHandler(mock_session, "https://test-api.saxobank.com", redis)
+    instruments.get_uic("EURUSD", AssetType.FxSpot)
+    instruments.get_uic("EURUSD", AssetType.FxForwards)
+
+    instruments.invalidate("EURUSD", AssetType.FxSpot)
+
+    assert list(redis.values) == ["instrument:uic:FxForwards:eurusd"]
+    assert list(instruments._local) == [("eurusd", "FxForwards")]
+    instruments.invalidate()
+    assert not redis.values and not instruments._local
+
+
+def test_misses_and_ambiguous_symbols_are_not_cached(mock_session, redis):
+    instruments = InstrumentHandler(mock_session, "https://test-api.saxobank.com", redis)
+    mock_session.get.return_value.json.return_value = {"Data": [
+        {"Identifier": 1, "Symbol": "ABC:xnas", "AssetType": "Stock"},
+        {"Identifier": 2, "Symbol": "ABC:xnys", "AssetType": "Stock"},
+    ]}
+
+    assert instruments.get_uic("ABC", AssetType.Stock) is None
+    mock_session.get.return_value.json.return_value = {"Data": []}
+    assert instruments.get_uic("NOPE", AssetType.Stock) is None
+
+    assert not redis.values and not instruments._local
+
+
+def test_redis_errors_fall_back_to_api(mock_session):
+    redis = MagicMock()
+    redis.get.side_effect = ConnectionError("down")
+    redis.set.side_effect = ConnectionError("down")
+    instruments = InstrumentHandler(mock_session, "https://test-api.saxobank.com", redis)
+
+    assert instruments.get_uic("EURUSD", AssetType.FxSpot) == 21
+
+
+UNIVERSE = [
+    {"Identifier": 211, "Symbol": "AAPL:xnas", "AssetType": "Stock", "Description": "Apple Inc."},
+    {"Identifier": 212, "Symbol": "AAL:xnas", "AssetType": "Stock", "Description": "American Airlines Group Inc."},
+    {"Identifier": 21, "Symbol": "EURUSD", "AssetType": "FxSpot", "Description": "Euro/US Dollar"},
+    {"Identifier": 21, "Symbol": "EURUSD", "AssetType": "FxForwards", "Description": "Euro/US Dollar"},
+]
+
+
+def test_index_lookups():
+    index = InstrumentIndex(UNIVERSE)
+
+    assert index.get("AAPL:xnas", AssetType.Stock)["Identifier"] == 211
+    assert index.get("aapl", AssetType.Stock)["Identifier"] == 211
+    assert index.get("EURUSD", AssetType.FxSpot)["AssetType"] == "FxSpot"
+    assert index.get("EURUSD", AssetType.Stock) is None
+    assert [item["AssetType"] for item in index.get_by_uic(21)] == ["FxSpot", "FxForwards"]
+    assert index.get_by_uic(21, AssetType.FxForwards) == [UNIVERSE[3]]
+    assert len(index.by_symbol["eurusd"]) == 2
+
+
+def test_index_ambiguous_ticker_is_not_resolved():
+    index = InstrumentIndex(UNIVERSE + [{"Identifier": 311, "Symbol": "AAPL:xmil", "AssetType": "Stock"}])
+
+    assert index.get("AAPL", AssetType.Stock) is None
+    assert index.get("AAPL:xmil", AssetType.Stock)["Identifier"] == 311
+
+
+def test_index_prefix_search():
+    index = InstrumentIndex(UNIVERSE)
+
+    assert [item["Identifier"] for item in index.search_prefix("aa")] == [212, 211]
+    assert [item["AssetType"] for item in index.search_prefix("EUR", AssetType.FxSpot)] == ["FxSpot"]
+    assert len(index.search_prefix("", limit=3)) == 3
+
+
+def test_index_apply_changes():
+    index = InstrumentIndex(UNIVERSE)
+    renamed = {"Identifier": 212, "Symbol": "AAL:xnys", "AssetType": "Stock"}
+    listing = [UNIVERSE[0], renamed, {"Identifier": 213, "Symbol": "MSFT:xnas", "AssetType": "Stock"}]
+
+    changed, removed = index.diff("Stock", listing)
+    assert [item["Identifier"] for item in changed] == [212, 213]
+    assert removed == []
+
+    index.apply(changed, [(211, "Stock")])
+    assert index.get("AAL:xnys", AssetType.Stock) == renamed
+    assert index.get("AAL:xnas", AssetType.Stock) is None
+    assert index.get("aapl", AssetType.Stock) is None
+    assert [item["Identifier"] for item in index.search_prefix("")] == [212, 21, 21, 213]
+
+
+def test_preload_pages_and_resolves_without_searching(mock_session):
+    pages = {
+        "https://test-api.saxobank.com/ref/v1/instruments?AssetTypes=Stock&$top=1000": {"Data": UNIVERSE[:1], "__next": "next"},
+        "next": {"Data": UNIVERSE[1:2]},
+        "https://test-api.saxobank.com/ref/v1/instruments?AssetTypes=FxSpot&$top=1000": {"Data": UNIVERSE[2:3]},
+    }
+    mock_session.get.side_effect = lambda url: MagicMock(json=MagicMock(return_value=pages[url]))
+    instruments = InstrumentHandler(mock_session, "https://test-api.saxobank.com")
+
+    assert instruments.preload(["Stock", "FxSpot"]) == 3
+    mock_session.get.reset_mock()
+
+    assert instruments.get_uic("AAPL", AssetType.Stock) == 211
+    assert instruments.get_uic("EURUSD", AssetType.FxSpot) == 21
+    mock_session.get.assert_not_called()
+
+
+def test_refresh_applies_changes_and_invalidates_cache(mock_session, redis):
+    instruments = InstrumentHandler(mock_session, "https://test-api.saxobank.com", redis)
+    instruments.index = InstrumentIndex(UNIVERSE[:2])
+    redis.set("instrument:uic:Stock:aal", 212)
+    redis.set("instrument:uic:Stock:aapl", 211)
+    mock_session.get.return_value.json.return_value = {"Data": [UNIVERSE[0]]}
+
+    assert instruments.refresh(["Stock"]) == 1
+
+    assert list(redis.values) == ["instrument:uic:Stock:aapl"]
+    assert instruments.index.get("AAL", AssetType.Stock) is None
+    assert instruments.index.get("AAPL", AssetType.Stock)["Identifier"] == 211
+
+
+def test_search_ranks_exact_then_prefix_then_description():
+    index = InstrumentIndex(UNIVERSE + [
+        {"Identifier": 400, "Symbol": "AAPLX:xnas", "AssetType": "Stock", "Description": "Leveraged Fund"},
+        {"Identifier": 401, "Symbol": "PINE:xnas", "AssetType": "Stock", "Description": "Pineapple Farms"},
+        {"Identifier": 402, "Symbol": "APL:xnas", "AssetType": "Stock", "Description": "Apple Hospitality REIT"},
+    ])
+
+    assert [item["Identifier"] for item in index.search("aapl")] == [211, 400]
+    assert [item["Identifier"] for item in index.search("apple")] == [402, 211, 401]
+    assert [item["Identifier"] for item in index.search("airlines")] == [212]
+    assert [item["Identifier"] for item in index.search("apple", limit=1)] == [402]
+
+
+def test_search_filters_asset_type():
+    index = InstrumentIndex(UNIVERSE)
+
+    assert [item["AssetType"] for item in index.search("dollar", AssetType.FxForwards)] == ["FxForwards"]
+    assert index.search("eurusd", AssetType.Stock) == []
+    assert index.search("  ") == []
+
+
+def test_search_follows_applied_changes():
+    index = InstrumentIndex(UNIVERSE)
+    assert index.search("airlines")
+
+    index.apply([{"Identifier": 212, "Symbol": "AAL:xnas", "AssetType": "Stock", "Description": "AA Group"}])
+
+    assert index.search("airlines") == []
+    assert [item["Identifier"] for item in index.search("aa group")] == [212]
+
+
+def test_substring_search_ranks_shorter_descriptions_first_after_changes():
+    index = InstrumentIndex([
+        {"Identifier": 1, "Symbol": "A:xnas", "AssetType": "Stock", "Description": "Northern Energy Holdings"},
+        {"Identifier": 2, "Symbol": "B:xnas", "AssetType": "Stock", "Description": "Solar Energy"},
+    ])
+    assert [item["Identifier"] for item in index.search("nergy")] == [2, 1]
+
+    index.apply([
+        {"Identifier": 3, "Symbol": "C:xnas", "AssetType": "Stock", "Description": "Energy"},
+        {"Identifier": 1, "Symbol": "A:xnas", "AssetType": "Stock", "Description": "Northern Power"},
+    ])
+
+    assert [item["Identifier"] for item in index.search("nergy")] == [3, 2]
+    assert index._ordered["ner"] == [(3, "Stock"), (2, "Stock")]
@@ -234,3 +234,99 @@ def test_get_price_increment_for_asset(price_handler, mock_session, mock_user_ha
     )
     mock_session.get.assert_called_once()
     assert mock_session.get.call_args[0][0] == expected_url
+
+
+STREAMED_ROW = {
+    "Quote": {"Bid": 150.5, "Mid": 151.0, "Ask": 151.5, "DelayedByMinutes": 0, "MarketState": "Open"},
+    "LastUpdated": "2025-05-30T15:45:30.500Z",
+    "AssetType": "Stock",
+    "Uic": 12345,
+    "DisplayAndFormat": {"Symbol": "AAPL", "OrderDecimals": 2, "Format": "Normal", "Currency": "USD"},
+}
+
+
+@pytest.fixture
+def streaming_price_handler(mock_session, mock_user_handler):
+    from streaming.snapshots import SnapshotStore
+
+    snapshots = SnapshotStore()
+    snapshots.seed("TF12345_Stock", {"Data": [STREAMED_ROW]})
+    handler = PriceHandler(mock_user_handler, mock_session, "https://test-api.saxobank.com", "TF_TEST", snapshots, max_staleness=5)
+    handler.get_uic_for_symbol = MagicMock(return_value=12345)
+    handler.get_price_info_for_assets = MagicMock(return_value=[MagicMock(spec=PriceInfo)])
+    return handler
+
+
+def test_get_price_from_stream(streaming_price_handler):
+    price, source = streaming_price_handler.get_price_with_source("AAPL", AssetType.Stock)
+
+    assert source == "stream"
+    assert price.bid == 150.5
+    streaming_price_handler.get_price_info_for_assets.assert_not_called()
+
+
+def test_get_price_falls_back_to_rest_when_stale(streaming_price_handler):
+    streaming_price_handler.max_staleness = -1
+
+    price, source = streaming_price_handler.get_price_with_source("AAPL", AssetType.Stock)
+
+    assert source == "rest"
+    streaming_price_handler.get_price_info_for_assets.assert_called_once_with([12345], AssetType.Stock)
+
+
+def test_get_price_falls_back_to_rest_when_not_streamed(streaming_price_handler):
+    streaming_price_handler.get_uic_for_symbol = MagicMock(return_value=999)
+
+    price, source = streaming_price_handler.get_price_with_source("MSFT", AssetType.Stock)
+
+    assert source == "rest"
+    streaming_price_handler.get_price_info_for_assets.assert_called_once_with([999], AssetType.Stock)
+
+
+def _row(uic, asset_type, symbol):
+    return dict(STREAMED_ROW, Uic=uic, AssetType=asset_type, DisplayAndFormat=dict(STREAMED_ROW["DisplayAndFormat"], Symbol=symbol))
+
+
+def test_get_prices_makes_one_list_call_per_asset_type_chunk(mock_session, mock_user_handler):
+    handler = PriceHandler(mock_user_handler, mock_session, "https://test-api.saxobank.com", "TF_TEST", batch_size=2)
+    uics = {"AAPL": 1, "MSFT": 2, "NVDA": 3, "EURUSD": 21}
+    handler.get_uic_for_symbol = MagicMock(side_effect=lambda symbol, asset_type: uics.get(symbol))
+    handler.get_price_info_for_assets = MagicMock(side_effect=lambda chunk, asset_type: [
+        PriceInfo(_row(uic, asset_type.value, symbol)) for symbol, uic in uics.items() if uic in chunk
+    ])
+
+    prices = handler.get_prices([
+        ("AAPL", AssetType.Stock), ("MSFT", AssetType.Stock), ("NVDA", AssetType.Stock),
+        ("EURUSD", AssetType.FxSpot), ("NOPE", AssetType.Stock),
+    ])
+
+    assert sorted((c.args[1].value, c.args[0]) for c in handler.get_price_info_for_assets.call_args_list) == [
+        ("FxSpot", [21]), ("Stock", [1, 2]), ("Stock", [3]),
+    ]
+    assert {symbol: price.uic if price else None for (symbol, _), price in prices.items()} == {
+        "AAPL": 1, "MSFT": 2, "NVDA": 3, "EURUSD": 21, "NOPE": None,
+    }
+
+
+def test_get_prices_keeps_a_symbol_of_two_asset_types_apart(mock_session, mock_user_handler):
+    handler = PriceHandler(mock_user_handler, mock_session, "https://test-api.saxobank.com", "TF_TEST")
+    handler.get_uic_for_symbol = MagicMock(return_value=21)
+    handler.get_price_info_for_assets = MagicMock(side_effect=lambda chunk, asset_type: [
+        PriceInfo(_row(21, asset_type.value, "EURUSD"))
+    ])
+
+    prices = handler.get_prices([("EURUSD", AssetType.FxSpot), ("EURUSD", AssetType.FxForwards)])
+
+    assert prices[("EURUSD", AssetType.FxSpot)].asset_type == "FxSpot"
+    assert prices[("EURUSD", AssetType.FxForwards)].asset_type == "FxForwards"
+
+
+def test_get_prices_uses_fresh_streamed_prices(streaming_price_handler):
+    streaming_price_handler.get_uic_for_symbol = MagicMock(side_effect=lambda symbol, asset_type: {"AAPL": 12345, "MSFT": 999}[symbol])
+    streaming_price_handler.get_price_info_for_assets = MagicMock(return_value=[])
+
+    prices = streaming_price_handler.get_prices([("AAPL", AssetType.Stock), ("MSFT", AssetType.Stock)])
+
+    assert prices[("AAPL", AssetType.Stock)].bid == 150.5
+    assert prices[("MSFT", AssetType.Stock)] is None
+    streaming_price_handler.get_price_info_for_assets.assert_called_once_with([999], AssetType.Stock)
@@ -0,0 +1,350 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from requests import Session
+from handlers.subscription_handler import SubscriptionHandler, is_auto_subscription_tag, parse_asset_type
+from handlers.price_handler import PriceHandler
+from handlers.user_handler import UserHandler
+from data_models.trading.asset_type import AssetType
+from streaming.snapshots import SnapshotStore
+
+
+@pytest.fixture
+def mock_session():
+    session = Session()
+    session.get = MagicMock()
+    session.post = MagicMock()
+    session.delete = MagicMock()
+    session.headers["Authorization"] = "Bearer mock-token"
+    return session
+
+
+@pytest.fixture
+def mock_user_handler():
+    user_handler = MagicMock(spec=UserHandler)
+    user_handler.default_account_key = "test_account_key"
+    return user_handler
+
+
+@pytest.fixture
+def snapshots():
+    return SnapshotStore()
+
+
+@pytest.fixture
+def subscription_handler(mock_session, mock_user_handler, snapshots):
+    price_handler = MagicMock(spec=PriceHandler)
+    return SubscriptionHandler(price_handler, mock_user_handler, "https://test-api.saxobank.com", mock_session, snapshots)
+
+
+@pytest.fixture
+def mock_database():
+    with patch("handlers.subscription_handler.Database") as database:
+        db = database.return_value.__enter__.return_value
+        yield db
+
+
+def test_parse_asset_type():
+    assert parse_asset_type("FxSpot") == AssetType.FxSpot
+    assert parse_asset_type("AssetType.Stock") == AssetType.Stock
+
+
+def test_subscribe_seeds_snapshot(subscription_handler, mock_session, snapshots):
+    mock_session.post.return_value.json.return_value = {
+        "ReferenceId": "TF21_FxSpot_1000",
+        "Snapshot": {"Data": [{"Uic": 21, "AssetType": "FxSpot"}]},
+    }
+
+    ref_id = subscription_handler._subscribe(21, AssetType.FxSpot, "ctx", 1000, "algo")
+
+    assert ref_id == "TF21_FxSpot_1000"
+    assert snapshots.get("TF21_FxSpot_1000")["msg"] == {"Data": [{"Uic": 21, "AssetType": "FxSpot"}]}
+    body = mock_session.post.call_args.kwargs["json"]
+    assert body["ReferenceId"] == "TF21_FxSpot_1000"
+    assert body["Arguments"]["FieldGroups"] == ["DisplayAndFormat", "Quote"]
+
+
+def test_subscribe_hands_snapshot_to_hook(subscription_handler, mock_session):
+    subscription_handler.on_snapshot = MagicMock()
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot_1000", "Snapshot": {"Uic": 21}}
+
+    subscription_handler._subscribe(21, AssetType.FxSpot, "ctx", 1000, "algo")
+
+    subscription_handler.on_snapshot.assert_called_once_with("TF21_FxSpot_1000", {"Uic": 21})
+
+
+def test_resubscribe_price_subscription(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = [("ctx", "TF21_FxSpot", "algo", 21, "FxSpot", 500, None)]
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot"}
+
+    assert subscription_handler.resubscribe_price_subscription("ctx", "TF21_FxSpot") is True
+
+    mock_session.delete.assert_called_once_with(
+        "https://test-api.saxobank.com/trade/v1/infoprices/subscriptions/ctx/TF21_FxSpot"
+    )
+    body = mock_session.post.call_args.kwargs["json"]
+    assert body["Arguments"]["Uics"] == "21"
+    assert body["RefreshRate"] == 500
+    assert body["Tag"] == "algo"
+
+
+def test_resubscribe_unknown_subscription(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = []
+
+    assert subscription_handler.resubscribe_price_subscription("ctx", "nope") is False
+    mock_session.post.assert_not_called()
+
+
+def test_resubscribe_all_price_subscriptions(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = [
+        ("ctx", "TF21_FxSpot", "algo", 21, "FxSpot", 500, None),
+        ("ctx", "TF21_FxSpot", "other", 21, "FxSpot", 500, None),
+    ]
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot"}
+
+    subscription_handler.resubscribe_price_subscriptions("ctx", [])
+
+    mock_session.delete.assert_called_once_with(
+        "https://test-api.saxobank.com/trade/v1/infoprices/subscriptions/ctx/TF21_FxSpot"
+    )
+
+
+def test_sharded_subscriptions_stream_on_their_shard_context(mock_session, mock_user_handler):
+    from streaming.shards import shard_for
+
+    handler = SubscriptionHandler(MagicMock(spec=PriceHandler), mock_user_handler, "https://test-api.saxobank.com", mock_session, shards=4)
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot"}
+
+    handler._subscribe(21, AssetType.FxSpot, "ctx", 1000, "algo")
+
+    assert mock_session.post.call_args.kwargs["json"]["ContextId"] == f"ctx_{shard_for('TF21_FxSpot_1000', 4)}"
+
+
+def test_sharded_remove_active_clears_every_shard(mock_session, mock_user_handler):
+    handler = SubscriptionHandler(MagicMock(spec=PriceHandler), mock_user_handler, "https://test-api.saxobank.com", mock_session, shards=2)
+
+    assert handler.remove_active_price_subscriptions("ctx") is True
+
+    assert [c.args[0] for c in mock_session.delete.call_args_list] == [
+        "https://test-api.saxobank.com/trade/v1/prices/subscriptions/active/ctx_0",
+        "https://test-api.saxobank.com/trade/v1/prices/subscriptions/active/ctx_1",
+    ]
+
+
+def test_reset_of_one_shard_resubscribes_only_its_subscriptions(mock_session, mock_user_handler, mock_database):
+    from streaming.shards import shard_for
+
+    handler = SubscriptionHandler(MagicMock(spec=PriceHandler), mock_user_handler, "https://test-api.saxobank.com", mock_session, shards=4)
+    ref_ids = [f"TF{uic}_FxSpot" for uic in range(20)]
+    mock_database.execute.return_value = [("ctx", ref_id, "algo", 1, "FxSpot", 500, None) for ref_id in ref_ids]
+
+    with patch.object(handler, "resubscribe_price_subscription") as resubscribe:
+        handler.resubscribe_price_subscriptions("ctx", [], shard=1)
+
+    assert [c.args[1] for c in resubscribe.call_args_list] == [ref_id for ref_id in ref_ids if shard_for(ref_id, 4) == 1]
+
+
+def test_standby_mirrors_subscriptions(mock_session, mock_user_handler, snapshots):
+    handler = SubscriptionHandler(
+        MagicMock(spec=PriceHandler), mock_user_handler, "https://test-api.saxobank.com", mock_session, snapshots, standby=True
+    )
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot", "Snapshot": {"Uic": 21}}
+
+    assert handler._subscribe(21, AssetType.FxSpot, "ctx", 1000, "algo") == "TF21_FxSpot"
+    assert [c.kwargs["json"]["ContextId"] for c in mock_session.post.call_args_list] == ["ctx", "ctx_standby"]
+
+    mock_session.post.reset_mock()
+    snapshots.seed("TF21_FxSpot", {"Uic": 21, "Quote": {"Bid": 1.0}})
+    handler._subscribe(21, AssetType.FxSpot, "ctx", 1000, "algo", standby=True)
+    assert [c.kwargs["json"]["ContextId"] for c in mock_session.post.call_args_list] == ["ctx_standby"]
+    # The standby keeps its own documents until it is promoted
+    assert snapshots.get("TF21_FxSpot")["msg"] == {"Uic": 21, "Quote": {"Bid": 1.0}}
+
+
+def test_resubscribe_with_refresh_rate_override(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = [("ctx", "TF21_FxSpot", "algo", 21, "FxSpot", 500, None)]
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot"}
+
+    assert subscription_handler.resubscribe_price_subscription("ctx", "TF21_FxSpot", refresh_rate=60000) is True
+
+    assert mock_session.post.call_args.kwargs["json"]["RefreshRate"] == 60000
+
+
+def test_resync_keeps_subscriptions_suspended_or_downgraded(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = [
+        ("ctx", "TF21_FxSpot", "algo", 21, "FxSpot", 500, None),
+        ("ctx", "TF22_FxSpot", "algo", 22, "FxSpot", 500, None),
+    ]
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot"}
+    subscription_handler.resubscribe_price_subscription("ctx", "TF21_FxSpot", refresh_rate=60000)
+    subscription_handler.suspend_price_subscription("ctx", "TF22_FxSpot")
+    mock_session.post.reset_mock()
+
+    assert subscription_handler.resubscribe_price_subscriptions("ctx", []) == ["TF21_FxSpot"]
+    assert [c.kwargs["json"]["RefreshRate"] for c in mock_session.post.call_args_list] == [60000]
+
+    mock_session.post.reset_mock()
+    assert subscription_handler.resume_price_subscription("ctx", "TF22_FxSpot") is True
+    assert subscription_handler.resume_price_subscription("ctx", "TF21_FxSpot") is True
+    assert [c.kwargs["json"]["RefreshRate"] for c in mock_session.post.call_args_list] == [500, 500]
+    assert subscription_handler.resubscribe_price_subscriptions("ctx", ["TF21_FxSpot", "TF22_FxSpot"]) == [
+        "TF21_FxSpot", "TF22_FxSpot"
+    ]
+
+
+def test_suspend_keeps_stored_subscription(subscription_handler, mock_session, mock_database):
+    assert subscription_handler.suspend_price_subscription("ctx", "TF21_FxSpot") is True
+
+    mock_session.delete.assert_called_once_with(
+        "https://test-api.saxobank.com/trade/v1/infoprices/subscriptions/ctx/TF21_FxSpot"
+    )
+    mock_database.execute.assert_not_called()
+
+
+def test_reference_id_includes_refresh_rate():
+    assert SubscriptionHandler.reference_id_for(21, AssetType.FxSpot, 1000) == "TF21_FxSpot_1000"
+    assert SubscriptionHandler.reference_id_for(21, AssetType.FxSpot, 250) != SubscriptionHandler.reference_id_for(21, AssetType.FxSpot, 1000)
+
+
+def test_algos_share_one_upstream_subscription(subscription_handler, mock_session, mock_database):
+    subscription_handler.price_handler.get_uic_for_symbol.return_value = 21
+    subscription_handler.on_members_changed = MagicMock()
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot_1000"}
+
+    # First algo: no members yet, so it subscribes at Saxo
+    mock_database.execute.return_value = []
+    assert subscription_handler.create_price_subscription("EURUSD", AssetType.FxSpot, "ctx", 1000, "algo_a") == "TF21_FxSpot_1000"
+    # Second algo joins the existing subscription
+    mock_database.execute.return_value = [("algo_a",)]
+    assert subscription_handler.create_price_subscription("EURUSD", AssetType.FxSpot, "ctx", 1000, "algo_b") == "TF21_FxSpot_1000"
+
+    assert mock_session.post.call_count == 1
+    inserts = [c.args[1] for c in mock_database.execute.call_args_list if "INSERT" in c.args[0]]
+    assert [params[2] for params in inserts] == ["algo_a", "algo_b"]
+    assert subscription_handler.on_members_changed.call_args_list == [(("TF21_FxSpot_1000",),)] * 2
+
+
+def test_member_joining_twice_is_stored_once(subscription_handler, mock_session, mock_database):
+    subscription_handler.price_handler.get_uic_for_symbol.return_value = 21
+    subscription_handler.on_joined = MagicMock()
+    mock_database.execute.return_value = [("algo_a",)]
+
+    assert subscription_handler.create_price_subscription("EURUSD", AssetType.FxSpot, "ctx", 1000, "algo_a") == "TF21_FxSpot_1000"
+
+    mock_session.post.assert_not_called()
+    # The existing subscription may be suspended, so joining it asks for it to be resumed
+    subscription_handler.on_joined.assert_called_once_with("TF21_FxSpot_1000")
+    assert not [c for c in mock_database.execute.call_args_list if "INSERT" in c.args[0]]
+
+
+def test_algo_leaving_keeps_shared_subscription(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = [("algo_b",)]
+
+    assert subscription_handler.remove_price_subscription("ctx", "TF21_FxSpot_1000", algo_name="algo_a") is True
+
+    mock_session.delete.assert_not_called()
+    deletes = [c.args[1] for c in mock_database.execute.call_args_list if c.args[0].startswith("DELETE")]
+    assert deletes == [("ctx", "TF21_FxSpot_1000", "algo_a")]
+
+
+def test_last_algo_leaving_removes_subscription(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = []
+
+    assert subscription_handler.remove_price_subscription("ctx", "TF21_FxSpot_1000", algo_name="algo_a") is True
+
+    mock_session.delete.assert_called_once_with(
+        "https://test-api.saxobank.com/trade/v1/infoprices/subscriptions/ctx/TF21_FxSpot_1000"
+    )
+
+
+def test_last_algo_stays_stored_when_saxo_refuses_removal(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = [("algo_a",)]
+    mock_session.delete.return_value.raise_for_status.side_effect = Exception("503")
+
+    assert subscription_handler.remove_price_subscription("ctx", "TF21_FxSpot_1000", algo_name="algo_a") is False
+
+    assert not [c for c in mock_database.execute.call_args_list if c.args[0].startswith("DELETE")]
+
+
+def test_replicas_hold_separate_auto_memberships(mock_session, mock_user_handler, monkeypatch):
+    monkeypatch.setenv("REPLICA_ID", "replica-1")
+    first = SubscriptionHandler(MagicMock(spec=PriceHandler), mock_user_handler, "https://test-api.saxobank.com", mock_session)
+    monkeypatch.setenv("REPLICA_ID", "replica-2")
+    second = SubscriptionHandler(MagicMock(spec=PriceHandler), mock_user_handler, "https://test-api.saxobank.com", mock_session)
+
+    assert (first.auto_tag, second.auto_tag) == ("ws_auto:replica-1", "ws_auto:replica-2")
+    assert is_auto_subscription_tag(first.auto_tag) and not is_auto_subscription_tag("algo_a")
+
+
+def test_legacy_reference_ids_are_migrated(subscription_handler, mock_database):
+    mock_database.execute.return_value = [
+        ("ctx", "TF21_FxSpot", "algo_a", 21, "FxSpot", 1000, None),
+        ("ctx", "TF21_FxSpot", "algo_b", 21, "AssetType.FxSpot", 1000, None),
+        ("ctx", "TF22_FxSpot_500", "algo_a", 22, "FxSpot", 500, None),
+    ]
+
+    assert subscription_handler.migrate_reference_ids("ctx") == 1
+
+    updates = [c.args[1] for c in mock_database.execute.call_args_list if c.args[0].startswith("UPDATE")]
+    assert updates == [("TF21_FxSpot_1000", "ctx", "TF21_FxSpot")]
+
+
+def test_remove_all_by_tag_leaves_each_subscription(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = [("TF21_FxSpot_1000",), ("TF22_FxSpot_1000",)]
+
+    with patch.object(subscription_handler, "_leave", return_value=True) as leave:
+        assert subscription_handler.remove_all_price_subscriptions("ctx", "algo_a") is True
+
+    assert [c.args for c in leave.call_args_list] == [
+        ("ctx", "TF21_FxSpot_1000", "algo_a"),
+        ("ctx", "TF22_FxSpot_1000", "algo_a"),
+    ]
+    mock_session.delete.assert_not_called()
+
+
+def test_resubscribe_all_subscribes_shared_subscription_once(subscription_handler, mock_session, mock_database):
+    mock_database.execute.return_value = [
+        ("ctx", "TF21_FxSpot_1000", "algo_a", 21, "FxSpot", 1000, None),
+        ("ctx", "TF21_FxSpot_1000", "algo_b", 21, "FxSpot", 1000, None),
+    ]
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot_1000"}
+
+    subscription_handler.resubscribe_all_price_subscriptions("ctx")
+
+    assert mock_session.post.call_count == 1
+    assert mock_session.post.call_args.kwargs["json"]["ReferenceId"] == "TF21_FxSpot_1000"
+
+
+def test_symbol_clients_share_one_auto_subscription(subscription_handler, mock_session, mock_database):
+    subscription_handler.price_handler.get_uic_for_symbol.return_value = 21
+    mock_database.execute.return_value = []
+    mock_session.post.return_value.json.return_value = {"ReferenceId": "TF21_FxSpot_1000"}
+
+    assert subscription_handler.acquire_price_subscription("EURUSD", AssetType.FxSpot, "ctx") == "TF21_FxSpot_1000"
+    assert subscription_handler.acquire_price_subscription("EURUSD", AssetType.FxSpot, "ctx") == "TF21_FxSpot_1000"
+    assert mock_session.post.call_count == 1
+    assert mock_session.post.call_args.kwargs["json"]["Tag"] == subscription_handler.auto_tag
+
+    subscription_handler.release_price_subscription("ctx", "TF21_FxSpot_1000")
+    mock_session.delete.assert_not_called()
+    subscription_handler.release_price_subscription("ctx", "TF21_FxSpot_1000")
+    mock_session.delete.assert_called_once_with(
+        "https://test-api.saxobank.com/trade/v1/infoprices/subscriptions/ctx/TF21_FxSpot_1000"
+    )
+
+
+def test_symbol_clients_reuse_algo_subscription(subscription_handler, mock_session, mock_database):
+    subscription_handler.price_handler.get_uic_for_symbol.return_value = 21
+    mock_database.execute.return_value = [("algo",)]
+
+    assert subscription_handler.acquire_price_subscription("EURUSD", AssetType.FxSpot, "ctx") == "TF21_FxSpot_1000"
+    subscription_handler.release_price_subscription("ctx", "TF21_FxSpot_1000")
+
+    mock_session.post.assert_not_called()
+    mock_session.delete.assert_not_called()
+
+
+def test_unknown_symbol_is_not_streamed(subscription_handler, mock_session):
+    subscription_handler.price_handler.get_uic_for_symbol.return_value = None
+
+    assert subscription_handler.acquire_price_subscription("NOPE", AssetType.Stock, "ctx") is None
+    mock_session.post.assert_not_called()
@@ -0,0 +1,28 @@
+import json
+import struct
+import pytest
+
+
+def _encode_message(refid: str, payload, msg_id: int = 1, payload_format: int = 0) -> bytes:
+    if payload_format == 0:
+        body = json.dumps(payload).encode("utf-8")
+    elif isinstance(payload, str):
+        body = payload.encode("utf-8")
+    else:
+        body = bytes(payload)
+    ref = refid.encode("utf-8")
+    return (
+        struct.pack("<Q", msg_id)
+        + b"\x00\x00"
+        + struct.pack("<B", len(ref))
+        + ref
+        + struct.pack("<B", payload_format)
+        + struct.pack("<i", len(body))
+        + body
+    )
+
+
+@pytest.fixture
+def encode_message():
+    """Encodes a single message in the Saxo streaming binary format."""
+    return _encode_message
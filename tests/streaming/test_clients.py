@@ -0,0 +1,223 @@
+import eventlet
+from eventlet.event import Event
+from streaming.clients import Clients, ClientWriter, OverflowPolicy
+
+
+class FakeWebSocket:
+    def __init__(self, block: bool = False, fail: bool = False):
+        self.sent = []
+        self.closed = False
+        self.gate = Event()
+        self.fail = fail
+        if not block:
+            self.gate.send()
+
+    def unblock(self):
+        self.gate.send()
+
+    def send(self, payload):
+        if self.fail:
+            raise ConnectionError("gone")
+        self.gate.wait()
+        self.sent.append(payload)
+
+    def close(self):
+        self.closed = True
+
+
+def drain():
+    for _ in range(5):
+        eventlet.sleep(0)
+
+
+def test_push_is_delivered_by_writer():
+    registry = Clients(max_queue=10)
+    ws = FakeWebSocket()
+    registry.add_ref("A", ws)
+
+    registry.push_ref("A", b"1")
+    registry.push_ref("B", b"2")
+    drain()
+
+    assert ws.sent == [b"1"]
+    registry.remove_ref("A", ws)
+
+
+def test_slow_client_does_not_block_other_clients():
+    registry = Clients(max_queue=10)
+    slow, fast = FakeWebSocket(block=True), FakeWebSocket()
+    registry.add_all(slow)
+    registry.add_all(fast)
+
+    for i in range(5):
+        registry.push_all(i)
+    drain()
+
+    assert fast.sent == [0, 1, 2, 3, 4]
+    registry.remove_all(slow)
+    registry.remove_all(fast)
+
+
+def test_drop_oldest_policy():
+    ws = FakeWebSocket(block=True)
+    writer = ClientWriter(ws, max_queue=3, policy=OverflowPolicy.DropOldest)
+    drain()
+
+    for i in range(5):
+        writer.put(i)
+
+    assert [payload for _, payload in writer._queue] == [2, 3, 4]
+    assert writer.dropped == 2
+    writer.close()
+
+
+def test_disconnect_policy_unregisters_client():
+    registry = Clients(max_queue=2, policy=OverflowPolicy.Disconnect)
+    ws = FakeWebSocket(block=True)
+    registry.add_ref("A", ws)
+    drain()
+
+    for i in range(4):
+        registry.push_ref("A", i)
+
+    assert ws.closed
+    assert "A" not in registry._by_ref
+    assert ws not in registry._writers
+
+
+def test_conflate_policy_merges_deltas_of_same_ref(encode_message):
+    from streaming.upstream import Upstream
+
+    ws = FakeWebSocket(block=True)
+    writer = ClientWriter(ws, max_queue=3, policy=OverflowPolicy.Conflate)
+    drain()
+    b1 = encode_message("B", {"Quote": {"Bid": 2.0}}, msg_id=2)
+
+    writer.put(encode_message("A", {"Quote": {"Bid": 1.0, "Ask": 1.1}}, msg_id=1), "A")
+    writer.put(b1, "B")
+    writer.put(encode_message("A", {"Quote": {"Bid": 1.05}, "LastUpdated": "t3"}, msg_id=3), "A")
+    writer.put(encode_message("A", {"Quote": {"Ask": 1.2}}, msg_id=4), "A")
+
+    assert [ref_id for ref_id, _ in writer._queue] == ["A", "B", "A"]
+    assert list(Upstream.decode_ws_msg(writer._queue[2][1])) == [
+        {"refid": "A", "msgId": 4, "msg": {"Quote": {"Bid": 1.05, "Ask": 1.2}, "LastUpdated": "t3"}}
+    ]
+    assert writer.dropped == 0
+
+    # Without a queued payload of its ref id, the oldest one is merged into a later one of its own ref id
+    writer.put(encode_message("C", {"Quote": {"Bid": 3.0}}, msg_id=5), "C")
+
+    assert [ref_id for ref_id, _ in writer._queue] == ["B", "A", "C"]
+    assert list(Upstream.decode_ws_msg(writer._queue[1][1]))[0]["msg"] == {
+        "Quote": {"Bid": 1.05, "Ask": 1.2}, "LastUpdated": "t3"
+    }
+    assert writer.dropped == 0
+    writer.close()
+
+
+def test_failed_send_removes_client():
+    registry = Clients(max_queue=10)
+    ws = FakeWebSocket(fail=True)
+    registry.add_all(ws)
+
+    registry.push_all(b"x")
+    drain()
+
+    assert ws not in registry._all
+    assert ws not in registry._writers
+
+
+def test_overflow_policy_from_environment(monkeypatch):
+    monkeypatch.setenv("CLIENT_OVERFLOW_POLICY", "conflate")
+    monkeypatch.setenv("CLIENT_QUEUE_SIZE", "5")
+
+    registry = Clients()
+
+    assert registry.policy is OverflowPolicy.Conflate
+    assert registry.max_queue == 5
+
+
+def test_conflating_writer_sends_latest_merged_state(encode_message):
+    import json
+    from streaming.clients import ConflatingWriter
+
+    ws = FakeWebSocket(block=True)
+    writer = ConflatingWriter(ws)
+    drain()
+
+    writer.put(encode_message("A", {"Quote": {"Bid": 1.0, "Ask": 2.0}}, msg_id=1), "A")
+    writer.put(encode_message("A", {"Quote": {"Bid": 1.1}}, msg_id=2), "A")
+    writer.put(encode_message("A", {"Quote": {"Bid": 1.2}}, msg_id=3), "A")
+
+    assert len(writer) == 1
+    ws.unblock()
+    drain()
+
+    assert json.loads(ws.sent[-1]) == {"refid": "A", "msgId": 3, "msg": {"Quote": {"Bid": 1.2, "Ask": 2.0}}}
+    writer.close()
+
+
+def test_conflating_client_registration(encode_message):
+    import json
+
+    registry = Clients(max_queue=10)
+    raw_ws, conflated_ws = FakeWebSocket(), FakeWebSocket()
+    registry.add_ref("A", raw_ws)
+    registry.add_ref("A", conflated_ws, conflate=True)
+    frame = encode_message("A", {"Bid": 1.0}, msg_id=4)
+
+    registry.push_ref("A", frame)
+    drain()
+
+    assert raw_ws.sent == [frame]
+    assert json.loads(conflated_ws.sent[0])["msg"] == {"Bid": 1.0}
+    registry.remove_ref("A", raw_ws)
+    registry.remove_ref("A", conflated_ws)
+
+
+def test_conflating_writer_rate_limit(encode_message):
+    from streaming.clients import ConflatingWriter
+
+    ws = FakeWebSocket()
+    writer = ConflatingWriter(ws, max_rate=10)
+    drain()
+
+    writer.put(encode_message("A", {"n": 1}, msg_id=1) + encode_message("B", {"n": 1}, msg_id=2))
+    drain()
+    assert len(ws.sent) == 1
+
+    eventlet.sleep(0.15)
+    assert len(ws.sent) == 2
+    writer.close()
+
+
+def test_snapshot_is_sent_on_registration(encode_message):
+    import json
+    from streaming.upstream import Upstream
+
+    registry = Clients(max_queue=10)
+    raw_ws, conflated_ws = FakeWebSocket(), FakeWebSocket()
+    snapshot = {"refid": "A", "msgId": 3, "msg": {"Quote": {"Bid": 1.0, "Ask": 2.0}}}
+
+    registry.add_ref("A", raw_ws, snapshot=snapshot)
+    registry.add_ref("A", conflated_ws, conflate=True, snapshot=snapshot)
+    registry.push_ref("A", encode_message("A", {"Quote": {"Bid": 1.5}}, msg_id=4))
+    drain()
+
+    assert list(Upstream.decode_ws_msg(raw_ws.sent[0])) == [snapshot]
+    assert len(raw_ws.sent) == 2
+    assert json.loads(conflated_ws.sent[-1])["msg"] == {"Quote": {"Bid": 1.5, "Ask": 2.0}}
+    registry.remove_ref("A", raw_ws)
+    registry.remove_ref("A", conflated_ws)
+
+
+def test_backlog_is_sent_before_live_messages():
+    registry = Clients(max_queue=10)
+    ws = FakeWebSocket()
+
+    registry.add_ref("A", ws, backlog=[b"1", b"2"])
+    registry.push_ref("A", b"3")
+    drain()
+
+    assert ws.sent == [b"1", b"2", b"3"]
+    registry.remove_ref("A", ws)
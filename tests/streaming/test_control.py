@@ -0,0 +1,39 @@
+from streaming.control import ControlMessages, is_control_message
+
+
+def test_is_control_message():
+    assert is_control_message("_heartbeat")
+    assert not is_control_message("TF21_FxSpot")
+
+
+def test_heartbeat_records_liveness_per_refid():
+    seen = []
+    control = ControlMessages(on_heartbeat=lambda ref_id, reason: seen.append((ref_id, reason)))
+
+    control.handle({"refid": "_heartbeat", "msgId": 1, "msg": [{
+        "ReferenceId": "_heartbeat",
+        "Heartbeats": [{"OriginatingReferenceId": "A", "Reason": "NoNewData"}, {"OriginatingReferenceId": "B", "Reason": "SubscriptionTemporarilyDisabled"}],
+    }]})
+
+    assert seen == [("A", "NoNewData"), ("B", "SubscriptionTemporarilyDisabled")]
+    assert control.last_heartbeat("A") is not None
+    assert control.last_heartbeat("C") is None
+
+
+def test_reset_subscriptions_passes_targets():
+    resets = []
+    control = ControlMessages(on_reset=resets.append)
+
+    control.handle({"refid": "_resetsubscriptions", "msgId": 1, "msg": {"ReferenceId": "_resetsubscriptions", "TargetReferenceIds": ["A", "B"]}})
+    control.handle({"refid": "_resetsubscriptions", "msgId": 2, "msg": {"ReferenceId": "_resetsubscriptions", "TargetReferenceIds": []}})
+
+    assert resets == [["A", "B"], []]
+
+
+def test_disconnect_calls_handler():
+    disconnects = []
+    control = ControlMessages(on_disconnect=lambda: disconnects.append(True))
+
+    control.handle({"refid": "_disconnect", "msgId": 1, "msg": {"ReferenceId": "_disconnect"}})
+
+    assert disconnects == [True]
@@ -0,0 +1,103 @@
+from unittest.mock import MagicMock
+from streaming.failover import StandbyPair
+from streaming.upstream import Upstream
+
+
+class RecordingClients:
+    def __init__(self):
+        self.all = []
+        self.by_ref = []
+
+    def push_all(self, payload, messages=None):
+        self.all.append(payload)
+
+    def push_ref(self, ref_id, payload, messages=None):
+        self.by_ref.append((ref_id, payload))
+
+
+def _upstream(context_id, clients, connected=True, snapshots=None, resubscribe=None):
+    upstream = Upstream("wss://example/connect", "token", context_id, clients, snapshots, resubscribe=resubscribe)
+    upstream.ws = MagicMock()
+    upstream.ws.sock.connected = connected
+    return upstream
+
+
+def test_only_the_active_connection_is_forwarded(encode_message):
+    clients = RecordingClients()
+    primary, standby = _upstream("ctx", clients), _upstream("ctx_standby", clients)
+    StandbyPair(primary, standby)
+    frame = encode_message("A", {"n": 1}, msg_id=1)
+
+    primary._on_message(None, frame)
+    standby._on_message(None, encode_message("A", {"n": 1}, msg_id=7))
+
+    assert clients.all == [frame]
+    assert standby.sequences.last() == 7
+
+
+def test_standby_is_promoted_when_primary_drops(encode_message):
+    clients = RecordingClients()
+    primary, standby = _upstream("ctx", clients), _upstream("ctx_standby", clients)
+    pair = StandbyPair(primary, standby)
+
+    primary.ws.sock.connected = False
+    primary._on_close(None, 1006, "gone")
+    frame = encode_message("A", {"n": 2}, msg_id=8)
+    standby._on_message(None, frame)
+    primary._on_message(None, encode_message("A", {"n": 2}, msg_id=2))
+
+    assert pair.active is standby and pair.failovers == 1
+    assert standby.active and not primary.active
+    assert clients.all == [frame]
+
+
+def test_no_promotion_while_standby_is_down():
+    primary, standby = _upstream("ctx", RecordingClients()), _upstream("ctx_standby", RecordingClients(), connected=False)
+    pair = StandbyPair(primary, standby)
+
+    primary.ws.sock.connected = False
+    primary._on_close(None, 1006, "gone")
+    assert pair.active is primary
+
+    standby.ws.sock.connected = True
+    standby._on_open(None)
+    assert pair.active is standby
+
+
+def test_promoted_standby_hands_over_its_own_documents_without_resubscribing(encode_message):
+    import eventlet
+    from streaming.replay import ReplayBuffer
+    from streaming.snapshots import SnapshotStore
+
+    clients = RecordingClients()
+    snapshots = SnapshotStore()
+    replay = ReplayBuffer(size=10)
+    resubscribed = []
+    primary = _upstream("ctx", clients, snapshots=snapshots)
+    standby = _upstream("ctx_standby", clients, snapshots=snapshots, resubscribe=resubscribed.append)
+    primary.replay = primary.dispatcher.replay = replay
+    standby.replay = standby.dispatcher.replay = replay
+    StandbyPair(primary, standby)
+    snapshots.seed("A", {"Quote": {"Bid": 1.0, "Ask": 1.1}, "Uic": 21, "AssetType": "FxSpot"})
+    snapshots.seed("B", {"Quote": {"Bid": 2.0}})
+    primary._on_message(None, encode_message("A", {"Quote": {"Bid": 1.05}}, msg_id=40))
+    standby._on_message(None, encode_message("A", {"Quote": {"Bid": 1.05}}, msg_id=3))
+
+    # Only the standby sees the Ask change before the primary's drop is noticed
+    standby._on_message(None, encode_message("A", {"Quote": {"Ask": 1.2}}, msg_id=4))
+    assert snapshots.get("A")["msg"]["Quote"] == {"Bid": 1.05, "Ask": 1.1}
+    primary.ws.sock.connected = False
+    primary._on_close(None, 1006, "gone")
+    eventlet.sleep(0)
+
+    assert resubscribed == []
+    assert snapshots.get("A")["msg"] == {"Quote": {"Bid": 1.05, "Ask": 1.2}, "Uic": 21, "AssetType": "FxSpot"}
+    assert snapshots.get("B")["msg"] == {"Quote": {"Bid": 2.0}}
+    ref_id, frame = clients.by_ref[-1]
+    assert ref_id == "A"
+    assert list(Upstream.decode_ws_msg(frame))[0]["msg"]["Quote"] == {"Bid": 1.05, "Ask": 1.2}
+    # The primary's message ids do not continue on the standby's connection
+    assert replay.since("A", 39) is None
+    standby._on_message(None, encode_message("A", {"Quote": {"Bid": 1.1}}, msg_id=5))
+    assert snapshots.get("A")["msg"]["Quote"]["Bid"] == 1.1
+    assert replay.since("A", 5) == []
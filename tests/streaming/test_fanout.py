@@ -0,0 +1,189 @@
+from unittest.mock import MagicMock
+from streaming.fanout import LeaderElection, RedisFeed, RedisPublisher
+from streaming.upstream import FrameDispatcher
+
+
+class RecordingClients:
+    def __init__(self):
+        self.all = []
+        self.by_ref = []
+
+    def push_all(self, payload, messages=None):
+        self.all.append(payload)
+
+    def push_ref(self, ref_id, payload, messages=None):
+        self.by_ref.append((ref_id, payload))
+
+
+def test_election_transitions_call_back_once():
+    redis = MagicMock()
+    events = []
+    election = LeaderElection(redis, key="leader", ttl=3, on_elected=lambda: events.append("elected"), on_demoted=lambda: events.append("demoted"))
+
+    redis.set.return_value = True
+    assert election.step() is True
+    redis.set.assert_called_once_with("leader", election.identity, nx=True, px=3000)
+
+    redis.eval.return_value = 1
+    assert election.step() is True
+    redis.eval.return_value = 0
+    assert election.step() is False
+
+    assert events == ["elected", "demoted"]
+
+
+def test_election_loses_race():
+    redis = MagicMock()
+    redis.set.return_value = None
+    election = LeaderElection(redis, key="leader", ttl=3, on_elected=MagicMock())
+
+    assert election.step() is False
+    election.on_elected.assert_not_called()
+
+
+def test_leader_steps_down_when_redis_fails():
+    redis = MagicMock()
+    demoted = MagicMock()
+    election = LeaderElection(redis, key="leader", ttl=3, on_demoted=demoted)
+    redis.set.return_value = True
+    election.step()
+
+    redis.eval.side_effect = ConnectionError("down")
+
+    assert election.step() is False
+    demoted.assert_called_once()
+
+
+def test_published_frames_are_dispatched_to_local_clients(encode_message):
+    redis = MagicMock()
+    publisher = RedisPublisher(redis, "frames")
+    a, b = encode_message("A", {"n": 1}, msg_id=1), encode_message("B", {"n": 2}, msg_id=2)
+
+    publisher.push_ref("A", a)
+    publisher.push_all(a + b)
+    channel, frame = redis.publish.call_args.args
+
+    clients = RecordingClients()
+    feed = RedisFeed(MagicMock(), FrameDispatcher(clients), "frames")
+    feed.handle({"type": "message", "channel": channel, "data": frame})
+    feed.handle({"type": "subscribe", "channel": channel, "data": 1})
+
+    assert channel == "frames"
+    assert redis.publish.call_count == 1
+    assert clients.all == [a + b]
+    assert clients.by_ref == [("A", a), ("B", b)]
+
+
+def test_heartbeats_reach_followers_but_not_their_clients(encode_message):
+    from streaming.control import ControlMessages
+    from streaming.snapshots import SnapshotStore
+    from streaming.upstream import Upstream
+
+    redis = MagicMock()
+    quote = encode_message("A", {"Quote": {"Bid": 1.0}}, msg_id=1)
+    heartbeat = encode_message("_heartbeat", [{"ReferenceId": "_heartbeat", "Heartbeats": [{"OriginatingReferenceId": "A", "Reason": "NoNewData"}]}], msg_id=2)
+    Upstream("wss://example", "token", "ctx", RedisPublisher(redis, "frames"))._on_message(None, quote + heartbeat)
+    _, frame = redis.publish.call_args.args
+
+    clients = RecordingClients()
+    snapshots = SnapshotStore()
+    heartbeats = []
+    control = ControlMessages(on_heartbeat=lambda ref_id, reason: heartbeats.append((ref_id, reason)))
+    RedisFeed(MagicMock(), FrameDispatcher(clients, snapshots, on_control=control.handle), "frames").handle(
+        {"type": "message", "channel": "frames", "data": frame}
+    )
+
+    assert frame == quote + heartbeat
+    assert heartbeats == [("A", "NoNewData")]
+    assert clients.all == [quote]
+
+
+def test_takeover_is_undone_when_demoted_meanwhile():
+    from saxo_client import SaxoClient
+
+    saxo_client = SaxoClient.__new__(SaxoClient)
+    saxo_client.upstreams, saxo_client.standby_pairs, saxo_client.term = [], [], 0
+    saxo_client.election = MagicMock(is_leader=True)
+    saxo_client.subscription_handler = MagicMock()
+    upstream = MagicMock()
+
+    def start_upstream(sink):
+        # Demoted while subscribing
+        saxo_client._demote()
+        saxo_client.election.is_leader = False
+        saxo_client.upstreams.append(upstream)
+        return [upstream]
+
+    saxo_client._start_upstream = start_upstream
+    saxo_client._lead(MagicMock())
+
+    upstream.stop.assert_called_once()
+    assert saxo_client.upstreams == []
+    assert saxo_client.subscription_handler.on_snapshot is None
+
+
+def test_published_snapshots_reach_followers_as_control_messages(encode_message):
+    from streaming.control import ControlMessages
+    from streaming.snapshots import SnapshotStore
+
+    redis = MagicMock()
+    publisher = RedisPublisher(redis, "frames")
+    snapshots = SnapshotStore()
+    received = []
+    control = ControlMessages(on_snapshot=lambda *args: received.append(args))
+    feed = RedisFeed(MagicMock(), FrameDispatcher(RecordingClients(), snapshots, on_control=control.handle), "frames")
+
+    feed.handle({"type": "message", "data": encode_message("A", {"Quote": {"Bid": 1.1}}, msg_id=7)})
+    publisher.publish_snapshot("A", {"Uic": 21, "Quote": {"Bid": 1.1, "Ask": 1.2}}, 7)
+    feed.handle({"type": "message", "data": redis.publish.call_args.args[1]})
+
+    assert received == [("A", {"Uic": 21, "Quote": {"Bid": 1.1, "Ask": 1.2}}, 7)]
+    # Control messages are not merged as deltas
+    assert snapshots.ref_ids() == ["A"]
+
+
+def test_follower_snapshot_resyncs_store_and_clients(monkeypatch):
+    from saxo_client import SaxoClient
+    from streaming.clients import Clients
+    from streaming.snapshots import SnapshotStore
+    from streaming.upstream import Upstream
+
+    store, registry = SnapshotStore(), Clients(max_queue=10)
+    monkeypatch.setattr("saxo_client.snapshots", store)
+    monkeypatch.setattr("saxo_client.clients", registry)
+    store.apply({"refid": "A", "msgId": 7, "msg": {"Quote": {"Bid": 1.1}}})
+    pushed = []
+    monkeypatch.setattr(registry, "push_ref", lambda ref_id, payload, messages=None: pushed.append((ref_id, payload)))
+    full = {"Uic": 21, "AssetType": "FxSpot", "Quote": {"Bid": 1.1, "Ask": 1.2}}
+
+    SaxoClient._on_feed_snapshot("A", full, 7)
+    SaxoClient._on_feed_snapshot("A", full, 7)
+
+    assert store.get("A")["msg"] == full
+    assert store.find_instrument(21, "FxSpot") is not None
+    assert [ref_id for ref_id, _ in pushed] == ["A"]
+    assert list(Upstream.decode_ws_msg(pushed[0][1]))[0]["msg"] == full
+
+
+def test_leader_answers_snapshot_requests():
+    import eventlet
+    from saxo_client import SaxoClient
+    from streaming.snapshots import snapshots
+
+    snapshots.seed("TEST_A", {"Quote": {"Bid": 1.0}}, 3)
+    saxo_client = SaxoClient.__new__(SaxoClient)
+    saxo_client.publisher = MagicMock()
+    saxo_client.election = MagicMock(is_leader=False)
+    feed = RedisFeed(MagicMock(), MagicMock(), "frames")
+    feed.request_snapshots()
+
+    saxo_client._on_snapshot_request()
+    eventlet.sleep(0)
+    saxo_client.publisher.publish_snapshot.assert_not_called()
+
+    saxo_client.election.is_leader = True
+    saxo_client._on_snapshot_request()
+    eventlet.sleep(0)
+    saxo_client.publisher.publish_snapshot.assert_any_call("TEST_A", {"Quote": {"Bid": 1.0}}, 3)
+    snapshots.discard("TEST_A")
+    assert feed.redis.publish.call_args.args[0] == "frames"
@@ -0,0 +1,132 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+from redis.exceptions import ResponseError
+from streaming.quote_log import QuoteLog, QuoteLogConsumer
+from streaming.upstream import FrameDispatcher
+
+
+class NullClients:
+    def push_all(self, payload, messages=None):
+        pass
+
+    def push_ref(self, ref_id, payload, messages=None):
+        pass
+
+
+def test_write_appends_per_ref_id_in_one_round_trip():
+    redis = MagicMock()
+    log = QuoteLog(redis, "ref", maxlen=100, prefix="quotes")
+
+    log.write([
+        {"refid": "A", "msgId": 1, "msg": {"Quote": {"Bid": 1.0}}},
+        {"refid": "B", "msgId": 2, "msg": {"Quote": {"Bid": 2.0}}},
+    ])
+
+    pipe = redis.pipeline.return_value
+    redis.pipeline.assert_called_once_with(transaction=False)
+    assert [c.args[0] for c in pipe.xadd.call_args_list] == ["quotes:A", "quotes:B"]
+    assert pipe.xadd.call_args_list[0].args[1] == {"refid": "A", "msgId": 1, "msg": '{"Quote": {"Bid": 1.0}}'}
+    assert pipe.xadd.call_args_list[0].kwargs == {"maxlen": 100, "approximate": True}
+    pipe.execute.assert_called_once()
+
+
+def _wait_for(condition):
+    import eventlet
+
+    for _ in range(100):
+        if condition():
+            return
+        eventlet.sleep(0.01)
+
+
+def test_write_per_tag_caches_lookup():
+    redis = MagicMock()
+    tags = MagicMock(return_value=["algo1", "algo2"])
+    log = QuoteLog(redis, "tag", tags=tags, prefix="quotes")
+    pipe = redis.pipeline.return_value
+
+    log.write([{"refid": "A", "msgId": 1, "msg": {}}, {"refid": "A", "msgId": 2, "msg": {}}])
+    # The lookup runs off the receive path; the messages are held back until it is done
+    assert pipe.xadd.call_count == 0
+    _wait_for(lambda: pipe.xadd.call_count == 4)
+    log.write([{"refid": "A", "msgId": 3, "msg": {}}])
+
+    keys = [(c.args[0], c.args[1]["msgId"]) for c in pipe.xadd.call_args_list]
+    assert keys == [("quotes:algo1", 1), ("quotes:algo2", 1), ("quotes:algo1", 2), ("quotes:algo2", 2), ("quotes:algo1", 3), ("quotes:algo2", 3)]
+    tags.assert_called_once_with("A")
+
+
+def test_expired_tags_are_used_while_refreshing():
+    redis = MagicMock()
+    tags = MagicMock(side_effect=[["algo1"], ["algo2"]])
+    log = QuoteLog(redis, "tag", tags=tags, prefix="quotes")
+    log.write([{"refid": "A", "msgId": 1, "msg": {}}])
+    _wait_for(lambda: "A" in log._tags)
+    log.tag_ttl = -1
+
+    assert log.stream_keys("A") == ["quotes:algo1"]
+    log.tag_ttl = 30
+    _wait_for(lambda: not log._looking_up)
+    assert log.stream_keys("A") == ["quotes:algo2"]
+
+
+def test_tag_log_requires_lookup():
+    with pytest.raises(ValueError):
+        QuoteLog(MagicMock(), "tag")
+
+
+def test_dispatcher_feeds_sinks_once_per_frame(encode_message):
+    sink = MagicMock()
+    dispatcher = FrameDispatcher(NullClients(), sinks=[sink])
+
+    dispatcher.dispatch(encode_message("A", {"n": 1}, msg_id=1) + encode_message("B", {"n": 2}, msg_id=2))
+
+    sink.write.assert_called_once_with([
+        {"refid": "A", "msgId": 1, "msg": {"n": 1}},
+        {"refid": "B", "msgId": 2, "msg": {"n": 2}},
+    ])
+
+
+def _entry(entry_id, msg_id):
+    return (entry_id, {"refid": "A", "msgId": str(msg_id), "msg": json.dumps({"n": msg_id})})
+
+
+def test_consumer_reads_pending_entries_before_new_ones():
+    redis = MagicMock()
+    redis.xreadgroup.side_effect = [
+        [["quotes:A", [_entry("1-0", 1), ("2-0", {})]]],
+        [["quotes:A", []]],
+        [["quotes:A", [_entry("3-0", 3)]]],
+    ]
+    consumer = QuoteLogConsumer(redis, "quotes:A", "analytics", "worker-1")
+
+    assert consumer.read() == [("1-0", {"refid": "A", "msgId": 1, "msg": {"n": 1}})]
+    redis.xack.assert_called_once_with("quotes:A", "analytics", "2-0")
+    assert consumer.read() == []
+    assert consumer.read() == [("3-0", {"refid": "A", "msgId": 3, "msg": {"n": 3}})]
+
+    streams = [c.args[2] for c in redis.xreadgroup.call_args_list]
+    assert streams == [{"quotes:A": "0"}, {"quotes:A": "0"}, {"quotes:A": ">"}]
+
+
+def test_consumer_acknowledges_batch_after_it_was_handled():
+    redis = MagicMock()
+    redis.xreadgroup.side_effect = [[["quotes:A", [_entry("1-0", 1)]]], [["quotes:A", [_entry("2-0", 2)]]]]
+    consumer = QuoteLogConsumer(redis, "quotes:A", "analytics", "worker-1")
+    batches = iter(consumer)
+
+    next(batches)
+    redis.xack.assert_not_called()
+    next(batches)
+
+    redis.xack.assert_called_once_with("quotes:A", "analytics", "1-0")
+
+
+def test_ensure_group_ignores_existing_group():
+    redis = MagicMock()
+    redis.xgroup_create.side_effect = ResponseError("BUSYGROUP Consumer Group name already exists")
+
+    QuoteLogConsumer(redis, "quotes:A", "analytics", "worker-1").ensure_group()
+
+    redis.xgroup_create.assert_called_once_with("quotes:A", "analytics", id="0", mkstream=True)
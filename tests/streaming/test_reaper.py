@@ -0,0 +1,104 @@
+from unittest.mock import MagicMock
+import eventlet
+from streaming.clients import Clients
+from streaming.reaper import SubscriptionReaper, SubscriptionState
+
+
+def _reaper(clients, refs=("A", "B"), algo_name="ws_auto:replica-1", **kwargs):
+    handler = MagicMock()
+    handler.get_price_subscriptions.return_value = [{"reference_id": ref_id, "algo_name": algo_name} for ref_id in refs]
+    handler.resubscribe_price_subscription.return_value = True
+    handler.resume_price_subscription.return_value = True
+    handler.suspend_price_subscription.return_value = True
+    reaper = SubscriptionReaper(clients, handler, "ctx", idle_after=10, suspend_after=100, idle_refresh_rate=60000, **kwargs)
+    return reaper, handler
+
+
+def _wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        eventlet.sleep(0.01)
+
+
+def test_idle_subscriptions_are_downgraded_then_suspended():
+    clients = MagicMock()
+    clients.all_consumers.return_value = 0
+    clients.idle_for.side_effect = lambda ref_id: {"A": 0.0, "B": 50.0}[ref_id]
+    reaper, handler = _reaper(clients)
+
+    reaper.sweep()
+    handler.resubscribe_price_subscription.assert_called_once_with("ctx", "B", refresh_rate=60000)
+    assert reaper.states == {"B": SubscriptionState.Downgraded}
+
+    clients.idle_for.side_effect = lambda ref_id: {"A": 0.0, "B": 150.0}[ref_id]
+    reaper.sweep()
+    reaper.sweep()
+    handler.suspend_price_subscription.assert_called_once_with("ctx", "B")
+    assert reaper.states == {"B": SubscriptionState.Suspended}
+
+
+def test_ws_all_clients_keep_everything_active():
+    clients = MagicMock()
+    clients.all_consumers.return_value = 1
+    clients.idle_for.return_value = 500.0
+    reaper, handler = _reaper(clients)
+
+    reaper.sweep()
+
+    handler.resubscribe_price_subscription.assert_not_called()
+    handler.suspend_price_subscription.assert_not_called()
+
+
+def test_first_client_reinstates_suspended_subscription():
+    clients = Clients(max_queue=10)
+    reaper, handler = _reaper(clients, refs=("A",))
+    reaper.states["A"] = SubscriptionState.Suspended
+    reaper.start()
+    ws = MagicMock()
+
+    clients.add_ref("A", ws)
+    clients.add_ref("A", MagicMock())
+    _wait_for(lambda: handler.resume_price_subscription.called)
+
+    handler.resume_price_subscription.assert_called_once_with("ctx", "A")
+    assert "A" not in reaper.states
+    reaper.stop()
+    clients.remove_ref("A", ws)
+
+
+def test_quote_log_keeps_algo_subscriptions_active():
+    clients = MagicMock()
+    clients.all_consumers.return_value = 0
+    clients.idle_for.return_value = 500.0
+    reaper, handler = _reaper(clients, refs=("A",), algo_name="algo1", quote_log=True)
+    handler.get_price_subscriptions.return_value.append({"reference_id": "B", "algo_name": "ws_auto:replica-1"})
+
+    reaper.sweep()
+
+    handler.suspend_price_subscription.assert_called_once_with("ctx", "B")
+    assert reaper.states == {"B": SubscriptionState.Suspended}
+
+
+def test_algo_joining_reinstates_suspended_subscription():
+    reaper, handler = _reaper(Clients(max_queue=10), refs=("A",))
+    reaper.states["A"] = SubscriptionState.Suspended
+    reaper.start()
+
+    handler.on_joined("A")
+    _wait_for(lambda: handler.resume_price_subscription.called)
+
+    handler.resume_price_subscription.assert_called_once_with("ctx", "A")
+    reaper.stop()
+    assert handler.on_joined is None
+
+
+def test_clients_track_last_consumer():
+    clients = Clients(max_queue=10)
+    ws = MagicMock()
+
+    assert clients.idle_for("A") is None
+    clients.add_ref("A", ws)
+    assert clients.consumers("A") == 1 and clients.idle_for("A") == 0.0
+    clients.remove_ref("A", ws)
+    assert clients.consumers("A") == 0 and clients.idle_for("A") >= 0.0
@@ -0,0 +1,45 @@
+from streaming.replay import ReplayBuffer
+
+
+def test_since_returns_missed_messages():
+    buffer = ReplayBuffer(size=10)
+    for msg_id in range(1, 6):
+        buffer.append("A", msg_id, f"a{msg_id}".encode())
+
+    assert buffer.since("A", 3) == [b"a4", b"a5"]
+    assert buffer.since("A", 5) == []
+
+
+def test_since_returns_none_when_gap_was_evicted():
+    buffer = ReplayBuffer(size=3)
+    for msg_id in range(1, 8):
+        buffer.append("A", msg_id, f"a{msg_id}".encode())
+
+    assert buffer.since("A", 4) == [b"a5", b"a6", b"a7"]
+    assert buffer.since("A", 3) is None
+
+
+def test_since_returns_none_for_unknown_ids():
+    buffer = ReplayBuffer(size=3)
+    buffer.append("A", 10, b"a10")
+
+    assert buffer.since("B", 1) is None
+    assert buffer.since("A", 11) is None
+
+
+def test_restarted_message_ids_reset_the_buffer():
+    buffer = ReplayBuffer(size=10)
+    buffer.append("A", 100, b"old")
+    buffer.append("A", 1, b"new")
+
+    assert buffer.since("A", 50) is None
+    assert buffer.since("A", 1) == []
+
+
+def test_since_all_orders_by_message_id():
+    buffer = ReplayBuffer(size=10)
+    buffer.append("A", 1, b"a1")
+    buffer.append("B", 2, b"b2")
+    buffer.append("A", 3, b"a3")
+
+    assert buffer.since_all(1) == [b"b2", b"a3"]
@@ -0,0 +1,27 @@
+from unittest.mock import MagicMock
+from streaming.replicas import ReplicaRegistry
+
+
+def _registry(live_keys):
+    redis = MagicMock()
+    redis.exists.side_effect = lambda key: key in live_keys
+    handler = MagicMock()
+    handler.auto_tag = "ws_auto:replica-1"
+    handler.auto_subscription_tags.return_value = ["ws_auto:replica-1", "ws_auto:replica-2", "ws_auto:old-host"]
+    return ReplicaRegistry(redis, handler, "ctx", ttl=30, prefix="replica"), redis, handler
+
+
+def test_beat_refreshes_own_key():
+    registry, redis, _ = _registry(set())
+
+    registry.beat()
+
+    redis.set.assert_called_once_with("replica:ws_auto:replica-1", "1", px=30000)
+
+
+def test_sweep_removes_memberships_of_replicas_that_are_gone():
+    registry, _, handler = _registry({"replica:ws_auto:replica-2"})
+
+    assert registry.sweep() == ["ws_auto:old-host"]
+
+    handler.remove_all_price_subscriptions.assert_called_once_with("ctx", "ws_auto:old-host")
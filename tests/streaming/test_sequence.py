@@ -0,0 +1,41 @@
+from streaming.sequence import SequenceTracker
+
+
+def test_ids_shared_by_refids_and_control_messages_are_not_gaps():
+    tracker = SequenceTracker()
+    messages = [("A", 1), ("B", 2), ("A", 3), ("_heartbeat", 4), ("B", 5)]
+
+    assert [tracker.observe(ref_id, msg_id) for ref_id, msg_id in messages] == [None] * 5
+    assert tracker.gaps == 0
+    assert tracker.last() == 5
+
+
+def test_skipped_ids_affect_the_refids_around_the_gap():
+    tracker = SequenceTracker()
+    tracker.observe("A", 1)
+
+    assert tracker.observe("B", 4) == ["A", "B"]
+    assert tracker.observe("A", 5) is None
+    assert tracker.observe("A", 7) == ["A"]
+    assert tracker.gaps == 2
+
+
+def test_late_and_repeated_ids_affect_their_refid():
+    tracker = SequenceTracker()
+    tracker.observe("A", 1)
+    tracker.observe("B", 2)
+
+    assert tracker.observe("A", 2) == ["A"]
+    assert tracker.observe("B", 1) == ["B"]
+    assert tracker.last() == 2
+    assert tracker.gaps == 2
+
+
+def test_reset_starts_a_new_sequence():
+    tracker = SequenceTracker()
+    tracker.observe("A", 10)
+
+    tracker.reset()
+
+    assert tracker.observe("A", 1) is None
+    assert tracker.last() == 1
@@ -0,0 +1,17 @@
+from streaming.shards import shard_context_id, shard_context_ids, shard_for
+
+
+def test_shard_for_is_stable_and_in_range():
+    ref_ids = [f"TF{uic}_FxSpot" for uic in range(200)]
+
+    shards = [shard_for(ref_id, 4) for ref_id in ref_ids]
+
+    assert shards == [shard_for(ref_id, 4) for ref_id in ref_ids]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shard_for("TF21_FxSpot", 1) == 0
+
+
+def test_single_shard_keeps_context_id():
+    assert shard_context_id("TF_PROD", 0, 1) == "TF_PROD"
+    assert shard_context_ids("TF_PROD", 1) == ["TF_PROD"]
+    assert shard_context_ids("TF_PROD", 3) == ["TF_PROD_0", "TF_PROD_1", "TF_PROD_2"]
@@ -0,0 +1,79 @@
+from streaming.snapshots import SnapshotStore
+
+
+def test_deltas_are_merged_into_seeded_snapshot():
+    store = SnapshotStore()
+    store.seed("TF21_FxSpot", {"Data": [{"Uic": 21, "Quote": {"Bid": 1.0, "Ask": 1.1}}], "MaxRows": 1})
+
+    store.apply({"refid": "TF21_FxSpot", "msgId": 5, "msg": [{"Uic": 21, "Quote": {"Bid": 1.05}}]})
+
+    doc = store.get("TF21_FxSpot")
+    assert doc["msgId"] == 5
+    assert doc["msg"] == {"Data": [{"Uic": 21, "Quote": {"Bid": 1.05, "Ask": 1.1}}], "MaxRows": 1}
+
+
+def test_first_message_becomes_the_document():
+    store = SnapshotStore()
+
+    store.apply({"refid": "A", "msgId": 1, "msg": {"Quote": {"Bid": 1.0}}})
+    store.apply({"refid": "A", "msgId": 2, "msg": {"Quote": {"Ask": 2.0}}})
+
+    assert store.get("A")["msg"] == {"Quote": {"Bid": 1.0, "Ask": 2.0}}
+    assert store.age("A") is not None
+
+
+def test_discard():
+    store = SnapshotStore()
+    store.seed("A", {"a": 1})
+
+    store.discard("A")
+
+    assert store.get("A") is None
+    assert store.age("A") is None
+    assert store.ref_ids() == []
+
+
+def test_find_instrument_after_delta():
+    store = SnapshotStore()
+    store.seed("TF21_FxSpot", {"Data": [{"Uic": 21, "AssetType": "FxSpot", "Quote": {"Bid": 1.0}}]})
+    store.apply({"refid": "TF21_FxSpot", "msgId": 2, "msg": [{"Uic": 21, "Quote": {"Bid": 1.2}}]})
+
+    row, age = store.find_instrument(21, "FxSpot")
+
+    assert row["Quote"]["Bid"] == 1.2
+    assert age >= 0
+    assert store.find_instrument(21, "Stock") is None
+
+    store.discard("TF21_FxSpot")
+    assert store.find_instrument(21, "FxSpot") is None
+
+
+def test_store_with_base_starts_from_its_document_and_adopt_moves_it():
+    shared = SnapshotStore()
+    shared.seed("A", {"Uic": 21, "AssetType": "FxSpot", "Quote": {"Bid": 1.0, "Ask": 1.1}})
+    shared.seed("B", {"Quote": {"Bid": 2.0}})
+    standby = SnapshotStore(base=shared)
+
+    standby.apply({"refid": "A", "msgId": 3, "msg": {"Quote": {"Ask": 1.2}}})
+    standby.apply({"refid": "B", "msgId": 4, "msg": {"Quote": {"Bid": 2.0}}})
+    assert shared.get("A")["msg"]["Quote"]["Ask"] == 1.1
+
+    assert shared.adopt(standby) == ["A"]
+    assert shared.get("A")["msg"] == {"Uic": 21, "AssetType": "FxSpot", "Quote": {"Bid": 1.0, "Ask": 1.2}}
+    assert shared.find_instrument(21, "FxSpot")[0]["Quote"]["Ask"] == 1.2
+    assert standby.ref_ids() == []
+
+
+def test_deltas_only_index_their_own_rows(monkeypatch):
+    store = SnapshotStore()
+    store.seed("L", {"Data": [{"Uic": uic, "AssetType": "FxSpot", "Quote": {"Bid": 1.0}} for uic in range(100)]})
+    indexed = []
+    index = store._index
+    monkeypatch.setattr(store, "_index", lambda ref_id, doc: indexed.append(doc) or index(ref_id, doc))
+
+    store.apply({"refid": "L", "msgId": 2, "msg": [{"Uic": 5, "Quote": {"Bid": 1.5}}]})
+    store.apply({"refid": "L", "msgId": 3, "msg": [{"Uic": 100, "AssetType": "Stock", "Quote": {"Bid": 9.0}}]})
+
+    assert indexed == [[{"Uic": 5, "Quote": {"Bid": 1.5}}], [{"Uic": 100, "AssetType": "Stock", "Quote": {"Bid": 9.0}}]]
+    assert store.find_instrument(5, "FxSpot")[0]["Quote"]["Bid"] == 1.5
+    assert store.find_instrument(100, "Stock")[0]["Quote"]["Bid"] == 9.0
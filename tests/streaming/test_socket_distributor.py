@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+from socket_distributor import SocketDistributor
+from streaming.upstream import FrameDispatcher
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def _distributor(clients=None, **kwargs):
+    session = MagicMock()
+    session.post.return_value.status_code = 201
+    distributor = SocketDistributor(
+        session, "https://example/subscriptions", "wss://example/connect", clients=clients, upstream=MagicMock(context_id="ctx"), **kwargs
+    )
+    return distributor, session
+
+
+def test_callbacks_and_fanout_share_one_decode(encode_message):
+    clients = MagicMock()
+    distributor, session = _distributor(clients, batch_window=0.01)
+    received = []
+
+    async def on_quote(message):
+        received.append(message)
+
+    distributor.add_subscriber(21, "FxSpot", on_quote)
+    distributor.add_subscriber(21, "FxSpot", received.append)
+    assert _wait_for(lambda: session.post.called)
+    assert session.post.call_args.kwargs["json"]["ReferenceId"] == "uic_21"
+    frame = encode_message("uic_21", [{"Uic": 21, "Quote": {"Bid": 1.0}}], msg_id=3) + encode_message("other", {}, msg_id=4)
+
+    FrameDispatcher(distributor).dispatch(frame)
+
+    assert _wait_for(lambda: len(received) == 2)
+    assert received[0] == {"message_id": 3, "ref_id": "uic_21", "payload": {"Uic": 21, "Quote": {"Bid": 1.0}}}
+    assert distributor.subscriptions[21]["last_message"] == received[0]
+    clients.push_all.assert_called_once()
+    assert [c.args[0] for c in clients.push_ref.call_args_list] == ["uic_21", "other"]
+
+
+def test_subscriptions_within_window_are_batched(encode_message):
+    distributor, session = _distributor(batch_window=0.05, max_batch=3)
+    received = {}
+
+    for uic in range(1, 6):
+        distributor.add_subscriber(uic, "FxSpot", lambda message, uic=uic: received.setdefault(uic, []).append(message))
+    distributor.add_subscriber(99, "Stock", lambda message: None)
+
+    assert _wait_for(lambda: session.post.call_count == 3)
+    bodies = sorted((c.kwargs["json"] for c in session.post.call_args_list), key=lambda body: body["ReferenceId"])
+    assert [body["Arguments"]["Uics"] for body in bodies] == ["99", "1,2,3", "4,5"]
+    batch_ref_id = distributor.subscriptions[1]["ref_id"]
+
+    FrameDispatcher(distributor).dispatch(encode_message(batch_ref_id, [{"Uic": 2, "Quote": {"Bid": 1.0}}, {"Uic": 3, "Quote": {"Bid": 2.0}}]))
+
+    assert _wait_for(lambda: len(received) == 2)
+    assert received[2][0]["payload"] == {"Uic": 2, "Quote": {"Bid": 1.0}}
+    assert received[3][0]["payload"] == {"Uic": 3, "Quote": {"Bid": 2.0}}
+
+
+def test_subscribe_call_does_not_block_the_loop():
+    distributor, session = _distributor(batch_window=0.0)
+    session.post.side_effect = lambda *args, **kwargs: time.sleep(0.3) or MagicMock(status_code=201)
+    distributor.add_subscriber(21, "FxSpot", lambda message: None)
+    assert _wait_for(lambda: session.post.called)
+
+    started = time.monotonic()
+    future = asyncio.run_coroutine_threadsafe(_noop(), distributor.loop)
+    future.result(timeout=1)
+
+    assert time.monotonic() - started < 0.2
+
+
+async def _noop():
+    return None
+
+
+def test_last_subscriber_leaving_unsubscribes_after_linger():
+    distributor, session = _distributor(batch_window=0.0, linger=0.05)
+    session.delete.return_value.status_code = 202
+    callback = MagicMock()
+    distributor.add_subscriber(21, "FxSpot", callback)
+    assert _wait_for(lambda: session.post.called)
+
+    distributor.remove_subscriber(21, callback)
+
+    assert _wait_for(lambda: session.delete.called)
+    session.delete.assert_called_once_with("https://example/subscriptions/ctx/uic_21")
+    assert 21 not in distributor.subscriptions
+    assert "uic_21" not in distributor.ref_to_uics
+
+
+def test_resubscribing_within_linger_keeps_subscription():
+    distributor, session = _distributor(batch_window=0.0, linger=0.1)
+    callback = MagicMock()
+    distributor.add_subscriber(21, "FxSpot", callback)
+    assert _wait_for(lambda: session.post.called)
+
+    distributor.remove_subscriber(21, callback)
+    time.sleep(0.02)
+    distributor.add_subscriber(21, "FxSpot", callback)
+    time.sleep(0.2)
+
+    session.delete.assert_not_called()
+    assert session.post.call_count == 1
+    assert distributor.subscriptions[21]["subscribers"] == {callback}
+
+
+def test_batch_is_deleted_once_every_uic_is_released():
+    distributor, session = _distributor(batch_window=0.02, linger=0.02)
+    session.delete.return_value.status_code = 202
+    callbacks = {uic: MagicMock() for uic in (1, 2)}
+    for uic, callback in callbacks.items():
+        distributor.add_subscriber(uic, "FxSpot", callback)
+    assert _wait_for(lambda: session.post.called)
+    ref_id = distributor.subscriptions[1]["ref_id"]
+
+    distributor.remove_subscriber(1, callbacks[1])
+    assert _wait_for(lambda: 1 not in distributor.subscriptions)
+    session.delete.assert_not_called()
+
+    distributor.remove_subscriber(2, callbacks[2])
+    assert _wait_for(lambda: session.delete.called)
+    session.delete.assert_called_once_with(f"https://example/subscriptions/ctx/{ref_id}")
+
+
+def test_uic_released_before_its_batch_is_sent_is_skipped():
+    distributor, session = _distributor()
+
+    asyncio.run_coroutine_threadsafe(distributor._subscribe([21, 22], "FxSpot"), distributor.loop).result(timeout=1)
+    distributor.subscriptions[22] = {"ref_id": None, "asset_type": "FxSpot", "last_message": None, "subscribers": set(), "linger": None}
+    asyncio.run_coroutine_threadsafe(distributor._subscribe([21, 22], "FxSpot"), distributor.loop).result(timeout=1)
+
+    session.post.assert_called_once()
+    assert session.post.call_args.kwargs["json"]["Arguments"]["Uics"] == "22"
+    assert distributor.subscriptions[22]["ref_id"] == "uic_22"
+
+
+def test_subscribers_added_while_releasing_do_not_race():
+    distributor, session = _distributor(batch_window=0.0, linger=0.0)
+    session.delete.return_value.status_code = 202
+    errors = []
+    distributor.loop.set_exception_handler(lambda loop, context: errors.append(context))
+    callbacks = [MagicMock() for _ in range(4)]
+
+    def churn(callback):
+        try:
+            for _ in range(200):
+                distributor.add_subscriber(21, "FxSpot", callback)
+                distributor.remove_subscriber(21, callback)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=churn, args=(callback,)) for callback in callbacks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    distributor.add_subscriber(21, "FxSpot", callbacks[0])
+
+    assert _wait_for(lambda: distributor.subscriptions.get(21, {}).get("subscribers") == {callbacks[0]})
+    assert errors == []
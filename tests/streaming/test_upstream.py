@@ -0,0 +1,289 @@
+import struct
+import pytest
+from streaming.upstream import Upstream
+
+
+def test_decode_single_json_message(encode_message):
+    frame = encode_message("TF211_Stock", {"Quote": {"Bid": 1.5}}, msg_id=7)
+
+    messages = list(Upstream.decode_ws_msg(frame))
+
+    assert messages == [{"refid": "TF211_Stock", "msgId": 7, "msg": {"Quote": {"Bid": 1.5}}}]
+
+
+def test_decode_multiple_messages(encode_message):
+    frame = b"".join(
+        encode_message(f"TF{i}_Stock", {"Uic": i}, msg_id=i) for i in range(1, 21)
+    )
+
+    messages = list(Upstream.decode_ws_msg(frame))
+
+    assert [m["msgId"] for m in messages] == list(range(1, 21))
+    assert [m["refid"] for m in messages] == [f"TF{i}_Stock" for i in range(1, 21)]
+    assert messages[-1]["msg"] == {"Uic": 20}
+
+
+def test_decode_text_and_binary_payloads(encode_message):
+    frame = encode_message("text", "hello", payload_format=1) + encode_message("bin", b"\xff\xfe", payload_format=1)
+
+    messages = list(Upstream.decode_ws_msg(frame))
+
+    assert messages[0]["msg"] == "hello"
+    assert messages[1]["msg"] == "fffe"
+
+
+def test_decode_accepts_bytearray_and_memoryview(encode_message):
+    frame = encode_message("ref", {"a": 1})
+
+    assert list(Upstream.decode_ws_msg(bytearray(frame)))[0]["msg"] == {"a": 1}
+    assert list(Upstream.decode_ws_msg(memoryview(frame)))[0]["msg"] == {"a": 1}
+
+
+def test_decode_empty_frame():
+    assert list(Upstream.decode_ws_msg(b"")) == []
+
+
+def test_decode_truncated_frame_raises(encode_message):
+    frame = encode_message("ref", {"a": 1})
+
+    with pytest.raises(struct.error):
+        list(Upstream.decode_ws_msg(frame[:-3]))
+
+
+def test_split_groups_messages_by_refid(encode_message):
+    a1 = encode_message("A", {"n": 1}, msg_id=1)
+    b1 = encode_message("B", {"n": 2}, msg_id=2)
+    a2 = encode_message("A", {"n": 3}, msg_id=3)
+
+    frames = Upstream.split_ws_frame(a1 + b1 + a2)
+
+    assert frames == {"A": a1 + a2, "B": b1}
+    assert [m["msgId"] for m in Upstream.decode_ws_msg(frames["A"])] == [1, 3]
+
+
+def test_split_single_refid_returns_whole_frame(encode_message):
+    frame = encode_message("A", {"n": 1}, msg_id=1) + encode_message("A", {"n": 2}, msg_id=2)
+
+    assert Upstream.split_ws_frame(frame) == {"A": frame}
+
+
+class RecordingClients:
+    def __init__(self):
+        self.all = []
+        self.by_ref = []
+
+    def push_all(self, payload, messages=None):
+        self.all.append(payload)
+
+    def push_ref(self, ref_id, payload, messages=None):
+        self.by_ref.append((ref_id, payload))
+
+
+def test_on_message_pushes_each_refid_once(encode_message):
+    clients = RecordingClients()
+    upstream = Upstream("wss://example", "token", "ctx", clients)
+    messages = [encode_message(f"R{i % 2}", {"n": i}, msg_id=i) for i in range(20)]
+    frame = b"".join(messages)
+
+    upstream._on_message(None, frame)
+
+    assert clients.all == [frame]
+    assert dict(clients.by_ref) == {
+        "R0": b"".join(messages[0::2]),
+        "R1": b"".join(messages[1::2]),
+    }
+    assert len(clients.by_ref) == 2
+
+
+def test_encode_round_trip():
+    frame = Upstream.encode_ws_msg("TF21_FxSpot", {"Quote": {"Bid": 1.0}}, msg_id=42) + Upstream.encode_ws_msg("t", "text")
+
+    assert list(Upstream.decode_ws_msg(frame)) == [
+        {"refid": "TF21_FxSpot", "msgId": 42, "msg": {"Quote": {"Bid": 1.0}}},
+        {"refid": "t", "msgId": 0, "msg": "text"},
+    ]
+
+
+def test_on_message_feeds_snapshot_store(encode_message):
+    from streaming.snapshots import SnapshotStore
+
+    snapshots = SnapshotStore()
+    upstream = Upstream("wss://example", "token", "ctx", RecordingClients(), snapshots)
+
+    upstream._on_message(None, encode_message("A", {"Quote": {"Bid": 1.0, "Ask": 2.0}}, msg_id=1))
+    upstream._on_message(None, encode_message("A", {"Quote": {"Bid": 1.5}}, msg_id=2))
+
+    assert snapshots.get("A") == {"refid": "A", "msgId": 2, "msg": {"Quote": {"Bid": 1.5, "Ask": 2.0}}}
+
+
+def test_on_message_records_messages_for_replay(encode_message):
+    from streaming.replay import ReplayBuffer
+
+    replay = ReplayBuffer(size=10)
+    upstream = Upstream("wss://example", "token", "ctx", RecordingClients(), replay=replay)
+    a1, b2, a3 = encode_message("A", {"n": 1}, msg_id=1), encode_message("B", {"n": 2}, msg_id=2), encode_message("A", {"n": 3}, msg_id=3)
+
+    upstream._on_message(None, a1 + b2 + a3)
+
+    assert replay.since("A", 1) == [a3]
+    assert replay.since_all(0) == [a1, b2, a3]
+
+
+def test_interleaved_refids_and_heartbeats_are_not_gaps(encode_message):
+    import eventlet
+
+    resubscribed = []
+    upstream = Upstream("wss://example", "token", "ctx", RecordingClients(), resubscribe=resubscribed.append)
+    heartbeat = [{"ReferenceId": "_heartbeat", "Heartbeats": [{"OriginatingReferenceId": "A", "Reason": "NoNewData"}]}]
+
+    upstream._on_message(None, encode_message("A", {}, msg_id=1) + encode_message("B", {}, msg_id=2))
+    upstream._on_message(None, encode_message("A", {}, msg_id=3) + encode_message("_heartbeat", heartbeat, msg_id=4))
+    upstream._on_message(None, encode_message("B", {}, msg_id=5))
+    eventlet.sleep(0)
+
+    assert resubscribed == []
+    assert upstream.sequences.gaps == 0
+
+
+def test_interleaved_refids_in_one_frame_are_checked_in_wire_order(encode_message):
+    import eventlet
+
+    resubscribed = []
+    upstream = Upstream("wss://example", "token", "ctx", RecordingClients(), resubscribe=resubscribed.append)
+
+    upstream._on_message(
+        None,
+        encode_message("A", {}, msg_id=1) + encode_message("B", {}, msg_id=2) + encode_message("A", {}, msg_id=3)
+        + encode_message("C", {}, msg_id=4) + encode_message("B", {}, msg_id=5),
+    )
+    eventlet.sleep(0)
+
+    assert resubscribed == []
+    assert upstream.sequences.gaps == 0
+    assert upstream.sequences.last() == 5
+
+
+def test_gap_resubscribes_refids_around_it_and_late_message_only_its_refid(encode_message):
+    import eventlet
+
+    resubscribed = []
+    upstream = Upstream("wss://example", "token", "ctx", RecordingClients(), resubscribe=resubscribed.append)
+
+    upstream._on_message(None, encode_message("A", {}, msg_id=1) + encode_message("B", {}, msg_id=2))
+    upstream._on_message(None, encode_message("A", {}, msg_id=5))
+    eventlet.sleep(0)
+    upstream._on_message(None, encode_message("B", {}, msg_id=4) + encode_message("A", {}, msg_id=6))
+    eventlet.sleep(0)
+
+    assert resubscribed == [["B", "A"], ["B"]]
+    assert upstream.sequences.gaps == 2
+
+
+def test_gap_between_control_messages_resubscribes_nothing(encode_message):
+    import eventlet
+
+    resubscribed = []
+    upstream = Upstream("wss://example", "token", "ctx", RecordingClients(), resubscribe=resubscribed.append)
+    heartbeat = [{"ReferenceId": "_heartbeat", "Heartbeats": []}]
+
+    upstream._on_message(None, encode_message("_heartbeat", heartbeat, msg_id=1))
+    upstream._on_message(None, encode_message("_heartbeat", heartbeat, msg_id=3))
+    eventlet.sleep(0)
+
+    assert resubscribed == []
+    assert upstream.sequences.gaps == 1
+
+
+def test_resubscribe_pushes_fresh_snapshot_to_clients(encode_message):
+    import eventlet
+    from streaming.snapshots import SnapshotStore
+
+    clients = RecordingClients()
+    snapshots = SnapshotStore()
+
+    def resubscribe(ref_ids):
+        snapshots.seed("B", {"Quote": {"Bid": 2.0}})
+        return ["B"]
+
+    upstream = Upstream("wss://example", "token", "ctx", clients, snapshots, resubscribe=resubscribe)
+    upstream._on_message(None, encode_message("A", {}, msg_id=1) + encode_message("B", {"Quote": {"Bid": 1.0}}, msg_id=2))
+    upstream._on_message(None, encode_message("B", {}, msg_id=1))
+    eventlet.sleep(0)
+
+    ref_id, frame = clients.by_ref[-1]
+    assert ref_id == "B"
+    assert list(Upstream.decode_ws_msg(frame)) == [{"refid": "B", "msgId": 0, "msg": {"Quote": {"Bid": 2.0}}}]
+
+
+def test_control_messages_are_not_forwarded(encode_message):
+    import eventlet
+    from streaming.snapshots import SnapshotStore
+
+    clients = RecordingClients()
+    snapshots = SnapshotStore()
+    resubscribed = []
+    upstream = Upstream("wss://example", "token", "ctx", clients, snapshots, resubscribe=resubscribed.append)
+    quote = encode_message("A", {"Quote": {"Bid": 1.0}}, msg_id=1)
+    heartbeat = encode_message("_heartbeat", [{"ReferenceId": "_heartbeat", "Heartbeats": [{"OriginatingReferenceId": "A", "Reason": "NoNewData"}]}], msg_id=2)
+    reset = encode_message("_resetsubscriptions", [{"ReferenceId": "_resetsubscriptions", "TargetReferenceIds": ["A"]}], msg_id=3)
+
+    upstream._on_message(None, quote + heartbeat)
+    upstream._on_message(None, reset)
+    eventlet.sleep(0)
+
+    assert clients.all == [quote]
+    assert clients.by_ref == [("A", quote)]
+    assert snapshots.ref_ids() == ["A"]
+    assert upstream.control.last_heartbeat("A") is not None
+    assert resubscribed == [["A"]]
+
+
+def test_disconnect_control_message_closes_socket(encode_message):
+    class FakeApp:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    upstream = Upstream("wss://example", "token", "ctx", RecordingClients())
+    upstream.ws = FakeApp()
+
+    upstream._on_message(None, encode_message("_disconnect", [{"ReferenceId": "_disconnect"}]))
+
+    assert upstream.ws.closed
+
+
+def test_authorize_url_derived_from_connect_url():
+    upstream = Upstream("wss://streaming.saxobank.com/sim/openapi/streamingws/connect", "token", "ctx", RecordingClients())
+
+    assert upstream.authorize_url == "https://streaming.saxobank.com/sim/openapi/streamingws/authorize?contextId=ctx"
+    assert upstream.url.endswith("?contextId=ctx&authorization=Bearer%20token")
+
+
+def test_reauthorize_live_session_in_place():
+    from unittest.mock import MagicMock, patch
+
+    upstream = Upstream("wss://example/streamingws/connect", "old", "ctx", RecordingClients())
+    upstream.ws = MagicMock()
+    upstream.ws.sock.connected = True
+
+    with patch("streaming.upstream.requests.put") as put:
+        assert upstream.reauthorize("new") is True
+
+    put.assert_called_once_with(
+        "https://example/streamingws/authorize?contextId=ctx", headers={"Authorization": "Bearer new"}, timeout=10
+    )
+    upstream.ws.close.assert_not_called()
+    assert "Bearer%20new" in upstream.url
+
+
+def test_reauthorize_while_disconnected_only_stores_token():
+    from unittest.mock import patch
+
+    upstream = Upstream("wss://example/streamingws/connect", "old", "ctx", RecordingClients())
+
+    with patch("streaming.upstream.requests.put") as put:
+        assert upstream.reauthorize("new") is False
+
+    put.assert_not_called()
+    assert upstream.token == "new"
@@ -0,0 +1,29 @@
+import importlib
+import eventlet
+import requests
+from unittest.mock import MagicMock
+from saxo_client import SaxoClient
+from streaming.replicas import ReplicaRegistry
+from streaming.upstream import Upstream
+
+
+def test_create_client_keeps_the_hooked_subscription_handler(monkeypatch):
+    monkeypatch.setattr(eventlet, "monkey_patch", lambda **kwargs: None)
+    main = importlib.import_module("main")
+    monkeypatch.setenv("QUOTE_LOG", "tag")
+    monkeypatch.setattr(Upstream, "start", lambda self: None)
+    monkeypatch.setattr(ReplicaRegistry, "start", lambda self: None)
+    saxo_api = MagicMock()
+    saxo_api.return_value.json.return_value = {"Data": [{}], "DefaultAccountKey": "account", "ClientKey": "client"}
+    monkeypatch.setattr(requests.Session, "get", saxo_api)
+    monkeypatch.setattr(requests.Session, "delete", MagicMock())
+    monkeypatch.setattr("handlers.subscription_handler.Database", MagicMock())
+    saxo_client = SaxoClient(MagicMock())
+    subscription_handler = saxo_client.subscription_handler
+
+    assert main.create_client(saxo_client) is saxo_client
+
+    assert saxo_client.subscription_handler is subscription_handler
+    assert subscription_handler.price_handler is saxo_client.price_handler
+    quote_log = saxo_client.upstreams[0].dispatcher.sinks[0]
+    assert subscription_handler.on_members_changed == quote_log.forget
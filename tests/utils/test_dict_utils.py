@@ -0,0 +1,36 @@
+from utils.dict_utils import deep_merge
+
+
+def test_merge_nested_dicts():
+    base = {"Quote": {"Bid": 1.0, "Ask": 2.0}, "Uic": 21}
+
+    merged = deep_merge(base, {"Quote": {"Bid": 1.5}})
+
+    assert merged == {"Quote": {"Bid": 1.5, "Ask": 2.0}, "Uic": 21}
+
+
+def test_merge_list_items_by_uic():
+    base = [{"Uic": 1, "Quote": {"Bid": 1.0}}, {"Uic": 2, "Quote": {"Bid": 2.0}}]
+
+    merged = deep_merge(base, [{"Uic": 2, "Quote": {"Ask": 2.1}}, {"Uic": 3, "Quote": {"Bid": 3.0}}])
+
+    assert merged == [
+        {"Uic": 1, "Quote": {"Bid": 1.0}},
+        {"Uic": 2, "Quote": {"Bid": 2.0, "Ask": 2.1}},
+        {"Uic": 3, "Quote": {"Bid": 3.0}},
+    ]
+
+
+def test_plain_lists_and_scalars_are_replaced():
+    assert deep_merge({"a": [1, 2]}, {"a": [3]}) == {"a": [3]}
+    assert deep_merge({"a": 1}, {"a": None}) == {"a": None}
+    assert deep_merge(None, {"a": 1}) == {"a": 1}
+
+
+def test_delta_is_not_aliased():
+    delta = {"Quote": {"Bid": 1.0}}
+
+    merged = deep_merge({}, delta)
+    merged["Quote"]["Bid"] = 5.0
+
+    assert delta == {"Quote": {"Bid": 1.0}}
@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+from utils.single_flight import SingleFlight
+
+
+def _run_concurrently(flight, fn, callers):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fn))) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "response"
+
+    leader = threading.Thread(target=lambda: flight.do("key", fn))
+    leader.start()
+    started.wait(5)
+    threads, results = _run_concurrently(flight, fn, 4)
+    _wait_for(lambda: flight.collapsed == 4)
+    release.set()
+    for thread in threads + [leader]:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ["response"] * 4
+    assert flight.stats() == {"executed": 1, "collapsed": 4, "forgotten": 0, "in_flight": 0}
+
+
+def test_waiters_share_the_exception():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fn():
+        started.set()
+        release.wait(5)
+        raise ConnectionError("down")
+
+    def call():
+        try:
+            flight.do("key", fn)
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    _wait_for(lambda: flight.collapsed == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_sequential_calls_are_not_cached():
+    flight = SingleFlight()
+
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: int("x"))
+    assert flight.stats() == {"executed": 3, "collapsed": 0, "forgotten": 0, "in_flight": 0}
+
+
+def test_forgotten_call_is_not_joined_and_does_not_remove_its_successor():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "old"
+
+    thread = threading.Thread(target=lambda: flight.do("key", slow))
+    thread.start()
+    started.wait(5)
+
+    assert flight.forget(lambda key: key == "key") == 1
+    assert flight.do("key", lambda: "new") == "new"
+    release.set()
+    thread.join(5)
+
+    assert flight.stats() == {"executed": 2, "collapsed": 0, "forgotten": 1, "in_flight": 0}